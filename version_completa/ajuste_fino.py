@@ -0,0 +1,260 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+import cv2
+import numpy as np
+from empaquetar_dataset import EXTENSIONES_IMAGEN, SPLITS, cargar_paquete, leer_indice
+
+# Mismo orden de clases que flow_from_directory (y que la salida del modelo)
+CLASES = ['angry', 'disgust', 'fear', 'happy', 'neutral', 'sad', 'surprise']
+
+def separar_modelo(modelo, capa='densa'):
+    """Divide el modelo en tronco congelado y cabeza entrenable
+
+    `capa` indica dónde se corta: 'densa' (salida de la última capa densa oculta,
+    1024 valores en modelos/3) o 'flatten' (salida de Flatten). Devuelve el
+    extractor de características, la lista de capas de la cabeza y la dimensión.
+    """
+    import tensorflow as tf
+
+    capas = modelo.layers
+    if capa == 'flatten':
+        corte = max(i for i, c in enumerate(capas) if isinstance(c, tf.keras.layers.Flatten))
+    elif capa == 'densa':
+        densas = [i for i, c in enumerate(capas) if isinstance(c, tf.keras.layers.Dense)]
+        if len(densas) < 2:
+            raise ValueError("El modelo no tiene una capa densa oculta; usa capa='flatten'")
+        corte = densas[-2]
+    else:
+        raise ValueError(f"Capa desconocida: {capa}. Opciones: densa, flatten")
+
+    extractor = tf.keras.Model(modelo.inputs, capas[corte].output)
+    extractor.trainable = False
+    return extractor, capas[corte + 1:], int(capas[corte].output.shape[-1])
+
+def huella_tronco(extractor):
+    """Identifica los pesos del tronco: el mismo tronco comparte la caché aunque cambie la cabeza o el archivo"""
+    resumen = hashlib.sha256()
+    for peso in extractor.get_weights():
+        resumen.update(np.ascontiguousarray(peso).tobytes())
+    return resumen.hexdigest()[:16]
+
+def listar_jpeg(ruta_datos, split):
+    """Claves (ruta relativa|mtime|tamaño) y etiquetas de las imágenes de un split en carpetas"""
+    claves, etiquetas = [], []
+    for indice, clase in enumerate(CLASES):
+        ruta_clase = os.path.join(ruta_datos, split, clase)
+        if not os.path.isdir(ruta_clase):
+            continue
+        for entrada in sorted(os.scandir(ruta_clase), key=lambda e: e.name):
+            if entrada.is_file() and entrada.name.lower().endswith(EXTENSIONES_IMAGEN):
+                datos = entrada.stat()
+                claves.append(f"{split}/{clase}/{entrada.name}|{int(datos.st_mtime)}|{datos.st_size}")
+                etiquetas.append(indice)
+    return claves, np.asarray(etiquetas, dtype=np.uint8)
+
+def claves_paquete(imagenes):
+    """Claves por contenido de las filas de un dataset empaquetado
+
+    El paquete se puede regenerar (empaquetar_dataset.py lo ordena por clase y
+    archivo), así que una captura nueva desplaza las filas siguientes: la clave
+    es un resumen de los 48x48 bytes de cada imagen y no su posición. Las
+    imágenes idénticas comparten clave (y características). La etiqueta no
+    forma parte de la clave: las características solo dependen de los píxeles,
+    así que cambiar la clase de una imagen no invalida su caché (la etiqueta
+    se toma siempre del paquete actual).
+    """
+    return ["contenido:" + hashlib.blake2b(np.ascontiguousarray(imagen).tobytes(), digest_size=16).hexdigest()
+            for imagen in imagenes]
+
+def leer_jpeg(ruta_datos, claves):
+    """Imágenes uint8 (N, 48, 48) de las claves de listar_jpeg (None en las que no se pueden leer)"""
+    imagenes = []
+    for clave in claves:
+        imagen = cv2.imread(os.path.join(ruta_datos, clave.split('|')[0]), cv2.IMREAD_GRAYSCALE)
+        if imagen is not None and imagen.shape != (48, 48):
+            imagen = cv2.resize(imagen, (48, 48), interpolation=cv2.INTER_AREA)
+        imagenes.append(imagen)
+    return imagenes
+
+class CacheEmbeddings:
+    """Características del tronco congelado guardadas en disco, por imagen
+
+    Para cada split se guarda `<split>_embeddings.npy` (float32, N x dim) y
+    `<split>_claves.json` (con el prefijo `paquete_` si vienen del dataset
+    empaquetado) con la clave de cada fila: la ruta relativa, fecha y
+    tamaño de cada JPEG, o un resumen del contenido de cada fila en el
+    dataset empaquetado (ver claves_paquete). Al actualizar solo se pasa por
+    el tronco lo que no estaba; lo borrado o modificado se descarta.
+    """
+
+    def __init__(self, carpeta, extractor, tam_lote=256):
+        self.extractor = extractor
+        self.tam_lote = tam_lote
+        self.carpeta = os.path.join(carpeta, huella_tronco(extractor))
+        os.makedirs(self.carpeta, exist_ok=True)
+
+    def _rutas(self, split):
+        return (os.path.join(self.carpeta, f"{split}_embeddings.npy"),
+                os.path.join(self.carpeta, f"{split}_claves.json"))
+
+    def calcular(self, imagenes):
+        """Pasa imágenes uint8 (N, 48, 48) por el tronco, por lotes"""
+        salidas = []
+        for inicio in range(0, len(imagenes), self.tam_lote):
+            lote = np.asarray(imagenes[inicio:inicio + self.tam_lote], dtype=np.float32)[..., np.newaxis] / 255.0
+            salidas.append(np.asarray(self.extractor(lote, training=False)))
+        dim = self.extractor.output.shape[-1]
+        return np.concatenate(salidas) if salidas else np.empty((0, dim), dtype=np.float32)
+
+    def actualizar(self, split, claves, leer):
+        """Devuelve las características de `claves` (en ese orden), calculando solo las nuevas
+
+        `leer(claves)` devuelve las imágenes de las claves que faltan (None si no se pueden leer).
+        Devuelve (características, máscara de las claves válidas).
+        """
+        ruta_embeddings, ruta_claves = self._rutas(split)
+        guardadas, embeddings_guardados = {}, None
+        if os.path.exists(ruta_embeddings) and os.path.exists(ruta_claves):
+            with open(ruta_claves, encoding='utf-8') as f:
+                claves_guardadas = json.load(f)
+            embeddings_guardados = np.load(ruta_embeddings, mmap_mode='r')
+            guardadas = {clave: fila for fila, clave in enumerate(claves_guardadas)}
+
+        # Imágenes repetidas (mismo contenido en el paquete) comparten clave: se calculan una vez
+        nuevas = list(dict.fromkeys(clave for clave in claves if clave not in guardadas))
+        calculadas = {}
+        if nuevas:
+            inicio = time.perf_counter()
+            imagenes = leer(nuevas)
+            legibles = [(clave, imagen) for clave, imagen in zip(nuevas, imagenes) if imagen is not None]
+            for clave, imagen in zip(nuevas, imagenes):
+                if imagen is None:
+                    print(f"  ✗ No se pudo leer {clave.split('|')[0]}")
+            caracteristicas = self.calcular(np.stack([imagen for _, imagen in legibles])) if legibles else []
+            calculadas = {clave: fila for (clave, _), fila in zip(legibles, caracteristicas)}
+            print(f"  {split}: {len(calculadas)} imágenes nuevas pasadas por el tronco "
+                  f"en {time.perf_counter() - inicio:.1f} s "
+                  f"({sum(clave in guardadas for clave in claves)} ya en caché)")
+        else:
+            print(f"  {split}: {len(claves)} imágenes, todas ya en caché")
+
+        validas = np.asarray([clave in guardadas or clave in calculadas for clave in claves], dtype=bool)
+        dim = self.extractor.output.shape[-1]
+        # La caché guarda cada clave una sola vez; el resultado tiene una fila por clave válida pedida
+        claves_validas = list(dict.fromkeys(c for c, valida in zip(claves, validas) if valida))
+        unicas = np.empty((len(claves_validas), dim), dtype=np.float32)
+        for posicion, clave in enumerate(claves_validas):
+            fila = calculadas.get(clave)
+            unicas[posicion] = fila if fila is not None else embeddings_guardados[guardadas[clave]]
+        posiciones = {clave: posicion for posicion, clave in enumerate(claves_validas)}
+        resultado = unicas[[posiciones[c] for c, valida in zip(claves, validas) if valida]]
+
+        # Reescribir la caché solo con lo que sigue existiendo (de forma atómica; antes se
+        # suelta el mapeo del archivo anterior)
+        del embeddings_guardados
+        if nuevas or len(claves_validas) != len(guardadas):
+            temporal = ruta_embeddings + '.tmp.npy'
+            np.save(temporal, unicas)
+            os.replace(temporal, ruta_embeddings)
+            with open(ruta_claves + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(claves_validas, f)
+            os.replace(ruta_claves + '.tmp', ruta_claves)
+        return resultado, validas
+
+def cargar_caracteristicas(cache, ruta_datos=None, ruta_paquete=None):
+    """Características y etiquetas de cada split, desde el dataset en carpetas o el empaquetado"""
+    datos = {}
+    indice = leer_indice(ruta_paquete) if ruta_paquete else None
+    for split in SPLITS:
+        if indice is not None:
+            if split not in indice['splits']:
+                continue
+            imagenes, etiquetas, _ = cargar_paquete(ruta_paquete, split)
+            claves = claves_paquete(imagenes)
+            filas = {clave: fila for fila, clave in enumerate(claves)}
+            caracteristicas, validas = cache.actualizar(
+                f"paquete_{split}", claves, lambda nuevas: imagenes[[filas[clave] for clave in nuevas]])
+        else:
+            claves, etiquetas = listar_jpeg(ruta_datos, split)
+            if not claves:
+                continue
+            caracteristicas, validas = cache.actualizar(split, claves, lambda nuevas: leer_jpeg(ruta_datos, nuevas))
+        datos[split] = (caracteristicas, etiquetas[validas])
+    return datos
+
+def crear_cabeza(capas, dimension, tasa_aprendizaje):
+    """Copia las capas de la cabeza del modelo (con sus pesos) en un modelo que recibe las características"""
+    import tensorflow as tf
+    cabeza = tf.keras.Sequential([tf.keras.Input(shape=(dimension,))] +
+                                 [capa.__class__.from_config(capa.get_config()) for capa in capas])
+    for original, copia in zip(capas, cabeza.layers):
+        copia.set_weights(original.get_weights())
+    cabeza.compile(
+        loss='categorical_crossentropy',
+        optimizer=tf.keras.optimizers.Adam(learning_rate=tasa_aprendizaje),
+        metrics=['accuracy']
+    )
+    return cabeza
+
+def ajustar_modelo(ruta_modelo, ruta_datos='dataset', ruta_paquete=None, capa='densa', epocas=30, batch_size=64,
+                   tasa_aprendizaje=0.0001, carpeta_cache='cache_embeddings', ruta_salida='modelo_expresiones_ajustado.h5'):
+    """Ajusta la cabeza densa de un modelo existente a nuevas capturas usando características en caché"""
+    import tensorflow as tf
+
+    modelo = tf.keras.models.load_model(ruta_modelo, compile=False)
+    extractor, capas_cabeza, dimension = separar_modelo(modelo, capa)
+    print(f"Tronco congelado hasta '{capa}' ({dimension} características); "
+          f"cabeza: {', '.join(c.name for c in capas_cabeza)}")
+
+    cache = CacheEmbeddings(carpeta_cache, extractor)
+    datos = cargar_caracteristicas(cache, ruta_datos, ruta_paquete)
+    if 'train' not in datos or len(datos['train'][1]) == 0:
+        print("No hay imágenes de entrenamiento. Captúralas con python version_completa/capturar_imagenes.py")
+        return None
+
+    x_entrenamiento, y_entrenamiento = datos['train']
+    validacion = None
+    if 'validation' in datos and len(datos['validation'][1]):
+        x_validacion, y_validacion = datos['validation']
+        validacion = (x_validacion, tf.keras.utils.to_categorical(y_validacion, len(CLASES)))
+
+    cabeza = crear_cabeza(capas_cabeza, dimension, tasa_aprendizaje)
+    callbacks = []
+    if validacion is not None:
+        callbacks.append(tf.keras.callbacks.EarlyStopping(monitor='val_accuracy', patience=5, mode='max',
+                                                          restore_best_weights=True))
+        print(f"val_accuracy antes del ajuste: {cabeza.evaluate(*validacion, verbose=0)[1]:.4f}")
+
+    inicio = time.perf_counter()
+    cabeza.fit(x_entrenamiento, tf.keras.utils.to_categorical(y_entrenamiento, len(CLASES)),
+               batch_size=batch_size, epochs=epocas, validation_data=validacion, callbacks=callbacks, verbose=2)
+    print(f"Cabeza entrenada en {time.perf_counter() - inicio:.1f} s")
+    if validacion is not None:
+        print(f"val_accuracy después del ajuste: {cabeza.evaluate(*validacion, verbose=0)[1]:.4f}")
+
+    # Devolver los pesos ajustados al modelo completo y guardarlo en el formato que usa el detector
+    for original, copia in zip(capas_cabeza, cabeza.layers):
+        original.set_weights(copia.get_weights())
+    modelo.save(ruta_salida)
+    print(f"Modelo ajustado guardado como '{ruta_salida}'")
+    return modelo
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ajuste rápido del modelo a un usuario con características en caché")
+    parser.add_argument('--modelo', default='./version_completa/modelos/3/modelo_expresiones.h5')
+    parser.add_argument('--datos', default='dataset', help="Dataset en carpetas (el de capturar_imagenes.py)")
+    parser.add_argument('--paquete', default=None, help="Usar el dataset empaquetado en lugar de las carpetas")
+    parser.add_argument('--capa', choices=['densa', 'flatten'], default='densa',
+                        help="Dónde se corta el modelo: se congela todo hasta esa capa")
+    parser.add_argument('--epocas', type=int, default=30)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--tasa-aprendizaje', type=float, default=0.0001)
+    parser.add_argument('--cache', default='cache_embeddings', help="Carpeta de la caché de características")
+    parser.add_argument('--salida', default='modelo_expresiones_ajustado.h5')
+    args = parser.parse_args()
+
+    ajustar_modelo(args.modelo, args.datos, args.paquete, args.capa, args.epocas, args.batch_size,
+                   args.tasa_aprendizaje, args.cache, args.salida)
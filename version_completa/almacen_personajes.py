@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+
+EXTENSIONES_PERSONAJE = ('.png', '.jpg', '.jpeg')
+
+class AlmacenPersonajes:
+    """Imágenes de personajes decodificadas bajo demanda, con caché LRU acotada en bytes
+
+    Al crearse solo lista la carpeta (nombre, ruta, fecha de modificación); cada
+    imagen se decodifica la primera vez que se pide y se guarda en una caché
+    LRU de como mucho `max_bytes`, así que se pueden rotar cientos de
+    personajes sin tenerlos todos en memoria. precargar() decodifica en un
+    hilo aparte el personaje que probablemente se pida después.
+
+    Cada `intervalo_revision` segundos se vuelve a listar la carpeta: los
+    archivos nuevos pasan a estar disponibles, los borrados desaparecen y los
+    modificados se vuelven a decodificar en el siguiente acceso (si la versión
+    nueva aún no se puede leer, se sigue usando la anterior). `al_cambiar`
+    recibe el nombre de cada personaje modificado o borrado, por ejemplo para
+    invalidar sus sprites en CacheSprites.
+    """
+
+    def __init__(self, carpeta='personajes', max_bytes=64 * 1024 * 1024, nombres=None,
+                 intervalo_revision=2.0, al_cambiar=None):
+        self.carpeta = carpeta
+        self.max_bytes = max_bytes
+        self.filtro = set(nombres) if nombres is not None else None
+        self.intervalo_revision = intervalo_revision
+        self.al_cambiar = al_cambiar
+
+        self.indice = {}
+        self.cache = OrderedDict()
+        self.bytes_en_cache = 0
+        self.cerrojo = threading.Lock()
+        self.precargando = set()
+        self.ejecutor = ThreadPoolExecutor(max_workers=1)
+        self.ultima_revision = 0.0
+
+        # Estadísticas
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsados = 0
+
+        self.revisar(forzar=True)
+
+    def listar(self):
+        """Devuelve {nombre: (ruta, fecha de modificación)} de las imágenes de la carpeta"""
+        entradas = {}
+        if not os.path.isdir(self.carpeta):
+            return entradas
+        for entrada in os.scandir(self.carpeta):
+            nombre, extension = os.path.splitext(entrada.name)
+            if extension.lower() not in EXTENSIONES_PERSONAJE or not entrada.is_file():
+                continue
+            if self.filtro is not None and nombre not in self.filtro:
+                continue
+            entradas[nombre] = (entrada.path, entrada.stat().st_mtime)
+        return entradas
+
+    def revisar(self, forzar=False):
+        """Vuelve a listar la carpeta si toca; devuelve los nombres nuevos, modificados o borrados"""
+        ahora = time.monotonic()
+        if not forzar and ahora - self.ultima_revision < self.intervalo_revision:
+            return set()
+        self.ultima_revision = ahora
+
+        nuevo_indice = self.listar()
+        anterior = self.indice
+        cambiados = {nombre for nombre in anterior if nuevo_indice.get(nombre, (None, None))[1] != anterior[nombre][1]}
+        nuevos = set(nuevo_indice) - set(anterior)
+        self.indice = nuevo_indice
+
+        with self.cerrojo:
+            # Los borrados salen de la caché; los modificados se recargan en el siguiente acceso
+            for nombre in cambiados - set(nuevo_indice):
+                self._expulsar(nombre)
+
+        if self.al_cambiar is not None:
+            for nombre in cambiados:
+                self.al_cambiar(nombre)
+        return cambiados | nuevos
+
+    def nombres(self):
+        """Nombres de los personajes disponibles, ordenados"""
+        return sorted(self.indice)
+
+    def __contains__(self, nombre):
+        return nombre in self.indice
+
+    def __len__(self):
+        return len(self.indice)
+
+    def _decodificar(self, nombre):
+        ruta, modificado = self.indice[nombre]
+        return modificado, cv2.imread(ruta, cv2.IMREAD_UNCHANGED)
+
+    def _guardar(self, nombre, modificado, imagen):
+        """Añade (o reemplaza) una imagen en la caché y expulsa las menos usadas si se pasa del límite"""
+        self._expulsar(nombre)
+        self.cache[nombre] = (modificado, imagen)
+        self.bytes_en_cache += imagen.nbytes
+        while self.bytes_en_cache > self.max_bytes and len(self.cache) > 1:
+            _, (_, expulsada) = self.cache.popitem(last=False)
+            self.bytes_en_cache -= expulsada.nbytes
+            self.expulsados += 1
+
+    def _expulsar(self, nombre):
+        entrada = self.cache.pop(nombre, None)
+        if entrada is not None:
+            self.bytes_en_cache -= entrada[1].nbytes
+
+    def obtener(self, nombre):
+        """Devuelve la imagen (BGR o BGRA) del personaje, decodificándola si no está en caché; None si no existe"""
+        self.revisar()
+        if nombre not in self.indice:
+            return None
+
+        modificado = self.indice[nombre][1]
+        with self.cerrojo:
+            entrada = self.cache.get(nombre)
+            if entrada is not None and entrada[0] == modificado:
+                self.cache.move_to_end(nombre)
+                self.aciertos += 1
+                return entrada[1]
+
+        self.fallos += 1
+        try:
+            leido, imagen = self._decodificar(nombre)
+        except KeyError:
+            return None
+        with self.cerrojo:
+            if imagen is None:
+                # Archivo a medio escribir o dañado: seguir con la versión anterior si la hay
+                return entrada[1] if entrada is not None else None
+            self._guardar(nombre, leido, imagen)
+        # Si se sustituye una versión anterior, los sprites hechos con ella dejan de valer
+        if entrada is not None and self.al_cambiar is not None:
+            self.al_cambiar(nombre)
+        return imagen
+
+    def precargar(self, nombre):
+        """Decodifica el personaje en segundo plano para que el próximo obtener() no tenga que esperar"""
+        if nombre not in self.indice:
+            return
+        with self.cerrojo:
+            entrada = self.cache.get(nombre)
+            if (entrada is not None and entrada[0] == self.indice[nombre][1]) or nombre in self.precargando:
+                return
+            self.precargando.add(nombre)
+        self.ejecutor.submit(self._precargar, nombre)
+
+    def _precargar(self, nombre):
+        try:
+            leido, imagen = self._decodificar(nombre)
+            if imagen is not None:
+                with self.cerrojo:
+                    self._guardar(nombre, leido, imagen)
+        except Exception as e:
+            print(f"Error al precargar {nombre}: {e}")
+        finally:
+            with self.cerrojo:
+                self.precargando.discard(nombre)
+
+    def estadisticas(self):
+        return {
+            'personajes': len(self.indice),
+            'en_cache': len(self.cache),
+            'mb_en_cache': round(self.bytes_en_cache / (1024 * 1024), 2),
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'expulsados': self.expulsados
+        }
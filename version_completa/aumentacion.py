@@ -0,0 +1,133 @@
+import argparse
+import math
+import time
+import numpy as np
+import tensorflow as tf
+
+# Mismos rangos que el ImageDataGenerator de entrenar_modelo.py
+RANGOS_AUMENTO = {
+    'rotacion': 10,                # grados
+    'desplazamiento_ancho': 0.1,   # fracción del ancho
+    'desplazamiento_alto': 0.1,    # fracción del alto
+    'cizalla': 0.1,                # grados
+    'zoom': 0.1,                   # zoom en [1 - z, 1 + z] en cada eje
+    'volteo_horizontal': True
+}
+
+def matrices_afines(semilla, n, alto, ancho, rotacion=10, desplazamiento_ancho=0.1, desplazamiento_alto=0.1,
+                    cizalla=0.1, zoom=0.1, volteo_horizontal=True):
+    """Genera n transformaciones afines aleatorias en el formato de ImageProjectiveTransformV3
+
+    Cada fila (a0, a1, a2, b0, b1, b2, 0, 0) lleva un punto de la salida a la
+    entrada, igual que la matriz que construye ImageDataGenerator: rotación,
+    desplazamiento, cizalla y zoom alrededor del centro de la imagen.
+    """
+    semillas = tf.random.experimental.stateless_split(semilla, 7)
+
+    def uniforme(i, limite):
+        return tf.random.stateless_uniform([n], semillas[i], -limite, limite)
+
+    theta = uniforme(0, rotacion * math.pi / 180.0)
+    tx = uniforme(1, desplazamiento_ancho * ancho)
+    ty = uniforme(2, desplazamiento_alto * alto)
+    corte = uniforme(3, cizalla * math.pi / 180.0)
+    zx = 1.0 + uniforme(4, zoom)
+    zy = 1.0 + uniforme(5, zoom)
+
+    # A = R · Sh · Z (parte lineal); el desplazamiento va aparte
+    cos, sin = tf.cos(theta), tf.sin(theta)
+    cos_c, sin_c = tf.cos(corte), tf.sin(corte)
+    a00 = cos * zx
+    a01 = (-cos * sin_c - sin * cos_c) * zy
+    a10 = sin * zx
+    a11 = (-sin * sin_c + cos * cos_c) * zy
+
+    # Centrar la transformación: entrada = c + A (salida - c) + t
+    cx, cy = (ancho - 1) / 2.0, (alto - 1) / 2.0
+    a2 = cx - a00 * cx - a01 * cy + tx
+    b2 = cy - a10 * cx - a11 * cy + ty
+
+    if volteo_horizontal:
+        # Voltear la salida equivale a sustituir x por (ancho - 1 - x)
+        voltear = tf.random.stateless_uniform([n], semillas[6]) < 0.5
+        a2 = tf.where(voltear, a2 + a00 * (ancho - 1), a2)
+        b2 = tf.where(voltear, b2 + a10 * (ancho - 1), b2)
+        a00 = tf.where(voltear, -a00, a00)
+        a10 = tf.where(voltear, -a10, a10)
+
+    ceros = tf.zeros([n])
+    return tf.stack([a00, a01, a2, a10, a11, b2, ceros, ceros], axis=1)
+
+@tf.function
+def aumentar_lote(imagenes, semilla, **rangos):
+    """Aplica una transformación afín aleatoria distinta a cada imagen de un lote (N, alto, ancho, C)
+
+    `semilla` es un tensor int de forma [2]; la misma semilla da siempre el mismo resultado.
+    """
+    forma = tf.shape(imagenes)
+    alto, ancho = tf.cast(forma[1], tf.float32), tf.cast(forma[2], tf.float32)
+    transformaciones = matrices_afines(semilla, forma[0], alto, ancho, **rangos)
+    return tf.raw_ops.ImageProjectiveTransformV3(
+        images=imagenes,
+        transforms=transformaciones,
+        output_shape=forma[1:3],
+        fill_value=0.0,
+        interpolation='BILINEAR',
+        fill_mode='NEAREST'
+    )
+
+def aplicar_aumento(dataset, semilla=None, rangos=None):
+    """Añade el aumento por lotes a un tf.data.Dataset de (imágenes, etiquetas) ya agrupado en lotes
+
+    Cada lote recibe su propia semilla a partir de `semilla`, distinta en cada
+    época, así que dos entrenamientos con la misma semilla ven los mismos datos.
+    """
+    rangos = rangos or RANGOS_AUMENTO
+    semillas = tf.data.Dataset.random(seed=semilla, rerandomize_each_iteration=True).batch(2)
+    dataset = tf.data.Dataset.zip((dataset, semillas))
+    return dataset.map(lambda datos, s: (aumentar_lote(datos[0], s, **rangos), datos[1]),
+                       num_parallel_calls=tf.data.AUTOTUNE)
+
+def medir_generador(imagenes, batch_size, lotes):
+    """Imágenes por segundo del ImageDataGenerator actual (transformación por imagen en Python)"""
+    from tensorflow.keras.preprocessing.image import ImageDataGenerator
+    generador = ImageDataGenerator(rotation_range=10, width_shift_range=0.1, height_shift_range=0.1,
+                                   shear_range=0.1, zoom_range=0.1, horizontal_flip=True, fill_mode='nearest')
+    flujo = generador.flow(imagenes, batch_size=batch_size, shuffle=False)
+    next(flujo)
+    inicio = time.perf_counter()
+    for _ in range(lotes):
+        next(flujo)
+    return lotes * batch_size / (time.perf_counter() - inicio)
+
+def medir_lotes(imagenes, batch_size, lotes):
+    """Imágenes por segundo del aumento por lotes dentro de un pipeline tf.data"""
+    etiquetas = np.zeros(len(imagenes), dtype=np.float32)
+    dataset = tf.data.Dataset.from_tensor_slices((imagenes, etiquetas)).batch(batch_size).repeat()
+    dataset = aplicar_aumento(dataset, semilla=0).prefetch(tf.data.AUTOTUNE)
+    iterador = iter(dataset)
+    next(iterador)
+    inicio = time.perf_counter()
+    for _ in range(lotes):
+        next(iterador)
+    return lotes * batch_size / (time.perf_counter() - inicio)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara el aumento por lotes con ImageDataGenerator")
+    parser.add_argument('--paquete', default=None, help="Dataset empaquetado (por defecto imágenes aleatorias)")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--lotes', type=int, default=100, help="Lotes medidos en cada método")
+    args = parser.parse_args()
+
+    if args.paquete:
+        from empaquetar_dataset import cargar_paquete
+        imagenes = cargar_paquete(args.paquete, 'train')[0]
+        imagenes = np.asarray(imagenes[:args.batch_size * args.lotes], dtype=np.float32)[..., np.newaxis] / 255.0
+    else:
+        rng = np.random.default_rng(0)
+        imagenes = rng.random((args.batch_size * args.lotes, 48, 48, 1), dtype=np.float32)
+
+    por_imagen = medir_generador(imagenes, args.batch_size, args.lotes)
+    por_lotes = medir_lotes(imagenes, args.batch_size, args.lotes)
+    print(f"ImageDataGenerator: {por_imagen:10.1f} imágenes/s")
+    print(f"Aumento por lotes:  {por_lotes:10.1f} imágenes/s ({por_lotes / por_imagen:.1f}x)")
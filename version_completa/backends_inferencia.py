@@ -0,0 +1,198 @@
+import os
+import numpy as np
+
+# Backends disponibles y extensión del archivo de modelo que usa cada uno
+EXTENSIONES_BACKEND = {
+    'keras': '.h5',
+    'tflite': '.tflite',
+    'opencv': '.onnx'
+}
+
+class BackendInferencia:
+    """Interfaz común de los backends: recibe un lote (N, 48, 48, 1) y devuelve probabilidades (N, 7)"""
+    nombre = "base"
+
+    def predecir(self, lote):
+        raise NotImplementedError
+
+    def preparar_lote(self, lote):
+        """Asegura que el lote sea un array float32 contiguo de 4 dimensiones"""
+        lote = np.asarray(lote, dtype=np.float32)
+        if lote.ndim == 3:
+            lote = lote[np.newaxis]
+        return np.ascontiguousarray(lote)
+
+class BackendKeras(BackendInferencia):
+    """Ejecuta el modelo .h5 directamente con Keras"""
+    nombre = "keras"
+
+    def __init__(self, ruta_modelo):
+        from tensorflow import keras
+        self.modelo = keras.models.load_model(ruta_modelo)
+
+    def predecir(self, lote):
+        # Llamar al modelo directamente evita la sobrecarga de predict() en lotes pequeños
+        return np.asarray(self.modelo(self.preparar_lote(lote), training=False))
+
+class BackendTFLite(BackendInferencia):
+    """Ejecuta un modelo .tflite con el intérprete de TensorFlow Lite"""
+    nombre = "tflite"
+
+    def __init__(self, ruta_modelo, num_hilos=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        self.interprete = Interpreter(model_path=ruta_modelo, num_threads=num_hilos)
+        self.interprete.allocate_tensors()
+        self.entrada = self.interprete.get_input_details()[0]
+        self.salida = self.interprete.get_output_details()[0]
+        self.tam_lote = int(self.entrada['shape'][0])
+
+    def ajustar_tam_lote(self, n):
+        """Redimensiona el tensor de entrada si cambia el número de rostros del lote"""
+        if n != self.tam_lote:
+            self.interprete.resize_tensor_input(self.entrada['index'], [n, 48, 48, 1])
+            self.interprete.allocate_tensors()
+            self.entrada = self.interprete.get_input_details()[0]
+            self.salida = self.interprete.get_output_details()[0]
+            self.tam_lote = n
+
+    def predecir(self, lote):
+        lote = self.preparar_lote(lote)
+        self.ajustar_tam_lote(lote.shape[0])
+
+        # Cuantizar la entrada si el modelo es entero
+        tipo_entrada = self.entrada['dtype']
+        if tipo_entrada != np.float32:
+            escala, punto_cero = self.entrada['quantization']
+            lote = np.clip(np.round(lote / escala + punto_cero),
+                           np.iinfo(tipo_entrada).min, np.iinfo(tipo_entrada).max).astype(tipo_entrada)
+
+        self.interprete.set_tensor(self.entrada['index'], lote)
+        self.interprete.invoke()
+        prediccion = self.interprete.get_tensor(self.salida['index'])
+
+        # Descuantizar la salida si el modelo es entero
+        if self.salida['dtype'] != np.float32:
+            escala, punto_cero = self.salida['quantization']
+            prediccion = (prediccion.astype(np.float32) - punto_cero) * escala
+
+        return prediccion
+
+class BackendOpenCV(BackendInferencia):
+    """Ejecuta un modelo .onnx con el módulo DNN de OpenCV"""
+    nombre = "opencv"
+
+    def __init__(self, ruta_modelo):
+        import cv2
+        self.red = cv2.dnn.readNetFromONNX(ruta_modelo)
+        self.red.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.red.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+    def predecir(self, lote):
+        self.red.setInput(self.preparar_lote(lote))
+        return self.red.forward()
+
+class BackendRemoto(BackendInferencia):
+    """Envía los rostros al servicio de inferencia compartido (ver servicio_inferencia.py)
+
+    Permite que varios quioscos usen un solo equipo de inferencia sin cargar
+    TensorFlow. En lugar de la ruta del modelo recibe la URL del servicio.
+    """
+    nombre = "remoto"
+
+    def __init__(self, url, tiempo_espera=5.0):
+        from urllib.parse import urlparse
+        partes = urlparse(url)
+        self.host = partes.hostname or '127.0.0.1'
+        self.puerto = partes.port or 8765
+        self.tiempo_espera = tiempo_espera
+        self.conexion = None
+
+    def predecir(self, lote):
+        import http.client
+        import json
+
+        # Los rostros se envían como uint8 (48x48 bytes cada uno) para reducir el tráfico
+        lote = self.preparar_lote(lote)
+        cuerpo = np.clip(np.round(lote * 255.0), 0, 255).astype(np.uint8).tobytes()
+
+        for intento in range(2):
+            if self.conexion is None:
+                self.conexion = http.client.HTTPConnection(self.host, self.puerto, timeout=self.tiempo_espera)
+            try:
+                self.conexion.request('POST', '/rostros', body=cuerpo,
+                                      headers={'Content-Type': 'application/octet-stream'})
+                respuesta = self.conexion.getresponse()
+                datos = json.loads(respuesta.read())
+                break
+            except (http.client.HTTPException, ConnectionError, OSError):
+                # Reintentar una vez con una conexión nueva si el servidor cerró la anterior
+                self.conexion.close()
+                self.conexion = None
+                if intento == 1:
+                    raise
+
+        if respuesta.status != 200:
+            raise RuntimeError(f"Error del servicio de inferencia: {datos.get('error')}")
+        return np.array([r['probabilidades'] for r in datos['resultados']], dtype=np.float32)
+
+BACKENDS = {
+    'keras': BackendKeras,
+    'tflite': BackendTFLite,
+    'opencv': BackendOpenCV,
+    'remoto': BackendRemoto
+}
+
+def ruta_para_backend(ruta_modelo, tipo):
+    """Devuelve la ruta del archivo de modelo que corresponde al backend indicado
+
+    Permite configurar siempre la ruta del .h5 y usar el .tflite o .onnx
+    exportado junto a él (ver exportar_modelo.py).
+    """
+    base, extension = os.path.splitext(ruta_modelo)
+    extension_backend = EXTENSIONES_BACKEND[tipo]
+    if extension == extension_backend:
+        return ruta_modelo
+    return base + extension_backend
+
+def crear_backend_optimizado(ruta_modelo, **opciones):
+    """Carga el .tflite en caché junto al .h5, generándolo solo si falta o es más antiguo que el .h5
+
+    El intérprete de TFLite arranca mucho antes que Keras (no hay que cargar
+    el .h5 ni trazar el grafo en la primera predicción), así que tras la
+    primera ejecución el arranque no necesita importar TensorFlow completo
+    si está instalado tflite_runtime.
+    """
+    ruta_tflite = ruta_para_backend(ruta_modelo, 'tflite')
+    vigente = os.path.exists(ruta_tflite) and (
+        not os.path.exists(ruta_modelo) or os.path.getmtime(ruta_tflite) >= os.path.getmtime(ruta_modelo))
+    if not vigente:
+        if not os.path.exists(ruta_modelo):
+            raise FileNotFoundError(f"No existe el modelo: {ruta_modelo}")
+        from exportar_modelo import exportar_tflite
+        print("Generando el modelo optimizado en caché (solo la primera vez)...")
+        exportar_tflite(ruta_modelo, ruta_tflite)
+    return BackendTFLite(ruta_tflite, **opciones)
+
+def crear_backend(tipo, ruta_modelo, **opciones):
+    """Crea el backend de inferencia indicado a partir de la ruta del modelo"""
+    if tipo not in BACKENDS and tipo != 'optimizado':
+        raise ValueError(f"Backend desconocido: {tipo}. Opciones: {', '.join(BACKENDS)}, optimizado")
+
+    # El backend remoto no usa un archivo de modelo sino la URL del servicio
+    if tipo == 'remoto':
+        return BackendRemoto(ruta_modelo, **opciones)
+
+    # 'optimizado': TFLite en caché generado a partir del .h5
+    if tipo == 'optimizado':
+        return crear_backend_optimizado(ruta_modelo, **opciones)
+
+    ruta = ruta_para_backend(ruta_modelo, tipo)
+    if not os.path.exists(ruta):
+        raise FileNotFoundError(f"No existe el modelo para el backend '{tipo}': {ruta}")
+
+    return BACKENDS[tipo](ruta, **opciones)
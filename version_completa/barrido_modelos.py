@@ -0,0 +1,288 @@
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Arquitecturas con nombre para el espacio de búsqueda (formato de bloques de entrenar_modelo.crear_modelo)
+ARQUITECTURAS = {
+    'modelo1': [[32, 'pool'], [64, 'pool'], [128, 'pool']],
+    'modelo2': [[64, 'pool'], [128, 'pool'], [256, 'pool']],
+    'modelo3': [[32, 64, 'pool'], [128, 'pool', 128, 'pool'], [256, 'pool', 256, 'pool']],
+    'ancho': [[64, 64, 'pool'], [128, 128, 'pool'], [256, 256, 'pool']]
+}
+
+# Opciones que se han ido probando a mano en modelos/1, 2 y 3
+ESPACIO_POR_DEFECTO = {
+    'arquitectura': list(ARQUITECTURAS),
+    'dropout': [0.25, 0.3, 0.4],
+    'batch_norm': [True, False],
+    'padding': ['same'],
+    'densa': [512, 1024],
+    'tasa_aprendizaje': [0.001, 0.0001]
+}
+
+def generar_candidatos(espacio, num_candidatos=None, semilla=0):
+    """Combinaciones del espacio de búsqueda: todas, o una muestra aleatoria de `num_candidatos`"""
+    claves = list(espacio)
+    combinaciones = [dict(zip(claves, valores)) for valores in itertools.product(*(espacio[c] for c in claves))]
+    if num_candidatos is not None and num_candidatos < len(combinaciones):
+        combinaciones = random.Random(semilla).sample(combinaciones, num_candidatos)
+    return [{'id': i, **config} for i, config in enumerate(combinaciones)]
+
+def nombre_candidato(candidato):
+    return ' '.join(f"{clave}={valor}" for clave, valor in candidato.items() if clave != 'id')
+
+# --- Trabajadores ---
+
+def iniciar_trabajador(nucleos_libres, hilos):
+    """Fija los hilos (y, si se puede, los núcleos) del proceso antes de importar TensorFlow"""
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+    for variable in ('OMP_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS'):
+        os.environ[variable] = str(hilos)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    nucleos = nucleos_libres.get()
+    if nucleos and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, nucleos)
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(hilos)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+def medir_latencia(backend, repeticiones=200, calentamiento=20):
+    """Latencia p50 en ms de una predicción de un rostro (lote de 1), como en la cámara"""
+    import numpy as np
+    from medicion import percentiles
+    entrada = np.zeros((1, 48, 48, 1), dtype=np.float32)
+    for _ in range(calentamiento):
+        backend.predecir(entrada)
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        backend.predecir(entrada)
+        tiempos.append(time.perf_counter() - inicio)
+    return percentiles(1000.0 * np.asarray(tiempos), (50,))['p50']
+
+def entrenar_candidato(trabajo):
+    """Entrena un candidato desde `epoca_inicial` hasta `epoca_final`, continuando su punto de control"""
+    import tensorflow as tf
+    from empaquetar_dataset import crear_dataset_tf
+    from entrenar_modelo import crear_modelo
+
+    candidato = trabajo['candidato']
+    ruta_modelo = trabajo['ruta_modelo']
+    inicio = time.perf_counter()
+
+    # Todos los procesos leen el mismo dataset mapeado en memoria (sin copiarlo cada uno)
+    entrenamiento = crear_dataset_tf(trabajo['paquete'], 'train', trabajo['batch_size'], entrenamiento=True,
+                                     aumentar=True, semilla=trabajo['semilla'], en_memoria=False)
+    validacion = crear_dataset_tf(trabajo['paquete'], 'validation', trabajo['batch_size'], en_memoria=False)
+    if trabajo['lotes_por_epoca']:
+        entrenamiento = entrenamiento.take(trabajo['lotes_por_epoca'])
+
+    # El punto de control en formato .keras guarda también el estado del optimizador
+    tf.keras.backend.clear_session()
+    if trabajo['epoca_inicial'] > 0:
+        modelo = tf.keras.models.load_model(ruta_modelo)
+    else:
+        tf.keras.utils.set_random_seed(trabajo['semilla'])
+        opciones = {clave: valor for clave, valor in candidato.items() if clave not in ('id', 'arquitectura')}
+        modelo = crear_modelo(ARQUITECTURAS[candidato['arquitectura']], **opciones)
+
+    historial = modelo.fit(entrenamiento, validation_data=validacion, initial_epoch=trabajo['epoca_inicial'],
+                           epochs=trabajo['epoca_final'], verbose=0)
+    modelo.save(ruta_modelo)
+
+    resultado = {
+        'id': candidato['id'],
+        'epocas': trabajo['epoca_final'],
+        'val_accuracy': float(max(historial.history['val_accuracy'])),
+        'val_loss': float(min(historial.history['val_loss'])),
+        'segundos': time.perf_counter() - inicio
+    }
+    if trabajo['epoca_inicial'] == 0:
+        resultado['parametros'] = int(modelo.count_params())
+    return resultado
+
+def medir_candidato(ruta_modelo, backend='optimizado', repeticiones=200):
+    """Latencia de un candidato ya entrenado con el backend y los hilos del detector
+
+    Se llama en un proceso nuevo por candidato, sin los hilos ni núcleos fijados
+    de los procesos de entrenamiento y con el resto de procesos parados.
+    """
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+    import tensorflow as tf
+    from backends_inferencia import crear_backend
+
+    # Los backends del detector parten del .h5 (sin el estado del optimizador, que no hace falta)
+    ruta_h5 = os.path.splitext(ruta_modelo)[0] + '.h5'
+    tf.keras.models.load_model(ruta_modelo).save(ruta_h5, include_optimizer=False)
+    return medir_latencia(crear_backend(backend, ruta_h5), repeticiones)
+
+# --- Barrido ---
+
+def repartir_nucleos(procesos):
+    """Divide los núcleos disponibles en `procesos` grupos disjuntos"""
+    if hasattr(os, 'sched_getaffinity'):
+        nucleos = sorted(os.sched_getaffinity(0))
+    else:
+        nucleos = list(range(os.cpu_count() or 1))
+    hilos = max(1, len(nucleos) // procesos)
+    grupos = [nucleos[i * hilos:(i + 1) * hilos] for i in range(procesos)]
+    return [grupo if len(grupo) == hilos else None for grupo in grupos], hilos
+
+def barrido(paquete, espacio=ESPACIO_POR_DEFECTO, num_candidatos=None, procesos=None, eta=3,
+            epocas_iniciales=2, epocas_maximas=50, batch_size=64, lotes_por_epoca=None,
+            carpeta_salida='barrido_modelos', semilla=0, backend_latencia='optimizado'):
+    """Entrena los candidatos en paralelo y descarta los peores con successive halving
+
+    En cada ronda todos los supervivientes se entrenan hasta el mismo número
+    de épocas; pasa a la siguiente el mejor 1/`eta` por val_accuracy, que se
+    sigue entrenando (desde su punto de control) hasta `eta` veces más épocas,
+    hasta que queda uno o se llega a `epocas_maximas`. Al final se mide la
+    latencia de cada candidato con `backend_latencia` (el del detector).
+    Devuelve la clasificación: una fila por candidato.
+    """
+    candidatos = generar_candidatos(espacio, num_candidatos, semilla)
+    if not candidatos:
+        print("El espacio de búsqueda está vacío.")
+        return []
+    os.makedirs(os.path.join(carpeta_salida, 'candidatos'), exist_ok=True)
+
+    procesos = procesos or max(1, min(len(candidatos), (os.cpu_count() or 2) // 2))
+    grupos, hilos = repartir_nucleos(procesos)
+    print(f"{len(candidatos)} candidatos, {procesos} procesos con {hilos} hilos cada uno")
+
+    filas = {c['id']: {'id': c['id'], 'candidato': nombre_candidato(c), 'ronda': 0, 'epocas': 0,
+                       'val_accuracy': None, 'val_loss': None, 'parametros': None, 'latencia_ms': None,
+                       'error': ''} for c in candidatos}
+    supervivientes = list(candidatos)
+    epocas_hechas = 0
+    epocas = min(epocas_iniciales, epocas_maximas)
+    ronda = 0
+
+    # 'spawn' evita heredar el estado de TensorFlow del proceso principal
+    contexto = multiprocessing.get_context('spawn')
+    nucleos_libres = contexto.Queue()
+    for grupo in grupos:
+        nucleos_libres.put(grupo)
+
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto, initializer=iniciar_trabajador,
+                             initargs=(nucleos_libres, hilos)) as pool:
+        while True:
+            ronda += 1
+            print(f"\nRonda {ronda}: {len(supervivientes)} candidatos hasta {epocas} épocas")
+            trabajos = [{
+                'candidato': candidato,
+                'ruta_modelo': os.path.join(carpeta_salida, 'candidatos', f"candidato_{candidato['id']}.keras"),
+                'paquete': paquete, 'batch_size': batch_size, 'lotes_por_epoca': lotes_por_epoca,
+                'semilla': semilla, 'epoca_inicial': epocas_hechas, 'epoca_final': epocas
+            } for candidato in supervivientes]
+
+            futuros = {pool.submit(entrenar_candidato, trabajo): trabajo['candidato'] for trabajo in trabajos}
+            for futuro in as_completed(futuros):
+                candidato = futuros[futuro]
+                fila = filas[candidato['id']]
+                fila['ronda'] = ronda
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    # Por ejemplo, una arquitectura que con padding 'valid' se queda sin píxeles
+                    fila['error'] = str(e).splitlines()[0][:120]
+                    print(f"  ✗ {candidato['id']}: {fila['error']}")
+                    continue
+                fila.update({clave: valor for clave, valor in resultado.items() if clave != 'segundos'})
+                print(f"  ✓ {candidato['id']}: val_accuracy {resultado['val_accuracy']:.4f} "
+                      f"({resultado['segundos']:.1f} s) {fila['candidato']}")
+
+            validos = [c for c in supervivientes if not filas[c['id']]['error']]
+            validos.sort(key=lambda c: filas[c['id']]['val_accuracy'], reverse=True)
+            epocas_hechas = epocas
+            if len(validos) <= 1 or epocas >= epocas_maximas:
+                break
+            supervivientes = validos[:max(1, len(validos) // eta)]
+            epocas = min(epocas * eta, epocas_maximas)
+
+    # La latencia se mide de uno en uno, con los entrenamientos ya terminados, y cada candidato
+    # en un proceso nuevo que usa los hilos por defecto (como el detector) y no los del pool
+    print(f"\nMidiendo la latencia de inferencia de cada candidato (backend {backend_latencia})...")
+    # (un pool de un proceso por candidato: max_tasks_per_child solo existe desde Python 3.11)
+    for fila in filas.values():
+        if not fila['error']:
+            ruta = os.path.join(carpeta_salida, 'candidatos', f"candidato_{fila['id']}.keras")
+            try:
+                with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as medidor:
+                    fila['latencia_ms'] = medidor.submit(medir_candidato, ruta, backend_latencia).result()
+            except Exception as e:
+                print(f"  ✗ {fila['id']}: no se pudo medir la latencia ({str(e).splitlines()[0][:120]})")
+
+    print(f"\nBarrido completado en {time.perf_counter() - inicio:.1f} s")
+    clasificacion = sorted(filas.values(), reverse=True,
+                           key=lambda f: (not f['error'], f['ronda'], f['val_accuracy'] or 0.0))
+    guardar_clasificacion(clasificacion, carpeta_salida)
+
+    if validos:
+        # El mejor se guarda como .h5, el formato que usan el detector y exportar_modelo.py
+        import tensorflow as tf
+        ruta_mejor = os.path.join(carpeta_salida, 'modelo_expresiones.h5')
+        mejor = os.path.join(carpeta_salida, 'candidatos', f"candidato_{validos[0]['id']}.keras")
+        tf.keras.models.load_model(mejor).save(ruta_mejor)
+        print(f"Mejor candidato: {nombre_candidato(validos[0])} -> {ruta_mejor}")
+    return clasificacion
+
+def guardar_clasificacion(clasificacion, carpeta_salida):
+    """Muestra la clasificación y la guarda en JSON y CSV"""
+    print(f"\n{'#':>3} {'ronda':>5} {'épocas':>6} {'val_acc':>8} {'parámetros':>11} {'lat. ms':>8}  candidato")
+    for posicion, fila in enumerate(clasificacion, 1):
+        if fila['error']:
+            print(f"{posicion:>3} {fila['ronda']:>5} {'-':>6} {'error':>8} {'-':>11} {'-':>8}  {fila['candidato']}")
+            continue
+        latencia = f"{fila['latencia_ms']:>8.2f}" if fila['latencia_ms'] is not None else f"{'-':>8}"
+        print(f"{posicion:>3} {fila['ronda']:>5} {fila['epocas']:>6} {fila['val_accuracy']:>8.4f} "
+              f"{fila['parametros']:>11,} {latencia}  {fila['candidato']}")
+
+    with open(os.path.join(carpeta_salida, 'clasificacion.json'), 'w', encoding='utf-8') as f:
+        json.dump(clasificacion, f, indent=2, ensure_ascii=False)
+    with open(os.path.join(carpeta_salida, 'clasificacion.csv'), 'w', newline='', encoding='utf-8') as f:
+        escritor = csv.DictWriter(f, fieldnames=list(clasificacion[0]))
+        escritor.writeheader()
+        escritor.writerows(clasificacion)
+    print(f"Clasificación guardada en '{carpeta_salida}'")
+
+if __name__ == "__main__":
+    from empaquetar_dataset import RUTA_PAQUETE
+
+    parser = argparse.ArgumentParser(description="Barrido de arquitecturas e hiperparámetros con successive halving")
+    parser.add_argument('--paquete', default=RUTA_PAQUETE,
+                        help="Dataset empaquetado (python version_completa/empaquetar_dataset.py)")
+    parser.add_argument('--espacio', default=None,
+                        help="JSON con las opciones de cada parámetro (por defecto, ESPACIO_POR_DEFECTO)")
+    parser.add_argument('--candidatos', type=int, default=None, help="Probar solo una muestra aleatoria")
+    parser.add_argument('--procesos', type=int, default=None)
+    parser.add_argument('--eta', type=int, default=3, help="En cada ronda sigue 1 de cada eta candidatos")
+    parser.add_argument('--epocas-iniciales', type=int, default=2)
+    parser.add_argument('--epocas-maximas', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--lotes-por-epoca', type=int, default=None, help="Limitar los lotes de cada época")
+    parser.add_argument('--salida', default='barrido_modelos')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--backend-latencia', choices=['keras', 'optimizado'], default='optimizado',
+                        help="Backend con el que se mide la latencia (el del detector por defecto)")
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(args.paquete, 'indice.json')):
+        print(f"No existe el dataset empaquetado '{args.paquete}'. Créalo con:")
+        print("  python version_completa/empaquetar_dataset.py")
+    else:
+        espacio = ESPACIO_POR_DEFECTO
+        if args.espacio:
+            with open(args.espacio, encoding='utf-8') as f:
+                espacio = json.load(f)
+        barrido(args.paquete, espacio, args.candidatos, args.procesos, args.eta, args.epocas_iniciales,
+                args.epocas_maximas, args.batch_size, args.lotes_por_epoca, args.salida, args.semilla,
+                args.backend_latencia)
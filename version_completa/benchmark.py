@@ -0,0 +1,269 @@
+import argparse
+import cv2
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from datetime import datetime
+from medicion import RegistroEtapas, percentiles
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def cajas_sinteticas(forma, num_rostros):
+    """Reparte `num_rostros` cajas cuadradas en una cuadrícula sobre la imagen"""
+    if num_rostros <= 0:
+        return []
+    alto, ancho = forma[:2]
+    columnas = int(math.ceil(math.sqrt(num_rostros)))
+    filas = int(math.ceil(num_rostros / columnas))
+    celda_ancho, celda_alto = ancho // columnas, alto // filas
+    lado = int(min(celda_ancho, celda_alto) * 0.6)
+    cajas = []
+    for i in range(num_rostros):
+        fila, columna = divmod(i, columnas)
+        x = columna * celda_ancho + (celda_ancho - lado) // 2
+        y = fila * celda_alto + (celda_alto - lado) // 2
+        cajas.append((x, y, lado, lado))
+    return cajas
+
+def fotogramas_sinteticos(ancho, alto, cantidad=8, semilla=0):
+    """Genera fotogramas BGR con textura suave (distintos entre sí para que no se reutilicen predicciones)"""
+    rng = np.random.default_rng(semilla)
+    fotogramas = []
+    for _ in range(cantidad):
+        ruido = rng.integers(0, 256, (alto // 8 + 1, ancho // 8 + 1, 3), dtype=np.uint8)
+        fotogramas.append(cv2.resize(ruido, (ancho, alto), interpolation=cv2.INTER_LINEAR))
+    return fotogramas
+
+def fotogramas_grabados(ruta_video, ancho, alto, cantidad):
+    """Lee hasta `cantidad` fotogramas de un vídeo y los redimensiona a la resolución pedida"""
+    cap = cv2.VideoCapture(ruta_video)
+    fotogramas = []
+    while len(fotogramas) < cantidad:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        fotogramas.append(cv2.resize(frame, (ancho, alto)))
+    cap.release()
+    return fotogramas
+
+def usar_rostros_sinteticos(detector, num_rostros):
+    """Hace que el seguidor del detector devuelva `num_rostros` cajas fijas
+
+    El detector real se sigue ejecutando sobre el fotograma completo para medir
+    su coste, pero su resultado se sustituye por las cajas sintéticas.
+    """
+    detectar_real = detector.seguidor.detectar
+
+    def detectar(imagen):
+        cajas = detectar_real(imagen)
+        if num_rostros is None:
+            return cajas
+        return cajas_sinteticas(imagen.shape, num_rostros)
+
+    detector.seguidor.detectar = detectar
+    return detectar_real
+
+def preparar_modelo_aleatorio(backend, carpeta):
+    """Guarda un modelo con la arquitectura de entrenar_modelo.py y pesos aleatorios (misma latencia)"""
+    from entrenar_modelo import crear_modelo
+    ruta_h5 = os.path.join(carpeta, 'modelo_expresiones.h5')
+    crear_modelo().save(ruta_h5)
+    if backend == 'tflite':
+        from exportar_modelo import exportar_tflite
+        exportar_tflite(ruta_h5)
+    elif backend == 'opencv':
+        from exportar_modelo import exportar_onnx
+        exportar_onnx(ruta_h5)
+    return ruta_h5
+
+def crear_detector(tipo, ruta_modelo, backend):
+    if tipo == 'personajes':
+        sys.path.append(os.path.join(RAIZ, 'version_simple'))
+        from detector_simple import DetectorPersonajes
+        return DetectorPersonajes()
+
+    from detector_expresiones import DetectorExpresiones
+    return DetectorExpresiones(ruta_modelo, backend)
+
+def medir_escenario(detector, fotogramas, num_rostros, num_fotogramas, calentamiento=10, ventana=False):
+    """Ejecuta el pipeline completo sobre los fotogramas y devuelve FPS y percentiles por etapa"""
+    registro = RegistroEtapas()
+    detector.etapas = registro
+    detector.reiniciar()
+    detectar_real = usar_rostros_sinteticos(detector, num_rostros)
+
+    try:
+        for i in range(calentamiento + num_fotogramas):
+            if i == calentamiento:
+                registro.reiniciar()
+
+            inicio = time.perf_counter()
+            with registro.etapa('volteo'):
+                frame = cv2.flip(fotogramas[i % len(fotogramas)], 1,
+                                 dst=detector.buffers.obtener('espejo', fotogramas[0].shape))
+            detector.procesar_fotograma(frame)
+            with registro.etapa('render'):
+                if ventana:
+                    cv2.imshow('Benchmark', frame)
+                    cv2.waitKey(1)
+                else:
+                    # Sin pantalla se mide la codificación JPEG como sumidero del fotograma
+                    cv2.imencode('.jpg', frame)
+            registro.anotar('total', time.perf_counter() - inicio)
+    finally:
+        detector.seguidor.detectar = detectar_real
+
+    resumen = registro.resumen()
+    media_total = resumen['total']['media_ms'] / 1000.0
+    return {'fps': round(1.0 / media_total, 2) if media_total > 0 else 0.0, 'etapas': resumen}
+
+def medir_memoria(detector, fotogramas, num_rostros, num_fotogramas=50, calentamiento=10):
+    """Memoria reservada de forma transitoria por fotograma (volteo + procesado) en régimen estacionario
+
+    Con tracemalloc se mide, para cada fotograma, el pico de memoria por encima
+    de la que había al empezarlo; numpy y los arrays que devuelve cv2 se
+    registran en tracemalloc. Se ejecuta aparte de la medida de latencia porque
+    tracemalloc ralentiza el bucle.
+    """
+    detector.reiniciar()
+    detectar_real = usar_rostros_sinteticos(detector, num_rostros)
+    transitoria = []
+    try:
+        for i in range(calentamiento + num_fotogramas):
+            if i == calentamiento:
+                tracemalloc.start()
+                reservas_iniciales = detector.buffers.asignaciones
+            if i >= calentamiento:
+                if hasattr(tracemalloc, 'reset_peak'):
+                    tracemalloc.reset_peak()
+                else:
+                    # Python 3.8 no tiene reset_peak(): reiniciar el trazado también pone el pico a cero
+                    tracemalloc.stop()
+                    tracemalloc.start()
+                base = tracemalloc.get_traced_memory()[0]
+            frame = cv2.flip(fotogramas[i % len(fotogramas)], 1,
+                             dst=detector.buffers.obtener('espejo', fotogramas[0].shape))
+            detector.procesar_fotograma(frame)
+            if i >= calentamiento:
+                transitoria.append((tracemalloc.get_traced_memory()[1] - base) / 1024.0)
+    finally:
+        tracemalloc.stop()
+        detector.seguidor.detectar = detectar_real
+
+    return {
+        **{f"{p}_kb": round(v, 1) for p, v in percentiles(transitoria).items()},
+        'max_kb': round(max(transitoria), 1),
+        'reservas_buffers': detector.buffers.asignaciones - reservas_iniciales
+    }
+
+def comparar(resultados, ruta_referencia, tolerancia=0.10):
+    """Compara con un archivo de resultados anterior e informa de las regresiones de p95 y FPS"""
+    with open(ruta_referencia, encoding='utf-8') as f:
+        referencia = json.load(f)
+    anteriores = {(r['detector'], r['resolucion'], r['rostros']): r for r in referencia['resultados']}
+
+    regresiones = 0
+    for resultado in resultados:
+        anterior = anteriores.get((resultado['detector'], resultado['resolucion'], resultado['rostros']))
+        if anterior is None:
+            continue
+        escenario = f"{resultado['detector']} {resultado['resolucion']} rostros={resultado['rostros']}"
+        if resultado['fps'] < anterior['fps'] * (1 - tolerancia):
+            print(f"  ✗ {escenario}: FPS {anterior['fps']} -> {resultado['fps']}")
+            regresiones += 1
+        for etapa, datos in resultado['etapas'].items():
+            datos_anteriores = anterior['etapas'].get(etapa)
+            if datos_anteriores and datos['p95_ms'] > datos_anteriores['p95_ms'] * (1 + tolerancia):
+                print(f"  ✗ {escenario} [{etapa}]: p95 {datos_anteriores['p95_ms']:.2f} ms -> {datos['p95_ms']:.2f} ms")
+                regresiones += 1
+    print(f"Regresiones frente a {ruta_referencia}: {regresiones}")
+    return regresiones
+
+def ejecutar_benchmark(detectores, resoluciones, lista_rostros, num_fotogramas=200, ruta_modelo=None,
+                       backend='keras', video=None, ventana=False, memoria=False):
+    """Mide todos los escenarios (detector x resolución x número de rostros)"""
+    resultados = []
+    for tipo in detectores:
+        detector = crear_detector(tipo, ruta_modelo, backend)
+        for ancho, alto in resoluciones:
+            if video:
+                fotogramas = fotogramas_grabados(video, ancho, alto, num_fotogramas)
+                escenarios = [None]
+            else:
+                fotogramas = fotogramas_sinteticos(ancho, alto)
+                escenarios = lista_rostros
+
+            for num_rostros in escenarios:
+                medida = medir_escenario(detector, fotogramas, num_rostros, num_fotogramas, ventana=ventana)
+                if memoria:
+                    medida['memoria'] = medir_memoria(detector, fotogramas, num_rostros)
+                resultado = {
+                    'detector': tipo,
+                    'resolucion': f"{ancho}x{alto}",
+                    'rostros': 'video' if num_rostros is None else num_rostros,
+                    **medida
+                }
+                resultados.append(resultado)
+
+                etapas = ", ".join(f"{nombre} {datos['p50_ms']:.2f}/{datos['p95_ms']:.2f}/{datos['p99_ms']:.2f}"
+                                   for nombre, datos in medida['etapas'].items() if nombre != 'total')
+                print(f"{tipo:11s} {ancho}x{alto} rostros={resultado['rostros']}: "
+                      f"{medida['fps']:.1f} FPS | p50/p95/p99 ms: {etapas}")
+                if memoria:
+                    datos = medida['memoria']
+                    print(f"{'':11s} memoria transitoria por fotograma: p50 {datos['p50_kb']} KB, "
+                          f"máx {datos['max_kb']} KB, reservas de buffers: {datos['reservas_buffers']}")
+    return resultados
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de latencia por etapa de los detectores")
+    parser.add_argument('--detectores', default='expresiones,personajes')
+    parser.add_argument('--resoluciones', default='640x480,1280x720,1920x1080')
+    parser.add_argument('--rostros', default='0,1,4,6', help="Número de rostros sintéticos por fotograma")
+    parser.add_argument('--fotogramas', type=int, default=200)
+    parser.add_argument('--video', default=None, help="Usar fotogramas de un vídeo grabado en lugar de sintéticos")
+    parser.add_argument('--modelo', default='./version_completa/modelos/3/modelo_expresiones.h5')
+    parser.add_argument('--backend', choices=['keras', 'tflite', 'opencv'], default='keras')
+    parser.add_argument('--modelo-aleatorio', action='store_true',
+                        help="Usar la arquitectura de entrenar_modelo.py con pesos aleatorios")
+    parser.add_argument('--ventana', action='store_true', help="Medir el render con cv2.imshow")
+    parser.add_argument('--memoria', action='store_true',
+                        help="Medir también la memoria reservada por fotograma (tracemalloc)")
+    parser.add_argument('--salida', default='benchmark_resultados.json')
+    parser.add_argument('--referencia', default=None, help="Resultados anteriores con los que comparar")
+    args = parser.parse_args()
+
+    detectores = [d.strip() for d in args.detectores.split(',') if d.strip()]
+    resoluciones = [tuple(int(v) for v in r.split('x')) for r in args.resoluciones.split(',')]
+    lista_rostros = [int(n) for n in args.rostros.split(',')]
+
+    ruta_modelo = args.modelo
+    carpeta_temporal = tempfile.mkdtemp() if args.modelo_aleatorio else None
+    if carpeta_temporal:
+        ruta_modelo = preparar_modelo_aleatorio(args.backend, carpeta_temporal)
+
+    resultados = ejecutar_benchmark(detectores, resoluciones, lista_rostros, args.fotogramas,
+                                    ruta_modelo, args.backend, args.video, args.ventana, args.memoria)
+
+    informe = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'maquina': {'sistema': platform.platform(), 'procesador': platform.processor(),
+                    'python': platform.python_version(), 'opencv': cv2.__version__,
+                    'nucleos': os.cpu_count()},
+        'config': {'modelo': None if args.modelo_aleatorio else ruta_modelo, 'backend': args.backend,
+                   'fotogramas': args.fotogramas, 'video': args.video,
+                   'render': 'imshow' if args.ventana else 'imencode'},
+        'resultados': resultados
+    }
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {args.salida}")
+
+    if args.referencia:
+        comparar(resultados, args.referencia)
@@ -0,0 +1,75 @@
+import numpy as np
+
+class EstadoRostro:
+    """Última entrada clasificada y probabilidades suavizadas de un rostro seguido"""
+
+    def __init__(self, rostro, probabilidades):
+        self.rostro = rostro
+        self.probabilidades = np.asarray(probabilidades, dtype=np.float32)
+        self.reutilizaciones = 0
+
+class CachePredicciones:
+    """Reutiliza la predicción de cada rostro seguido mientras su recorte apenas cambie
+
+    Para cada pista se guarda el último recorte 48x48 que pasó por la red. Si el
+    recorte nuevo difiere de él menos de `umbral_cambio` (diferencia absoluta
+    media en escala 0-1), se reutiliza el vector de probabilidades sin llamar al
+    modelo, como mucho `max_reutilizaciones` fotogramas seguidos. Con
+    `intervalo_clasificacion` > 1 cada rostro se clasifica como mucho una vez
+    cada ese número de fotogramas aunque cambie. Las
+    probabilidades de cada rostro se suavizan con una media móvil exponencial
+    para evitar el parpadeo entre personajes.
+    """
+
+    def __init__(self, umbral_cambio=0.02, factor_suavizado=0.4, max_reutilizaciones=15, intervalo_clasificacion=1):
+        self.umbral_cambio = umbral_cambio
+        self.intervalo_clasificacion = intervalo_clasificacion
+        self.factor_suavizado = factor_suavizado
+        self.max_reutilizaciones = max_reutilizaciones
+        self.estados = {}
+
+        # Estadísticas
+        self.inferencias = 0
+        self.reutilizaciones = 0
+
+    def necesita_inferencia(self, identificador, rostro):
+        """Indica si el rostro ha cambiado lo suficiente como para volver a clasificarlo"""
+        estado = self.estados.get(identificador)
+        if estado is None or estado.reutilizaciones >= self.max_reutilizaciones:
+            return True
+        if estado.reutilizaciones + 1 < self.intervalo_clasificacion:
+            return False
+        diferencia = float(np.mean(np.abs(np.asarray(rostro, dtype=np.float32) - estado.rostro)))
+        return diferencia > self.umbral_cambio
+
+    def actualizar(self, identificador, rostro, probabilidades):
+        """Guarda una predicción nueva y devuelve las probabilidades suavizadas"""
+        self.inferencias += 1
+        rostro = np.array(rostro, dtype=np.float32).reshape(48, 48, 1)
+        estado = self.estados.get(identificador)
+        if estado is None:
+            self.estados[identificador] = EstadoRostro(rostro, probabilidades)
+            return self.estados[identificador].probabilidades
+
+        alfa = self.factor_suavizado
+        estado.probabilidades = alfa * np.asarray(probabilidades, dtype=np.float32) + (1.0 - alfa) * estado.probabilidades
+        estado.rostro = rostro
+        estado.reutilizaciones = 0
+        return estado.probabilidades
+
+    def reutilizar(self, identificador):
+        """Devuelve las probabilidades suavizadas guardadas sin ejecutar el modelo"""
+        self.reutilizaciones += 1
+        estado = self.estados[identificador]
+        estado.reutilizaciones += 1
+        return estado.probabilidades
+
+    def reiniciar(self):
+        """Elimina el estado de todos los rostros"""
+        self.estados.clear()
+
+    def olvidar(self, identificadores_activos):
+        """Elimina el estado de los rostros que ya no se siguen"""
+        activos = set(identificadores_activos)
+        for identificador in [i for i in self.estados if i not in activos]:
+            del self.estados[identificador]
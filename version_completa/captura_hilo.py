@@ -0,0 +1,117 @@
+import cv2
+import threading
+import time
+from collections import deque, namedtuple
+
+# Fotograma leído de la fuente con su número de orden y el instante de captura (time.monotonic)
+Fotograma = namedtuple('Fotograma', ['indice', 'marca_tiempo', 'imagen'])
+
+class CapturaEnHilo:
+    """Lee fotogramas de una fuente de vídeo en un hilo propio
+
+    Los fotogramas se guardan en un buffer circular acotado. En modo cámara
+    (descartar=True) el bucle de procesamiento recibe siempre el fotograma
+    más reciente y los que no llegó a procesar se cuentan como descartados,
+    así la latencia no crece aunque la detección sea más lenta que la cámara.
+    Para archivos de vídeo se puede usar descartar=False y no perder ninguno.
+    """
+
+    def __init__(self, fuente=0, capacidad=2, descartar=True):
+        self.fuente = fuente
+        self.cap = cv2.VideoCapture(fuente)
+        self.buffer = deque(maxlen=capacidad)
+        self.descartar = descartar
+        self.condicion = threading.Condition()
+        self.hilo = None
+        self.activo = False
+        self.terminado = False
+
+        # Estadísticas
+        self.leidos = 0
+        self.entregados = 0
+        self.descartados = 0
+        self.ultimo_fotograma = None
+
+    def iniciar(self):
+        """Arranca el hilo de lectura (devuelve la propia captura para encadenar)"""
+        if self.hilo is None and self.cap.isOpened():
+            self.activo = True
+            self.hilo = threading.Thread(target=self._bucle_lectura, daemon=True)
+            self.hilo.start()
+        return self
+
+    def _bucle_lectura(self):
+        """Lee de la fuente continuamente y guarda los fotogramas en el buffer"""
+        while self.activo:
+            ret, imagen = self.cap.read()
+            marca_tiempo = time.monotonic()
+
+            with self.condicion:
+                if not ret:
+                    self.terminado = True
+                    self.condicion.notify_all()
+                    break
+
+                if self.descartar:
+                    # El buffer está lleno: el fotograma más antiguo se sobrescribe
+                    if len(self.buffer) == self.buffer.maxlen:
+                        self.descartados += 1
+                else:
+                    # Sin descarte: esperar a que el consumidor libere espacio
+                    while self.activo and len(self.buffer) == self.buffer.maxlen:
+                        self.condicion.wait()
+
+                self.buffer.append(Fotograma(self.leidos, marca_tiempo, imagen))
+                self.leidos += 1
+                self.condicion.notify_all()
+
+    def leer(self, tiempo_espera=None):
+        """Devuelve el siguiente Fotograma (el más reciente en modo cámara) o None si la fuente terminó"""
+        with self.condicion:
+            while not self.buffer and not self.terminado and self.activo:
+                if not self.condicion.wait(tiempo_espera):
+                    return None
+
+            if not self.buffer:
+                return None
+
+            if self.descartar:
+                fotograma = self.buffer.pop()
+                self.descartados += len(self.buffer)
+                self.buffer.clear()
+            else:
+                fotograma = self.buffer.popleft()
+
+            self.entregados += 1
+            self.ultimo_fotograma = fotograma
+            self.condicion.notify_all()
+            return fotograma
+
+    def read(self):
+        """Equivalente a cv2.VideoCapture.read() para usarla en los bucles existentes"""
+        fotograma = self.leer()
+        if fotograma is None:
+            return False, None
+        return True, fotograma.imagen
+
+    def isOpened(self):
+        return self.cap.isOpened() and not (self.terminado and not self.buffer)
+
+    def latencia(self):
+        """Segundos transcurridos desde la captura del último fotograma entregado"""
+        if self.ultimo_fotograma is None:
+            return 0.0
+        return time.monotonic() - self.ultimo_fotograma.marca_tiempo
+
+    def get(self, propiedad):
+        return self.cap.get(propiedad)
+
+    def release(self):
+        """Detiene el hilo de lectura y libera la fuente"""
+        with self.condicion:
+            self.activo = False
+            self.condicion.notify_all()
+        if self.hilo is not None:
+            self.hilo.join(timeout=1.0)
+            self.hilo = None
+        self.cap.release()
@@ -2,6 +2,10 @@ import cv2
 import os
 import numpy as np
 import time
+from captura_hilo import CapturaEnHilo
+from empaquetar_dataset import RUTA_PAQUETE
+from escritor_dataset import EscritorDataset
+from detectores_rostro import crear_detector_rostros
 
 def crear_directorios():
     """Crea la estructura de directorios para almacenar las imágenes"""
@@ -21,16 +25,14 @@ def crear_directorios():
     
     return base_dir
 
-def capturar_imagenes():
+def capturar_imagenes(empaquetado=False, detector_rostros='haar', opciones_detector=None):
     """Captura imágenes desde la cámara para el conjunto de datos"""
-    # Crear directorios
-    base_dir = crear_directorios()
-    
     # Inicializar detector de rostros
-    detector_rostro = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    # (por defecto Haar con escala 1.3 y 5 vecinos; ver detectores_rostro.py para ajustarlo)
+    detector_rostro = crear_detector_rostros(detector_rostros, **(opciones_detector or {}))
     
-    # Inicializar cámara
-    cap = cv2.VideoCapture(0)
+    # Inicializar cámara (lectura en un hilo propio, siempre el fotograma más reciente)
+    cap = CapturaEnHilo(0).iniciar()
     
     if not cap.isOpened():
         print("Error: No se pudo abrir la cámara")
@@ -38,6 +40,15 @@ def capturar_imagenes():
     
     # Configuración
     expresiones = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+
+    # Escritura en segundo plano: un JPEG por rostro o directamente al dataset empaquetado
+    # (el árbol de carpetas solo hace falta para los JPEG; el paquete es el que leen
+    # entrenar_modelo.py y barrido_modelos.py)
+    if empaquetado:
+        escritor = EscritorDataset(RUTA_PAQUETE, 'empaquetado', clases=expresiones).iniciar()
+    else:
+        escritor = EscritorDataset(crear_directorios(), 'jpeg').iniciar()
+    base_dir = escritor.ruta
     num_imagenes = 50  # Número de imágenes a capturar por expresión
     contador = 0
     expresion_actual = 0
@@ -65,7 +76,7 @@ def capturar_imagenes():
         gris = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         
         # Detectar rostros
-        rostros = detector_rostro.detectMultiScale(gris, 1.3, 5)
+        rostros = detector_rostro.detectar(gris)
         
         # Variables para la interfaz
         info_texto = f"Expresión: {expresiones[expresion_actual]} | Capturas: {capturas_realizadas}/{num_imagenes}"
@@ -103,23 +114,20 @@ def capturar_imagenes():
                         else:
                             conjunto = 'validation'
                         
-                        # Ruta para guardar
-                        ruta_guardar = os.path.join(
-                            base_dir, 
-                            conjunto, 
-                            expresiones[expresion_actual], 
-                            f"{expresiones[expresion_actual]}_{contador}.jpg"
-                        )
+                        # Nombre del archivo (solo se usa en formato JPEG)
+                        nombre = f"{expresiones[expresion_actual]}_{contador}.jpg"
                         
-                        # Guardar imagen
-                        cv2.imwrite(ruta_guardar, rostro_redim)
+                        # Encolar la imagen; los hilos del escritor la guardan en disco
+                        if not escritor.guardar(rostro_redim, conjunto, expresiones[expresion_actual], nombre):
+                            print("Aviso: cola de escritura llena, captura descartada")
+                            continue
                         
                         # Actualizar contador
                         contador += 1
                         capturas_realizadas += 1
                         
                         # Mostrar mensaje de captura
-                        print(f"Imagen guardada: {ruta_guardar}")
+                        print(f"Imagen capturada: {conjunto}/{expresiones[expresion_actual]}/{nombre}")
                 
                 # Verificar si terminamos con esta expresión
                 if capturas_realizadas >= num_imagenes:
@@ -165,6 +173,10 @@ def capturar_imagenes():
     cap.release()
     cv2.destroyAllWindows()
     
+    # Terminar de escribir lo que quede en la cola
+    print(f"Guardando {escritor.pendientes()} imágenes pendientes...")
+    escritor.cerrar()
+    
     print("Proceso de captura finalizado")
     print(f"Las imágenes se han guardado en la carpeta: {base_dir}")
 
@@ -176,6 +188,7 @@ if __name__ == "__main__":
     respuesta = input("¿Deseas comenzar la captura de imágenes? (s/n): ")
     
     if respuesta.lower() == 's':
-        capturar_imagenes()
+        respuesta = input("¿Guardar directamente en el dataset empaquetado en lugar de JPEG? (s/n): ")
+        capturar_imagenes(empaquetado=respuesta.lower() == 's')
     else:
         print("Operación cancelada.") 
\ No newline at end of file
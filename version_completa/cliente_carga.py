@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import json
+import time
+import numpy as np
+from medicion import percentiles
+
+async def peticion(lector, escritor, host, ruta, cuerpo):
+    """Envía una petición POST HTTP/1.1 por una conexión abierta y devuelve (código, cuerpo)"""
+    escritor.write(
+        f"POST {ruta} HTTP/1.1\r\nHost: {host}\r\n"
+        f"Content-Type: application/octet-stream\r\nContent-Length: {len(cuerpo)}\r\n\r\n".encode('latin-1') + cuerpo)
+    await escritor.drain()
+
+    cabecera = await lector.readuntil(b'\r\n\r\n')
+    lineas = cabecera.decode('latin-1').split('\r\n')
+    codigo = int(lineas[0].split(' ')[1])
+    longitud = 0
+    for linea in lineas[1:]:
+        if linea.lower().startswith('content-length:'):
+            longitud = int(linea.split(':', 1)[1])
+    return codigo, await lector.readexactly(longitud)
+
+async def quiosco(host, puerto, ruta, cuerpos, fin, latencias, errores):
+    """Simula un cliente que envía peticiones una tras otra hasta el instante `fin`"""
+    lector, escritor = await asyncio.open_connection(host, puerto)
+    i = 0
+    try:
+        while time.perf_counter() < fin:
+            inicio = time.perf_counter()
+            codigo, _ = await peticion(lector, escritor, host, ruta, cuerpos[i % len(cuerpos)])
+            if codigo == 200:
+                latencias.append(time.perf_counter() - inicio)
+            else:
+                errores.append(codigo)
+            i += 1
+    finally:
+        escritor.close()
+
+async def medir_concurrencia(host, puerto, ruta, cuerpos, concurrencia, duracion, rostros_por_peticion):
+    """Lanza `concurrencia` clientes durante `duracion` segundos y resume rendimiento y latencia"""
+    latencias, errores = [], []
+    inicio = time.perf_counter()
+    fin = inicio + duracion
+    await asyncio.gather(*[quiosco(host, puerto, ruta, cuerpos, fin, latencias, errores)
+                           for _ in range(concurrencia)])
+    transcurrido = time.perf_counter() - inicio
+
+    latencias_ms = np.asarray(latencias) * 1000.0
+    resultado = {
+        'concurrencia': concurrencia,
+        'peticiones': len(latencias),
+        'errores': len(errores),
+        'peticiones_por_segundo': round(len(latencias) / transcurrido, 2),
+        'rostros_por_segundo': round(len(latencias) * rostros_por_peticion / transcurrido, 2),
+        **{f"{p}_ms": round(v, 2) for p, v in percentiles(latencias_ms).items()}
+    }
+    return resultado
+
+async def ejecutar(args):
+    if args.imagen:
+        with open(args.imagen, 'rb') as f:
+            cuerpos = [f.read()]
+        ruta, rostros_por_peticion = '/fotograma', 1
+    else:
+        # Rostros aleatorios 48x48 (distintos en cada petición)
+        rng = np.random.default_rng(0)
+        cuerpos = [rng.integers(0, 256, (args.rostros, 48, 48), dtype=np.uint8).tobytes() for _ in range(16)]
+        ruta, rostros_por_peticion = '/rostros', args.rostros
+
+    resultados = []
+    print(f"{'clientes':>8} {'pet/s':>8} {'rostros/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errores':>8}")
+    for concurrencia in [int(c) for c in args.concurrencias.split(',')]:
+        r = await medir_concurrencia(args.host, args.puerto, ruta, cuerpos, concurrencia,
+                                     args.duracion, rostros_por_peticion)
+        resultados.append(r)
+        print(f"{r['concurrencia']:>8} {r['peticiones_por_segundo']:>8.1f} {r['rostros_por_segundo']:>10.1f} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['errores']:>8}")
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump({'ruta': ruta, 'rostros_por_peticion': rostros_por_peticion, 'resultados': resultados},
+                      f, indent=2, ensure_ascii=False)
+        print(f"Resultados guardados en {args.salida}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generador de carga para el servicio de inferencia")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8765)
+    parser.add_argument('--concurrencias', default='1,2,4,8,16', help="Clientes simultáneos a probar")
+    parser.add_argument('--duracion', type=float, default=10.0, help="Segundos por nivel de concurrencia")
+    parser.add_argument('--rostros', type=int, default=1, help="Rostros por petición (ruta /rostros)")
+    parser.add_argument('--imagen', default=None, help="JPEG a enviar a /fotograma en lugar de rostros")
+    parser.add_argument('--salida', default=None, help="Guardar los resultados en JSON")
+    asyncio.run(ejecutar(parser.parse_args()))
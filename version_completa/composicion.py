@@ -0,0 +1,138 @@
+import cv2
+import numpy as np
+from collections import OrderedDict, namedtuple
+
+# Sprite listo para componer: color premultiplicado por alfa y alfa invertido, ambos (h, w, 3) uint8
+Sprite = namedtuple('Sprite', ['color', 'alfa_inv', 'opaco'])
+
+def preparar_sprite(imagen):
+    """Convierte una imagen BGR o BGRA en un Sprite con alfa premultiplicado"""
+    if imagen.ndim == 2:
+        imagen = cv2.cvtColor(imagen, cv2.COLOR_GRAY2BGR)
+
+    if imagen.shape[2] == 4:
+        alfa = imagen[:, :, 3:4]
+        # color * alfa / 255 con redondeo, en aritmética entera
+        producto = imagen[:, :, :3].astype(np.uint16) * alfa + 128
+        color = ((producto + (producto >> 8)) >> 8).astype(np.uint8)
+        # El alfa invertido se repite en los 3 canales para mezclar con operaciones de cv2
+        alfa_inv = cv2.merge([255 - alfa] * 3)
+        opaco = bool(np.all(alfa == 255))
+    else:
+        color = np.ascontiguousarray(imagen[:, :, :3])
+        alfa_inv = np.zeros(imagen.shape[:2] + (3,), dtype=np.uint8)
+        opaco = True
+
+    return Sprite(color, alfa_inv, opaco)
+
+def mezclar(destino, sprite, temporal=None):
+    """Mezcla un Sprite sobre la región destino (uint8, mismo tamaño) modificándola en el sitio
+
+    destino = color + redondeo(destino * (255 - alfa) / 255), sin pasar por
+    float64 ni recorrer los canales en Python. `temporal` es un array uint8 de
+    la forma de destino para el producto; si no se pasa se reserva uno.
+    """
+    if sprite.opaco:
+        destino[:] = sprite.color
+        return destino
+
+    if temporal is None:
+        temporal = np.empty_like(destino)
+    cv2.multiply(destino, sprite.alfa_inv, dst=temporal, scale=1.0 / 255.0)
+    # Suma con saturación por si el redondeo de ambos términos llega a 256
+    cv2.add(sprite.color, temporal, dst=destino)
+    return destino
+
+def superponer(frame, sprite, x, y, reserva=None):
+    """Superpone un Sprite en (x, y) recortándolo si se sale de los bordes del frame
+
+    Con una ReservaBuffers el array temporal de la mezcla se reutiliza entre
+    llamadas. Devuelve False si el sprite queda completamente fuera del frame.
+    """
+    alto_frame, ancho_frame = frame.shape[:2]
+    alto, ancho = sprite.color.shape[:2]
+
+    # Intersección del sprite con el frame
+    x1, y1 = max(x, 0), max(y, 0)
+    x2, y2 = min(x + ancho, ancho_frame), min(y + alto, alto_frame)
+    if x1 >= x2 or y1 >= y2:
+        return False
+
+    # Parte visible del sprite
+    sx1, sy1 = x1 - x, y1 - y
+    sx2, sy2 = sx1 + (x2 - x1), sy1 + (y2 - y1)
+    recorte = Sprite(sprite.color[sy1:sy2, sx1:sx2], sprite.alfa_inv[sy1:sy2, sx1:sx2], sprite.opaco)
+
+    temporal = None
+    if reserva is not None and not sprite.opaco:
+        temporal = reserva.obtener_minimo('mezcla', (y2 - y1, x2 - x1, 3))
+    mezclar(frame[y1:y2, x1:x2], recorte, temporal)
+    return True
+
+# Calidad de los sprites: (factor sobre el paso configurado, paso mínimo, interpolación; None = la configurada)
+CALIDADES_SPRITE = {
+    'alta': (1, 1, None),
+    'media': (2, 8, cv2.INTER_LINEAR),
+    'baja': (4, 16, cv2.INTER_NEAREST)
+}
+
+class CacheSprites:
+    """Caché LRU de sprites redimensionados y premultiplicados, por (recurso, tamaño)
+
+    Los tamaños se redondean a múltiplos de `paso` píxeles para que las cajas
+    de rostros, que cambian ligeramente en cada fotograma, reutilicen el mismo
+    sprite en lugar de redimensionar la imagen original cada vez.
+    """
+
+    def __init__(self, capacidad=256, paso=8, interpolacion=cv2.INTER_AREA):
+        self.capacidad = capacidad
+        self.paso = paso
+        self.paso_base = paso
+        self.interpolacion = interpolacion
+        self.interpolacion_base = interpolacion
+        self.sprites = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def tam_bucket(self, valor):
+        """Redondea un tamaño al múltiplo de `paso` más cercano"""
+        if self.paso <= 1:
+            return max(1, int(valor))
+        return max(self.paso, int(round(valor / self.paso)) * self.paso)
+
+    def obtener(self, nombre, imagen, ancho, alto):
+        """Devuelve el sprite de `imagen` para el tamaño pedido, creándolo si no está en caché"""
+        clave = (nombre, self.tam_bucket(ancho), self.tam_bucket(alto))
+
+        sprite = self.sprites.get(clave)
+        if sprite is not None:
+            self.sprites.move_to_end(clave)
+            self.aciertos += 1
+            return sprite
+
+        self.fallos += 1
+        redimensionada = cv2.resize(imagen, (clave[1], clave[2]), interpolation=self.interpolacion)
+        sprite = preparar_sprite(redimensionada)
+        self.sprites[clave] = sprite
+        if len(self.sprites) > self.capacidad:
+            self.sprites.popitem(last=False)
+        return sprite
+
+    def fijar_calidad(self, calidad):
+        """'alta' (la configurada), 'media' o 'baja': tamaños más redondeados (menos
+        redimensionados, más aciertos) e interpolación más barata"""
+        factor, minimo, interpolacion = CALIDADES_SPRITE[calidad]
+        paso = max(self.paso_base * factor, minimo)
+        interpolacion = self.interpolacion_base if interpolacion is None else interpolacion
+        if (paso, interpolacion) != (self.paso, self.interpolacion):
+            self.paso = paso
+            self.interpolacion = interpolacion
+            self.sprites.clear()
+
+    def invalidar(self, nombre=None):
+        """Elimina de la caché los sprites de un recurso (o todos)"""
+        if nombre is None:
+            self.sprites.clear()
+            return
+        for clave in [c for c in self.sprites if c[0] == nombre]:
+            del self.sprites[clave]
@@ -0,0 +1,234 @@
+import csv
+import os
+import time
+from collections import defaultdict
+from medicion import RegistroEtapas, RegistroNulo, percentiles
+
+class Perilla:
+    """Parámetro ajustable en marcha: lista de valores de mejor a más barato y la etapa a la que afecta"""
+
+    def __init__(self, nombre, valores, aplicar, etapas):
+        self.nombre = nombre
+        self.valores = list(valores)
+        self.aplicar = aplicar
+        self.etapas = tuple(etapas)
+        self.indice = 0
+
+    @property
+    def valor(self):
+        return self.valores[self.indice]
+
+    def puede_bajar(self):
+        return self.indice < len(self.valores) - 1
+
+    def mover(self, paso):
+        """Pasa al valor siguiente (paso=1, más barato) o anterior (paso=-1) y lo aplica"""
+        anterior = self.valor
+        self.indice += paso
+        self.aplicar(self.valor)
+        return anterior, self.valor
+
+def escalonar(actual, candidatos, mas_barato_si_mayor):
+    """Valor actual seguido de los candidatos más baratos que él, en orden"""
+    if mas_barato_si_mayor:
+        return [actual] + sorted(v for v in candidatos if v > actual)
+    return [actual] + sorted((v for v in candidatos if v < actual), reverse=True)
+
+class ControlCalidad(RegistroEtapas):
+    """Ajusta la calidad en marcha para mantener unos FPS objetivo y un presupuesto de latencia
+
+    Hace de registro de etapas del detector (con `etapa()` como
+    RegistroEtapas, reenviando las medidas a la instrumentación si la hay) y
+    suma el coste de cada etapa en cada fotograma. Cada `intervalo_decision`
+    segundos compara el coste medio por fotograma con 1000 / `fps_objetivo`
+    ms y su p95 con `presupuesto_ms`:
+      - si se pasa, abarata una perilla de la etapa que más tiempo consume
+        (por ejemplo, la escala del detector si domina la detección);
+      - si lleva `espera_subida` segundos holgado (por debajo de `margen_subida`
+        veces el límite), deshace la última bajada. Si una subida hay que
+        deshacerla enseguida, la espera para volver a subir se duplica.
+    Las perillas solo se mueven entre el valor configurado y otros más baratos:
+    nunca se sube la calidad por encima de lo que se configuró.
+
+    Cada decisión se muestra por consola y, con `ruta_registro`, se añade a un CSV.
+    """
+
+    def __init__(self, fps_objetivo=25.0, presupuesto_ms=None, intervalo_decision=1.0,
+                 margen_subida=0.7, espera_subida=3.0, ruta_registro=None):
+        super().__init__()
+        self.fps_objetivo = fps_objetivo
+        self.presupuesto_ms = presupuesto_ms
+        self.intervalo_decision = intervalo_decision
+        self.margen_subida = margen_subida
+        self.espera_subida_inicial = espera_subida
+        self.espera_subida = espera_subida
+        self.ruta_registro = ruta_registro
+
+        self.registro = RegistroNulo()
+        self.perillas = []
+        self.bajadas = []
+        self.decisiones = []
+
+        # Ventana de medida actual
+        self.coste_etapas = defaultdict(float)
+        self.coste_fotograma = 0.0
+        self.costes = []
+        self.inicio_ventana = None
+        self.holgado_desde = None
+        self.ultima_subida = None
+        self.sin_margen = False
+
+    def encadenar(self, registro):
+        """Reenvía también las medidas a otro registro (por ejemplo, la Instrumentacion)"""
+        self.registro = registro
+        return self
+
+    def registrar(self, nombre, valores, aplicar, etapas):
+        """Añade una perilla; `valores` va del configurado al más barato y `aplicar(valor)` lo fija"""
+        self.perillas = [perilla for perilla in self.perillas if perilla.nombre != nombre]
+        self.bajadas = [perilla for perilla in self.bajadas if perilla.nombre != nombre]
+        if len(valores) > 1:
+            self.perillas.append(Perilla(nombre, valores, aplicar, etapas))
+
+    # --- Interfaz de registro de etapas ---
+
+    def anotar(self, nombre, segundos):
+        self.coste_etapas[nombre] += segundos
+        self.coste_fotograma += segundos
+        self.registro.anotar(nombre, segundos)
+
+    def contar(self, nombre, cantidad=1):
+        self.contadores[nombre] += cantidad
+        self.registro.contar(nombre, cantidad)
+
+    def reiniciar(self):
+        super().reiniciar()
+        self.registro.reiniciar()
+
+    def resumen(self):
+        return self.registro.resumen()
+
+    # --- Control ---
+
+    def limites(self):
+        """(coste medio máximo por fotograma, p95 máximo) en milisegundos"""
+        return 1000.0 / self.fps_objetivo, self.presupuesto_ms
+
+    def tick(self):
+        """Marca el final de un fotograma y, si toca, decide un ajuste"""
+        ahora = time.monotonic()
+        self.costes.append(self.coste_fotograma * 1000.0)
+        self.coste_fotograma = 0.0
+        if self.inicio_ventana is None:
+            # La primera ventana empieza con el primer fotograma completo (sin el arranque)
+            self.inicio_ventana = ahora
+            self.costes.clear()
+            self.coste_etapas.clear()
+            return
+        if ahora - self.inicio_ventana < self.intervalo_decision or not self.costes:
+            return
+
+        fotogramas = len(self.costes)
+        medicion = {
+            'fps': fotogramas / (ahora - self.inicio_ventana),
+            'media_ms': sum(self.costes) / fotogramas,
+            'p95_ms': percentiles(self.costes, (95,))['p95'],
+            'etapas_ms': {nombre: 1000.0 * total / fotogramas for nombre, total in self.coste_etapas.items()}
+        }
+        self.inicio_ventana = ahora
+        self.costes.clear()
+        self.coste_etapas.clear()
+        self.decidir(medicion, ahora)
+
+    def decidir(self, medicion, ahora):
+        limite_media, limite_p95 = self.limites()
+        excede = medicion['media_ms'] > limite_media or (limite_p95 is not None and medicion['p95_ms'] > limite_p95)
+        holgado = medicion['media_ms'] < limite_media * self.margen_subida and \
+            (limite_p95 is None or medicion['p95_ms'] < limite_p95 * self.margen_subida)
+
+        if excede:
+            self.holgado_desde = None
+            # Una subida que no se sostiene: esperar más antes de volver a intentarla
+            if self.ultima_subida is not None and ahora - self.ultima_subida < 2 * self.intervalo_decision + 0.5:
+                self.espera_subida = min(self.espera_subida * 2, 60.0)
+            self.ultima_subida = None
+            self.bajar(medicion)
+        elif holgado and self.bajadas:
+            if self.holgado_desde is None:
+                self.holgado_desde = ahora
+            elif ahora - self.holgado_desde >= self.espera_subida:
+                self.subir(medicion)
+                self.holgado_desde = None
+                self.ultima_subida = ahora
+        else:
+            self.holgado_desde = None
+            if self.ultima_subida is not None and ahora - self.ultima_subida > 4 * self.espera_subida:
+                # Lleva tiempo estable después de subir: volver a la espera inicial
+                self.espera_subida = self.espera_subida_inicial
+                self.ultima_subida = None
+
+    def bajar(self, medicion):
+        """Abarata la perilla de la etapa que más tiempo se lleva (o la de la siguiente, si ya no puede)"""
+        etapas = sorted(medicion['etapas_ms'].items(), key=lambda e: e[1], reverse=True)
+        for etapa, _ in etapas:
+            for perilla in self.perillas:
+                if etapa in perilla.etapas and perilla.puede_bajar():
+                    anterior, nuevo = perilla.mover(1)
+                    self.bajadas.append(perilla)
+                    self.sin_margen = False
+                    self.anotar_decision('bajar', perilla, anterior, nuevo, medicion, etapa)
+                    return
+        if not self.sin_margen:
+            self.sin_margen = True
+            self.anotar_decision('sin_margen', None, '', '', medicion, etapas[0][0] if etapas else '')
+
+    def subir(self, medicion):
+        """Deshace la última bajada"""
+        perilla = self.bajadas.pop()
+        anterior, nuevo = perilla.mover(-1)
+        self.sin_margen = False
+        self.anotar_decision('subir', perilla, anterior, nuevo, medicion, '')
+
+    def anotar_decision(self, accion, perilla, anterior, nuevo, medicion, etapa):
+        limite_media, limite_p95 = self.limites()
+        nombre = perilla.nombre if perilla is not None else ''
+        decision = {
+            'tiempo': round(time.time(), 3),
+            'accion': accion,
+            'perilla': nombre,
+            'anterior': anterior,
+            'nuevo': nuevo,
+            'fps': round(medicion['fps'], 2),
+            'media_ms': round(medicion['media_ms'], 2),
+            'p95_ms': round(medicion['p95_ms'], 2),
+            'etapa': etapa,
+            'etapa_ms': round(medicion['etapas_ms'].get(etapa, 0.0), 2)
+        }
+        self.decisiones.append(decision)
+
+        limites = f"límite {limite_media:.1f} ms" + (f", p95 {limite_p95:.1f} ms" if limite_p95 is not None else "")
+        estado = (f"media {decision['media_ms']:.1f} ms, p95 {decision['p95_ms']:.1f} ms, "
+                  f"{decision['fps']:.1f} FPS; {limites}")
+        if accion == 'bajar':
+            print(f"[calidad] {nombre}: {anterior} -> {nuevo} ({etapa} {decision['etapa_ms']:.1f} ms; {estado})")
+        elif accion == 'subir':
+            print(f"[calidad] {nombre}: {anterior} -> {nuevo} (holgado; {estado})")
+        else:
+            print(f"[calidad] Sin más ajustes posibles ({estado})")
+
+        # Nivel de cada perilla en el HUD / CSV / Prometheus de la instrumentación: se publica el
+        # índice (0 = valor configurado, mayor = más barato) porque los valores pueden ser texto
+        if perilla is not None and hasattr(self.registro, 'fijar'):
+            self.registro.fijar(f"perilla_{nombre}", perilla.indice)
+
+        if self.ruta_registro:
+            nuevo_archivo = not os.path.exists(self.ruta_registro)
+            with open(self.ruta_registro, 'a', newline='', encoding='utf-8') as f:
+                escritor = csv.DictWriter(f, fieldnames=list(decision))
+                if nuevo_archivo:
+                    escritor.writeheader()
+                escritor.writerow(decision)
+
+    def estado(self):
+        """Valor actual de cada perilla"""
+        return {perilla.nombre: perilla.valor for perilla in self.perillas}
@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+from backends_inferencia import crear_backend
+from empaquetar_dataset import RUTA_PAQUETE, cargar_paquete, leer_indice, leer_rostro, listar_imagenes
+from exportar_modelo import exportar_tflite
+from medicion import percentiles
+
+def elegir_muestra(total, num_muestras=200, semilla=0):
+    """Índices (ordenados) de una muestra aleatoria sin repetición de `num_muestras` elementos"""
+    rng = np.random.default_rng(semilla)
+    return np.sort(rng.choice(total, size=min(num_muestras, total), replace=False))
+
+def cargar_split(split, ruta_datos='version_completa/dataset', ruta_paquete=RUTA_PAQUETE,
+                 num_muestras=None, semilla=0):
+    """Devuelve (imágenes float32 (N, 48, 48, 1) en 0-1, etiquetas) del paquete o del directorio
+
+    Con `num_muestras` devuelve solo una muestra aleatoria de ese tamaño: se
+    eligen antes los índices y solo se leen y convierten esas imágenes.
+    """
+    indice = leer_indice(ruta_paquete)
+    if indice is not None and split in indice['splits']:
+        imagenes, etiquetas, _ = cargar_paquete(ruta_paquete, split)
+        if num_muestras is not None:
+            # El paquete está mapeado en memoria: indexar solo lee las filas elegidas
+            elegidas = elegir_muestra(len(etiquetas), num_muestras, semilla)
+            imagenes, etiquetas = imagenes[elegidas], etiquetas[elegidas]
+    else:
+        _, archivos = listar_imagenes(os.path.join(ruta_datos, split))
+        if num_muestras is not None and archivos:
+            archivos = [archivos[i] for i in elegir_muestra(len(archivos), num_muestras, semilla)]
+        rostros = [(leer_rostro(ruta), clase) for ruta, clase in archivos]
+        rostros = [(rostro, clase) for rostro, clase in rostros if rostro is not None]
+        if not rostros:
+            raise FileNotFoundError(f"No hay imágenes en {os.path.join(ruta_datos, split)}")
+        imagenes = np.stack([rostro for rostro, _ in rostros])
+        etiquetas = np.array([clase for _, clase in rostros], dtype=np.uint8)
+    return np.asarray(imagenes, dtype=np.float32)[..., np.newaxis] / 255.0, np.asarray(etiquetas)
+
+def convertir(ruta_h5, ruta_salida, representativas=None):
+    """Cuantiza con rango dinámico (pesos int8) o, si hay datos representativos, entera completa"""
+    import tensorflow as tf
+
+    modelo = tf.keras.models.load_model(ruta_h5)
+    convertidor = tf.lite.TFLiteConverter.from_keras_model(modelo)
+    convertidor.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if representativas is not None:
+        # Entrada, salida y todas las operaciones en int8, calibradas con la muestra
+        def datos_representativos():
+            for imagen in representativas:
+                yield [imagen[np.newaxis]]
+        convertidor.representative_dataset = datos_representativos
+        convertidor.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        convertidor.inference_input_type = tf.int8
+        convertidor.inference_output_type = tf.int8
+
+    modelo_tflite = convertidor.convert()
+    with open(ruta_salida, 'wb') as f:
+        f.write(modelo_tflite)
+
+    print(f"  ✓ TFLite cuantizado: {ruta_salida} ({len(modelo_tflite) / 1024:.0f} KB)")
+    return ruta_salida
+
+def evaluar(backend, imagenes, etiquetas, tam_lote=64, repeticiones=200):
+    """Precisión sobre validación y latencia por inferencia (un rostro por llamada)"""
+    aciertos = 0
+    for inicio in range(0, len(imagenes), tam_lote):
+        prediccion = backend.predecir(imagenes[inicio:inicio + tam_lote])
+        aciertos += int(np.sum(np.argmax(prediccion, axis=1) == etiquetas[inicio:inicio + tam_lote]))
+
+    latencias = []
+    for i in range(repeticiones + 10):
+        imagen = imagenes[i % len(imagenes)][np.newaxis]
+        inicio = time.perf_counter()
+        backend.predecir(imagen)
+        if i >= 10:
+            latencias.append((time.perf_counter() - inicio) * 1000.0)
+
+    return {
+        'precision': round(aciertos / len(imagenes), 4),
+        **{f"{p}_ms": round(v, 3) for p, v in percentiles(latencias).items()}
+    }
+
+def cuantizar_modelo(ruta_h5, ruta_datos='version_completa/dataset', ruta_paquete=RUTA_PAQUETE,
+                     num_muestras=200, num_hilos=1):
+    """Genera las variantes cuantizadas del modelo y un informe comparativo junto a él"""
+    base = os.path.splitext(ruta_h5)[0]
+    # Para calibrar solo hacen falta `num_muestras` imágenes: no se convierte el split entero
+    representativas, _ = cargar_split('train', ruta_datos, ruta_paquete, num_muestras=num_muestras)
+    validacion, etiquetas = cargar_split('validation', ruta_datos, ruta_paquete)
+    print(f"Calibración con {len(representativas)} imágenes de entrenamiento; "
+          f"evaluación con {len(validacion)} de validación")
+
+    variantes = {
+        'float32': exportar_tflite(ruta_h5, base + '.tflite'),
+        'rango_dinamico': convertir(ruta_h5, base + '_dinamico.tflite'),
+        'entero_int8': convertir(ruta_h5, base + '_int8.tflite', representativas)
+    }
+
+    informe = {'modelo': ruta_h5, 'muestras_validacion': len(validacion), 'hilos': num_hilos, 'variantes': {}}
+    referencia = crear_backend('keras', ruta_h5)
+    informe['variantes']['keras'] = {'archivo': ruta_h5, 'tam_kb': round(os.path.getsize(ruta_h5) / 1024, 1),
+                                     **evaluar(referencia, validacion, etiquetas)}
+    for nombre, ruta in variantes.items():
+        backend = crear_backend('tflite', ruta, num_hilos=num_hilos)
+        informe['variantes'][nombre] = {'archivo': ruta, 'tam_kb': round(os.path.getsize(ruta) / 1024, 1),
+                                        **evaluar(backend, validacion, etiquetas)}
+
+    print(f"\n{'variante':<16} {'precisión':>10} {'tamaño KB':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for nombre, datos in informe['variantes'].items():
+        print(f"{nombre:<16} {datos['precision']:>10.4f} {datos['tam_kb']:>10.1f} "
+              f"{datos['p50_ms']:>8.3f} {datos['p95_ms']:>8.3f}")
+
+    ruta_informe = base + '_cuantizacion.json'
+    with open(ruta_informe, 'w', encoding='utf-8') as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
+    print(f"\nInforme guardado en {ruta_informe}")
+    return informe
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cuantización post-entrenamiento del modelo de expresiones")
+    parser.add_argument('--modelo', default='./version_completa/modelos/3/modelo_expresiones.h5')
+    parser.add_argument('--datos', default='version_completa/dataset', help="Dataset en carpetas (train/validation)")
+    parser.add_argument('--paquete', default=RUTA_PAQUETE,
+                        help="Dataset empaquetado; se usa en lugar de --datos si existe")
+    parser.add_argument('--muestras', type=int, default=200, help="Imágenes de calibración para int8")
+    parser.add_argument('--hilos', type=int, default=1, help="Hilos del intérprete TFLite al medir la latencia")
+    args = parser.parse_args()
+
+    cuantizar_modelo(args.modelo, args.datos, args.paquete, args.muestras, args.hilos)
@@ -1,11 +1,11 @@
-import requests
+import html
 import os
+import re
 import zipfile
-import tensorflow as tf
-from tensorflow import keras
 import shutil
 import sys
-import gdown
+from urllib.parse import parse_qs, urlencode, urlparse
+from descargas import Descargador, ErrorDescarga
 
 # URLs de modelos pre-entrenados (estas son ficticias, deberás sustituirlas por URLs reales)
 MODELOS = {
@@ -19,6 +19,32 @@ def mostrar_progreso(bloque_num, tam_bloque, tam_total):
     barra = '█' * int(porcentaje/5) + '░' * (20 - int(porcentaje/5))
     print(f"\r|{barra}| {porcentaje:.1f}%", end='')
 
+FIRMA_HDF5 = b'\x89HDF\r\n\x1a\n'
+
+def url_directa_drive(url):
+    """URL de descarga directa de un archivo de Google Drive (sin la página de aviso de archivos grandes)"""
+    partes = urlparse(url)
+    if 'drive.google.com' not in partes.netloc:
+        return url
+    ids = parse_qs(partes.query).get('id') or re.findall(r'/file/d/([\w-]+)', partes.path)
+    if not ids:
+        return url
+    return f"https://drive.usercontent.google.com/download?id={ids[0]}&export=download&confirm=t"
+
+def url_confirmacion_drive(ruta_html):
+    """URL del formulario "descargar de todos modos" de la página de aviso de Drive (None si no lo es)"""
+    with open(ruta_html, 'rb') as f:
+        pagina = f.read(256 * 1024).decode('utf-8', errors='replace')
+    formulario = re.search(r'<form[^>]*id="download-form"[^>]*action="([^"]+)"(.*?)</form>', pagina, re.S)
+    if formulario is None:
+        return None
+    campos = re.findall(r'<input[^>]*type="hidden"[^>]*name="([^"]+)"[^>]*value="([^"]*)"', formulario.group(2))
+    return html.unescape(formulario.group(1)) + '?' + urlencode([(n, html.unescape(v)) for n, v in campos])
+
+def es_hdf5(ruta):
+    with open(ruta, 'rb') as f:
+        return f.read(8) == FIRMA_HDF5
+
 def descargar_modelo(modelo="fer2013"):
     """Descarga un modelo pre-entrenado FER2013 desde Google Drive"""
     print(f"Descargando modelo {modelo}...")
@@ -37,17 +63,25 @@ def descargar_modelo(modelo="fer2013"):
     try:
         # URL de Google Drive para un modelo FER2013 entrenado
         # Este es un ID ficticio, se debe reemplazar por un ID real
-        url = "https://drive.google.com/uc?id=1-L3LnxVXv4Ud73UuQXDSQaFfKxd4gnnf"
+        url = "https://drive.google.com/uc?export=download&id=1-L3LnxVXv4Ud73UuQXDSQaFfKxd4gnnf"
         
         print("Descargando modelo pre-entrenado...")
-        gdown.download(url, ruta_modelo, quiet=False)
+        # Con la caché de descargas, repetir la preparación no vuelve a bajar el modelo si no ha cambiado
+        descargador = Descargador(hilos=1)
+        ruta_cache = descargador.obtener(url_directa_drive(url))
         
-        if os.path.exists(ruta_modelo):
-            print(f"\nModelo descargado correctamente como '{ruta_modelo}'")
-            return True
-        else:
-            print("\nError: No se pudo descargar el modelo.")
-            return False
+        # Para archivos grandes Drive puede responder con una página de aviso: seguir su formulario
+        if not es_hdf5(ruta_cache):
+            confirmacion = url_confirmacion_drive(ruta_cache)
+            if confirmacion is not None:
+                ruta_cache = descargador.obtener(confirmacion)
+        # Si el enlace no es válido lo descargado es una página HTML y no el modelo
+        if not es_hdf5(ruta_cache):
+            raise ErrorDescarga("lo descargado no es un modelo .h5")
+        descargador.copiar(ruta_cache, ruta_modelo)
+        
+        print(f"\nModelo descargado correctamente como '{ruta_modelo}' ({descargador.resumen()})")
+        return True
             
     except Exception as e:
         print(f"\nError durante la descarga: {e}")
@@ -60,6 +94,8 @@ def descargar_modelo(modelo="fer2013"):
 
 def crear_modelo_demo():
     """Crea un modelo simple de demostración"""
+    from tensorflow import keras
+    
     modelo = keras.Sequential([
         keras.layers.Conv2D(32, (3, 3), activation='relu', input_shape=(48, 48, 1)),
         keras.layers.MaxPooling2D((2, 2)),
@@ -112,37 +148,18 @@ def descargar_personajes_demo():
         'Data (Star Trek)': "https://i.imgur.com/JAdamLW.png"
     }
     
-    exito = True
-    for personaje, url in enlaces.items():
-        ruta_destino = os.path.join("personajes", f"{personaje}.png")
-        try:
-            print(f"Descargando imagen de {personaje}...")
-            response = requests.get(url, stream=True)
-            if response.status_code == 200:
-                with open(ruta_destino, 'wb') as f:
-                    for chunk in response.iter_content(1024):
-                        f.write(chunk)
-                print(f"  ✓ {personaje} descargado correctamente")
-            else:
-                print(f"  ✗ Error al descargar {personaje}: {response.status_code}")
-                exito = False
-        except Exception as e:
-            print(f"  ✗ Error al descargar {personaje}: {e}")
-            exito = False
+    # Todas las imágenes se descargan en paralelo y las que ya están en caché no se vuelven a bajar
+    trabajos = [(url, os.path.join("personajes", f"{personaje}.png")) for personaje, url in enlaces.items()]
+    descargador = Descargador()
+    resultados = descargador.descargar_varios(trabajos)
+    print(f"Descargas: {descargador.resumen()}")
+    exito = all(error is None for error in resultados.values())
     
     return exito
 
 if __name__ == "__main__":
     print("=== Preparación del Sistema de Reconocimiento de Expresiones ===")
     
-    # Verificar si gdown está instalado, si no, instalarlo
-    try:
-        import gdown
-    except ImportError:
-        print("Instalando la biblioteca gdown para la descarga...")
-        os.system("pip install gdown")
-        import gdown
-    
     # Descargar modelo
     if descargar_modelo():
         print("\nModelo listo para usar.")
@@ -0,0 +1,275 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Caché compartida por todas las descargas del proyecto (modelos, personajes, detector DNN)
+CARPETA_CACHE = os.environ.get('DESCARGAS_CACHE') or os.path.join(
+    os.path.expanduser('~'), '.cache', 'detector_expresiones', 'descargas')
+TAM_BLOQUE = 64 * 1024
+
+class ErrorDescarga(Exception):
+    """Fallo de una descarga: error HTTP, de red o de suma de comprobación"""
+
+def sha256_archivo(ruta):
+    """SHA-256 (hexadecimal) del contenido de un archivo"""
+    resumen = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            resumen.update(bloque)
+    return resumen.hexdigest()
+
+def crear_sesion(conexiones=4, reintentos=3):
+    """Sesión HTTP con conexiones reutilizadas y reintentos con espera creciente ante fallos de red o 5xx"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    sesion = requests.Session()
+    politica = Retry(total=reintentos, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504),
+                     allowed_methods=('GET', 'HEAD'), raise_on_status=False)
+    adaptador = HTTPAdapter(pool_connections=conexiones, pool_maxsize=conexiones, max_retries=politica)
+    sesion.mount('http://', adaptador)
+    sesion.mount('https://', adaptador)
+    sesion.headers['User-Agent'] = 'detector-expresiones'
+    return sesion
+
+class Descargador:
+    """Descargas concurrentes con caché local direccionada por contenido
+
+    Cada archivo descargado se guarda una sola vez en `<cache>/objetos/<sha256>`
+    y `<cache>/indice.json` asocia cada URL a su SHA-256, ETag y Last-Modified:
+      - si la URL ya está en caché se pregunta al servidor con If-None-Match /
+        If-Modified-Since y, con 304, no se vuelve a descargar;
+      - una descarga cortada se guarda en `<cache>/parciales` y se reanuda con
+        Range / If-Range (si el archivo cambió en el servidor o el rango ya no
+        es válido, empieza de cero); se pide sin compresión de transporte para
+        que los bytes en disco sean los del archivo;
+      - si se indica `sha256` el contenido se comprueba antes de aceptarlo, y
+        los objetos en caché se vuelven a comprobar antes de usarlos;
+      - sin conexión se usa la copia en caché si la hay.
+    Las descargas de descargar_varios() se hacen en paralelo sobre una única
+    sesión con conexiones reutilizadas.
+    """
+
+    def __init__(self, carpeta_cache=CARPETA_CACHE, hilos=4, reintentos=3, tiempo_espera=30.0, sesion=None):
+        self.carpeta_cache = carpeta_cache
+        self.carpeta_objetos = os.path.join(carpeta_cache, 'objetos')
+        self.carpeta_parciales = os.path.join(carpeta_cache, 'parciales')
+        os.makedirs(self.carpeta_objetos, exist_ok=True)
+        os.makedirs(self.carpeta_parciales, exist_ok=True)
+        self.ruta_indice = os.path.join(carpeta_cache, 'indice.json')
+
+        self.hilos = hilos
+        self.tiempo_espera = tiempo_espera
+        self.sesion = sesion or crear_sesion(hilos, reintentos)
+        self.cerrojo = threading.Lock()
+        self.cerrojos_url = {}
+        self.indice = {}
+        if os.path.exists(self.ruta_indice):
+            try:
+                with open(self.ruta_indice, encoding='utf-8') as f:
+                    self.indice = json.load(f)
+            except (OSError, ValueError):
+                print("Índice de la caché de descargas dañado; se empieza uno nuevo")
+
+        # Estadísticas
+        self.bytes_descargados = 0
+        self.no_modificados = 0
+        self.reanudados = 0
+        self.sin_conexion = 0
+
+    def _guardar_indice(self):
+        temporal = self.ruta_indice + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(self.indice, f, indent=2, ensure_ascii=False)
+        os.replace(temporal, self.ruta_indice)
+
+    def _cerrojo_url(self, url):
+        with self.cerrojo:
+            return self.cerrojos_url.setdefault(url, threading.Lock())
+
+    def _rutas_parcial(self, url):
+        clave = hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+        base = os.path.join(self.carpeta_parciales, clave)
+        return base + '.parte', base + '.json'
+
+    def _borrar_parcial(self, ruta_parcial, ruta_meta):
+        for ruta in (ruta_parcial, ruta_meta):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+    def _objeto_en_cache(self, url, sha256=None):
+        """Ruta del objeto en caché de la URL si existe y su contenido es correcto"""
+        with self.cerrojo:
+            entrada = self.indice.get(url)
+        if entrada is None or (sha256 and entrada['sha256'] != sha256):
+            return None, None
+        ruta = os.path.join(self.carpeta_objetos, entrada['sha256'])
+        if not os.path.exists(ruta) or sha256_archivo(ruta) != entrada['sha256']:
+            return None, None
+        return ruta, entrada
+
+    def obtener(self, url, sha256=None):
+        """Devuelve la ruta en caché del contenido de la URL, descargándolo solo si hace falta"""
+        import requests
+
+        with self._cerrojo_url(url):
+            en_cache, entrada = self._objeto_en_cache(url, sha256)
+            ruta_parcial, ruta_meta = self._rutas_parcial(url)
+
+            # Sin compresión de transporte: los bytes guardados deben ser los del archivo, para
+            # que el desplazamiento de un Range al reanudar coincida con lo que hay en disco
+            cabeceras = {'Accept-Encoding': 'identity'}
+            if en_cache is not None:
+                if entrada.get('etag'):
+                    cabeceras['If-None-Match'] = entrada['etag']
+                if entrada.get('last_modified'):
+                    cabeceras['If-Modified-Since'] = entrada['last_modified']
+
+            # Reanudar solo si se sabe a qué versión del archivo pertenecen los bytes ya descargados
+            inicio = 0
+            if os.path.exists(ruta_parcial) and os.path.exists(ruta_meta):
+                with open(ruta_meta, encoding='utf-8') as f:
+                    validador = json.load(f).get('validador')
+                if validador:
+                    inicio = os.path.getsize(ruta_parcial)
+                    cabeceras['Range'] = f"bytes={inicio}-"
+                    cabeceras['If-Range'] = validador
+
+            while True:
+                try:
+                    respuesta = self.sesion.get(url, headers=cabeceras, stream=True, timeout=self.tiempo_espera)
+                except requests.RequestException as e:
+                    if en_cache is not None:
+                        with self.cerrojo:
+                            self.sin_conexion += 1
+                        print(f"  (sin conexión con {url}; se usa la copia en caché)")
+                        return en_cache
+                    raise ErrorDescarga(f"No se pudo conectar con {url}: {e}") from e
+                if respuesta.status_code != 416 or not inicio:
+                    break
+                # El rango pedido no existe (el parcial no corresponde al archivo actual): empezar de cero
+                respuesta.close()
+                self._borrar_parcial(ruta_parcial, ruta_meta)
+                inicio = 0
+                del cabeceras['Range'], cabeceras['If-Range']
+
+            with respuesta:
+                if respuesta.status_code == 304 and en_cache is not None:
+                    with self.cerrojo:
+                        self.no_modificados += 1
+                    return en_cache
+                if respuesta.status_code == 206 and inicio:
+                    modo = 'ab'
+                    with self.cerrojo:
+                        self.reanudados += 1
+                elif respuesta.status_code == 200:
+                    modo = 'wb'
+                else:
+                    raise ErrorDescarga(f"HTTP {respuesta.status_code} al descargar {url}")
+
+                etag = respuesta.headers.get('ETag')
+                ultima_modificacion = respuesta.headers.get('Last-Modified')
+                with open(ruta_meta, 'w', encoding='utf-8') as f:
+                    json.dump({'url': url, 'validador': etag or ultima_modificacion}, f)
+                descargados = 0
+                try:
+                    with open(ruta_parcial, modo) as f:
+                        for bloque in respuesta.iter_content(TAM_BLOQUE):
+                            f.write(bloque)
+                            descargados += len(bloque)
+                except requests.RequestException as e:
+                    # Lo descargado se queda en la carpeta de parciales para reanudarlo
+                    raise ErrorDescarga(f"Descarga de {url} interrumpida: {e}") from e
+                finally:
+                    # Varias descargas pueden terminar a la vez: el total se suma con el cerrojo
+                    with self.cerrojo:
+                        self.bytes_descargados += descargados
+
+            calculado = sha256_archivo(ruta_parcial)
+            if sha256 and calculado != sha256:
+                self._borrar_parcial(ruta_parcial, ruta_meta)
+                raise ErrorDescarga(f"Suma de comprobación incorrecta para {url}: {calculado} (esperada {sha256})")
+
+            ruta_objeto = os.path.join(self.carpeta_objetos, calculado)
+            os.replace(ruta_parcial, ruta_objeto)
+            os.remove(ruta_meta)
+            with self.cerrojo:
+                self.indice[url] = {
+                    'sha256': calculado,
+                    'tam': os.path.getsize(ruta_objeto),
+                    'etag': etag,
+                    'last_modified': ultima_modificacion,
+                    'fecha': time.strftime('%Y-%m-%d %H:%M:%S')
+                }
+                self._guardar_indice()
+            return ruta_objeto
+
+    def descargar(self, url, destino, sha256=None):
+        """Deja en `destino` el contenido de la URL (desde la caché si está al día)"""
+        return self.copiar(self.obtener(url, sha256), destino)
+
+    def copiar(self, ruta_objeto, destino):
+        """Copia a `destino` un objeto de la caché devuelto por obtener() (si no está ya igual)"""
+        if os.path.exists(destino) and os.path.getsize(destino) == os.path.getsize(ruta_objeto) \
+                and sha256_archivo(destino) == os.path.basename(ruta_objeto):
+            return destino
+        carpeta = os.path.dirname(destino)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        temporal = destino + '.tmp'
+        shutil.copyfile(ruta_objeto, temporal)
+        os.replace(temporal, destino)
+        return destino
+
+    def descargar_varios(self, trabajos):
+        """Descarga en paralelo una lista de (url, destino) o (url, destino, sha256)
+
+        Devuelve {destino: None si fue bien, o la excepción}; cada resultado se muestra al terminar.
+        """
+        resultados = {}
+
+        def trabajo(datos):
+            url, destino = datos[0], datos[1]
+            sha256 = datos[2] if len(datos) > 2 else None
+            try:
+                self.descargar(url, destino, sha256)
+                print(f"  ✓ {os.path.basename(destino)}")
+                return destino, None
+            except Exception as e:
+                print(f"  ✗ {os.path.basename(destino)}: {e}")
+                return destino, e
+
+        with ThreadPoolExecutor(max_workers=self.hilos) as ejecutor:
+            for destino, error in ejecutor.map(trabajo, trabajos):
+                resultados[destino] = error
+        return resultados
+
+    def resumen(self):
+        return (f"{self.bytes_descargados / 1024:.0f} KB descargados, {self.no_modificados} sin cambios, "
+                f"{self.reanudados} reanudadas, {self.sin_conexion} desde caché sin conexión")
+
+def descargar_varios(trabajos, **opciones):
+    """Atajo: descarga los trabajos con un Descargador nuevo y devuelve los resultados"""
+    descargador = Descargador(**opciones)
+    resultados = descargador.descargar_varios(trabajos)
+    print(f"Descargas: {descargador.resumen()}")
+    return resultados
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Descarga archivos a una carpeta usando la caché de descargas")
+    parser.add_argument('urls', nargs='+')
+    parser.add_argument('--destino', default='.', help="Carpeta donde dejar los archivos")
+    parser.add_argument('--hilos', type=int, default=4)
+    parser.add_argument('--cache', default=CARPETA_CACHE, help="Carpeta de la caché de descargas")
+    args = parser.parse_args()
+
+    from urllib.parse import unquote, urlparse
+    trabajos = [(url, os.path.join(args.destino, unquote(os.path.basename(urlparse(url).path)) or 'descarga'))
+                for url in args.urls]
+    descargar_varios(trabajos, carpeta_cache=args.cache, hilos=args.hilos)
@@ -1,26 +1,63 @@
+import time
+
+# Referencia para medir el tiempo hasta el primer fotograma desde el arranque
+INICIO_PROCESO = time.perf_counter()
+
 import cv2
 import numpy as np
-import mediapipe as mp
-import tensorflow as tf
-from tensorflow import keras
-from PIL import Image, ImageDraw, ImageFont
-import os
+import threading
+from almacen_personajes import AlmacenPersonajes
+from backends_inferencia import crear_backend
+from captura_hilo import CapturaEnHilo
+from composicion import CacheSprites, superponer
+from control_calidad import ControlCalidad, escalonar
+from detectores_rostro import crear_detector_rostros
+from renderizado import Renderizador, RenderizadorNulo
+from reserva_buffers import ReservaBuffers
+from seguimiento import SeguidorRostros
+from cache_predicciones import CachePredicciones
+from medicion import RegistroNulo
+from instrumentacion import Instrumentacion
 
 class DetectorExpresiones:
-    def __init__(self, ruta_modelo=None):
-        # Inicializar detector de rostros de MediaPipe
-        self.mp_rostro = mp.solutions.face_detection
-        self.mp_dibujo = mp.solutions.drawing_utils
-        self.detector_rostro = self.mp_rostro.FaceDetection(min_detection_confidence=0.5)
+    def __init__(self, ruta_modelo=None, backend='keras', intervalo_deteccion=1, instrumentacion=None,
+                 carga_en_segundo_plano=False, detector_rostros='mediapipe', opciones_detector=None,
+                 control_calidad=None):
+        # Detección completa cada `intervalo_deteccion` fotogramas y seguimiento entre medias
+        self.seguidor = SeguidorRostros(self.detectar_rostros, intervalo_deteccion,
+                                        codigo_gris=cv2.COLOR_RGB2GRAY)
+        
+        # Reutilización de predicciones por rostro seguido y suavizado temporal de probabilidades
+        self.cache_predicciones = CachePredicciones()
+        
+        # Registro de latencia por etapa y contadores (desactivado por defecto, ver
+        # instrumentacion.py y benchmark.py); el registro nulo no cuesta casi nada
+        self.instrumentacion = instrumentacion
+        self.etapas = instrumentacion if instrumentacion is not None else RegistroNulo()
         
-        # Cargar modelo de expresiones si existe
+        # Control adaptativo de calidad (ver control_calidad.py): mide las etapas y reenvía
+        # las medidas a la instrumentación; sus perillas se registran al iniciar la cámara
+        self.control_calidad = control_calidad
+        if control_calidad is not None:
+            self.etapas = control_calidad.encadenar(self.etapas)
+        
+        # Detector de rostros ('mediapipe', 'haar' o 'dnn', ver detectores_rostro.py) y sus opciones
+        self.tipo_detector = detector_rostros
+        self.opciones_detector = opciones_detector or {}
+        
+        # El detector de rostros y el modelo se cargan en cargar(); con `carga_en_segundo_plano`
+        # se hace en un hilo mientras se abre la cámara (ver esperar_carga())
+        self.detector_rostro = None
         self.modelo = None
-        if ruta_modelo and os.path.exists(ruta_modelo):
-            try:
-                self.modelo = keras.models.load_model(ruta_modelo)
-                print(f"Modelo cargado desde: {ruta_modelo}")
-            except Exception as e:
-                print(f"Error al cargar el modelo: {e}")
+        self.tiempos_arranque = {}
+        self.hilo_carga = None
+        self.error_carga = None
+        if carga_en_segundo_plano:
+            self.hilo_carga = threading.Thread(target=self._cargar_en_hilo, args=(ruta_modelo, backend),
+                                               daemon=True)
+            self.hilo_carga.start()
+        else:
+            self.cargar(ruta_modelo, backend)
         
         # Mapeo de expresiones a personajes (personalizable)
         self.expresiones = ['Enojo', 'Disgusto', 'Miedo', 'Felicidad', 'Neutral', 'Tristeza', 'Sorpresa']
@@ -34,30 +71,93 @@ class DetectorExpresiones:
             'Neutral': 'cara-neutral-96'
         }
         
-        # Cargar imágenes de personajes si están disponibles
-        self.imagenes_personajes = {}
-        for expresion, personaje in self.personajes.items():
-            ruta_imagen = f"./personajes/{personaje}.png"
-            if os.path.exists(ruta_imagen):
-                self.imagenes_personajes[expresion] = cv2.imread(ruta_imagen, cv2.IMREAD_UNCHANGED)
-        
-    def preprocesar_imagen(self, imagen, caja):
-        """Preprocesa una imagen facial para la detección de expresiones"""
-        # Extraer coordenadas de la caja del rostro
-        xmin = int(caja[0])
-        ymin = int(caja[1])
-        ancho = int(caja[2])
-        alto = int(caja[3])
+        # Caché de emojis ya redimensionados y premultiplicados para cada tamaño de caja
+        self.sprites = CacheSprites()
+        
+        # Imágenes de los personajes: se decodifican bajo demanda (las del mapeo se precargan en
+        # segundo plano) y se recargan si cambia el archivo, invalidando sus sprites
+        self.almacen = AlmacenPersonajes('./personajes', nombres=self.personajes.values(),
+                                         al_cambiar=self.sprites.invalidar)
+        for personaje in self.personajes.values():
+            self.almacen.precargar(personaje)
+        
+        # Arrays de trabajo reutilizados en cada fotograma (espejo, RGB, rostros, lote del modelo)
+        self.buffers = ReservaBuffers()
+        
+    def cargar(self, ruta_modelo, backend):
+        """Crea el detector de rostros, carga el modelo y hace una inferencia de calentamiento"""
+        inicio = time.perf_counter()
+        self.detector_rostro = crear_detector_rostros(self.tipo_detector, formato='rgb', **self.opciones_detector)
+        self.tiempos_arranque['detector_rostros'] = time.perf_counter() - inicio
+        
+        # Cargar modelo de expresiones con el backend configurado ('keras', 'tflite', 'opencv' u 'optimizado')
+        if ruta_modelo:
+            inicio = time.perf_counter()
+            try:
+                self.modelo = crear_backend(backend, ruta_modelo)
+                print(f"Modelo cargado desde: {ruta_modelo} (backend: {backend})")
+            except Exception as e:
+                print(f"Error al cargar el modelo: {e}")
+            self.tiempos_arranque['modelo'] = time.perf_counter() - inicio
+        
+        # La primera predicción paga la preparación del grafo; se hace aquí y no con el primer rostro
+        if self.modelo is not None:
+            inicio = time.perf_counter()
+            self.modelo.predecir(np.zeros((1, 48, 48, 1), dtype=np.float32))
+            self.tiempos_arranque['calentamiento'] = time.perf_counter() - inicio
+
+    def _cargar_en_hilo(self, ruta_modelo, backend):
+        # Un error en el hilo se perdería con él: se guarda para relanzarlo en esperar_carga()
+        try:
+            self.cargar(ruta_modelo, backend)
+        except Exception as e:
+            self.error_carga = e
+
+    def esperar_carga(self):
+        """Espera a que termine la carga en segundo plano (si la hay) y relanza su error si falló"""
+        if self.hilo_carga is not None:
+            self.hilo_carga.join()
+            self.hilo_carga = None
+        if self.error_carga is not None:
+            raise self.error_carga
+
+    def informar_arranque(self):
+        """Muestra el tiempo hasta el primer fotograma y cuánto tardó cada parte del arranque"""
+        total = time.perf_counter() - INICIO_PROCESO
+        partes = ", ".join(f"{nombre}: {segundos:.2f} s" for nombre, segundos in self.tiempos_arranque.items())
+        print(f"Primer fotograma en {total:.2f} s desde el arranque ({partes})")
+        if self.instrumentacion is not None:
+            self.instrumentacion.fijar('tiempo_primer_fotograma_s', round(total, 3))
+
+    def preprocesar_imagen(self, imagen, caja, destino=None):
+        """Preprocesa una imagen facial para la detección de expresiones
+        
+        Devuelve un array float32 (1, 48, 48, 1) en 0-1. Si se pasa `destino`
+        (un array float32 de esa forma, por ejemplo una fila del lote) se
+        escribe en él en lugar de reservar uno nuevo.
+        """
+        # Extraer coordenadas de la caja del rostro, limitadas a la imagen
+        # (MediaPipe puede devolver cajas que empiezan fuera del fotograma)
+        alto_imagen, ancho_imagen = imagen.shape[:2]
+        xmin = max(int(caja[0]), 0)
+        ymin = max(int(caja[1]), 0)
+        xmax = min(int(caja[0]) + int(caja[2]), ancho_imagen)
+        ymax = min(int(caja[1]) + int(caja[3]), alto_imagen)
+        if xmax <= xmin or ymax <= ymin:
+            return None
         
         # Extraer rostro
-        rostro = imagen[ymin:ymin+alto, xmin:xmin+ancho]
+        rostro = imagen[ymin:ymax, xmin:xmax]
         
         # Redimensionar para el modelo
         try:
-            rostro = cv2.resize(rostro, (48, 48))
-            rostro = cv2.cvtColor(rostro, cv2.COLOR_BGR2GRAY)
-            rostro = rostro / 255.0  # Normalizar
-            return rostro.reshape(1, 48, 48, 1)
+            rostro = cv2.resize(rostro, (48, 48), dst=self.buffers.obtener('rostro', (48, 48, 3)))
+            rostro = cv2.cvtColor(rostro, cv2.COLOR_BGR2GRAY, dst=self.buffers.obtener('rostro_gris', (48, 48)))
+            if destino is None:
+                destino = np.empty((1, 48, 48, 1), dtype=np.float32)
+            # Normalizar directamente en float32 sobre el destino
+            np.multiply(rostro, np.float32(1.0 / 255.0), out=destino.reshape(48, 48))
+            return destino
         except Exception as e:
             print(f"Error al preprocesar: {e}")
             return None
@@ -68,23 +168,165 @@ class DetectorExpresiones:
             return "Modelo no cargado", 0.0
         
         # Ejecutar predicción
-        prediccion = self.modelo.predict(imagen, verbose=0)
-        indice_expresion = np.argmax(prediccion[0])
-        confianza = prediccion[0][indice_expresion]
+        prediccion = self.modelo.predecir(imagen)
+        return self.etiquetar_prediccion(prediccion[0])
+
+    def etiquetar_prediccion(self, probabilidades):
+        """Convierte un vector de probabilidades en una tupla (expresión, confianza)"""
+        indice_expresion = np.argmax(probabilidades)
+        confianza = probabilidades[indice_expresion]
         
         if indice_expresion < len(self.expresiones):
             return self.expresiones[indice_expresion], confianza
         else:
             return "Desconocido", confianza
 
-    def iniciar_camara(self):
-        """Inicia la cámara y el proceso de detección"""
-        cap = cv2.VideoCapture(0)
+    def detectar_expresiones_lote(self, rostros):
+        """Detecta las expresiones de varios rostros con una sola pasada del modelo
+        
+        Acepta un tensor (N, 48, 48, 1) o una lista de rostros preprocesados
+        (cada uno de forma (48, 48, 1) o (1, 48, 48, 1)) y devuelve una lista
+        de tuplas (expresión, confianza) en el mismo orden.
+        """
+        if len(rostros) == 0:
+            return []
+        
+        if self.modelo is None:
+            return [("Modelo no cargado", 0.0)] * len(rostros)
+        
+        return [self.etiquetar_prediccion(p) for p in self.predecir_lote(rostros)]
+
+    def predecir_lote(self, rostros):
+        """Devuelve las probabilidades (N, 7) de varios rostros con una sola pasada del modelo"""
+        # Apilar todos los rostros en un único lote
+        if isinstance(rostros, np.ndarray) and rostros.ndim == 4:
+            lote = rostros
+        else:
+            lote = np.concatenate([np.reshape(r, (1, 48, 48, 1)) for r in rostros], axis=0)
+        
+        self.etapas.contar('llamadas_modelo')
+        return self.modelo.predecir(lote)
+
+    def detectar_rostros(self, rgb):
+        """Detecta rostros en una imagen RGB (completa o recortada)"""
+        return self.detector_rostro.detectar(rgb)
+
+    def dibujar_resultado(self, frame, caja, expresion, confianza):
+        """Dibuja la expresión detectada y superpone el personaje asociado"""
+        xmin, ymin, ancho_caja, alto_caja = caja
+        
+        # Mostrar información
+        texto = f"{expresion} ({confianza:.2f})"
+        cv2.putText(frame, texto, (xmin, ymin - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
+        
+        # Mostrar imagen del personaje si está disponible (recortada si se sale del frame)
+        personaje = self.personajes.get(expresion)
+        img_personaje = self.almacen.obtener(personaje) if personaje else None
+        if img_personaje is not None:
+            sprite = self.sprites.obtener(personaje, img_personaje, ancho_caja, alto_caja)
+            superponer(frame, sprite, xmin, ymin, self.buffers)
+
+    def procesar_fotograma(self, frame):
+        """Detecta los rostros de un fotograma, clasifica en un lote los que han cambiado y dibuja el resultado
+        
+        Devuelve una lista de tuplas (caja, expresión, confianza), una por rostro clasificado.
+        """
+        # Convertir a RGB (formato con el que se crea el detector de rostros)
+        with self.etapas.etapa('color'):
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.buffers.obtener('rgb', frame.shape))
+        with self.etapas.etapa('deteccion'):
+            pistas = self.seguidor.actualizar(rgb_frame)
+        self.cache_predicciones.olvidar(pista.id for pista in pistas)
+        self.etapas.contar('rostros', len(pistas))
+        
+        if not pistas or self.modelo is None:
+            return []
+        
+        # Preprocesar todos los rostros y separar los que han cambiado lo suficiente para reclasificarlos.
+        # Los pendientes se escriben directamente en las filas del lote de entrada del modelo
+        lote = self.buffers.obtener_minimo('lote', (len(pistas), 48, 48, 1), np.float32)
+        validas = []
+        pendientes = []
+        with self.etapas.etapa('preprocesado'):
+            for pista in pistas:
+                fila = lote[len(pendientes):len(pendientes) + 1]
+                rostro_procesado = self.preprocesar_imagen(rgb_frame, pista.caja, fila)
+                if rostro_procesado is not None:
+                    validas.append(pista)
+                    if self.cache_predicciones.necesita_inferencia(pista.id, rostro_procesado):
+                        pendientes.append(pista.id)
+        
+        # Una sola pasada del modelo para todos los rostros pendientes
+        nuevas = {}
+        if pendientes:
+            self.etapas.contar('inferencias', len(pendientes))
+            with self.etapas.etapa('inferencia'):
+                predicciones = self.predecir_lote(lote[:len(pendientes)])
+            for identificador, rostro, probabilidades in zip(pendientes, lote, predicciones):
+                nuevas[identificador] = self.cache_predicciones.actualizar(identificador, rostro, probabilidades)
+        
+        detecciones = []
+        with self.etapas.etapa('composicion'):
+            for pista in validas:
+                probabilidades = nuevas.get(pista.id)
+                if probabilidades is None:
+                    probabilidades = self.cache_predicciones.reutilizar(pista.id)
+                expresion, confianza = self.etiquetar_prediccion(probabilidades)
+                self.dibujar_resultado(frame, pista.caja, expresion, confianza)
+                detecciones.append((pista.caja, expresion, confianza))
+        
+        return detecciones
+
+    def registrar_perillas(self, control):
+        """Registra en el control de calidad lo que puede abaratar, de más a menos prioritario por etapa"""
+        control.registrar('escala_deteccion', escalonar(self.detector_rostro.escala, (0.75, 0.5, 0.35), False),
+                          lambda valor: setattr(self.detector_rostro, 'escala', valor), ('deteccion', 'color'))
+        control.registrar('intervalo_deteccion',
+                          escalonar(self.seguidor.intervalo_deteccion, (2, 3, 5, 8, 12), True),
+                          lambda valor: setattr(self.seguidor, 'intervalo_deteccion', valor), ('deteccion',))
+        control.registrar('intervalo_clasificacion',
+                          escalonar(self.cache_predicciones.intervalo_clasificacion, (2, 3, 5), True),
+                          lambda valor: setattr(self.cache_predicciones, 'intervalo_clasificacion', valor),
+                          ('inferencia', 'preprocesado'))
+        control.registrar('calidad_superposicion', ['alta', 'media', 'baja'], self.sprites.fijar_calidad,
+                          ('composicion',))
+
+    def reiniciar(self):
+        """Olvida el seguimiento y las predicciones guardadas (al empezar un vídeo nuevo)"""
+        self.seguidor.reiniciar()
+        self.cache_predicciones.reiniciar()
+
+    def iniciar_camara(self, renderizador=None):
+        """Inicia la cámara y el proceso de detección
+        
+        `renderizador` muestra los fotogramas en su propio hilo (ver renderizado.py); por
+        defecto, en pantalla completa a 30 FPS. Con RenderizadorNulo no se abre ninguna ventana.
+        """
+        # La lectura de la cámara va en su propio hilo y siempre entrega el fotograma más reciente
+        inicio = time.perf_counter()
+        cap = CapturaEnHilo(0).iniciar()
+        self.tiempos_arranque['camara'] = time.perf_counter() - inicio
         
         if not cap.isOpened():
             print("Error: No se pudo abrir la cámara")
             return
         
+        # Si el modelo se carga en segundo plano, esperar aquí (la cámara ya está abierta)
+        try:
+            self.esperar_carga()
+        except Exception:
+            cap.release()
+            raise
+        primer_fotograma = True
+        if self.control_calidad is not None:
+            self.registrar_perillas(self.control_calidad)
+        
+        # El render crea la ventana una sola vez y la refresca a su ritmo, sin frenar la detección
+        if renderizador is None:
+            renderizador = Renderizador('Video de la pantalla completa', fps=30, pantalla_completa=True)
+        renderizador.iniciar()
+        
         print("Cámara iniciada. Presiona 'q' para salir.")
         
         while cap.isOpened():
@@ -94,89 +336,44 @@ class DetectorExpresiones:
                 break
             
             # Voltear horizontalmente para efecto espejo
-            frame = cv2.flip(frame, 1)
+            with self.etapas.etapa('volteo'):
+                frame = cv2.flip(frame, 1, dst=self.buffers.obtener('espejo', frame.shape))
             
-            # Convertir a RGB para MediaPipe
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            resultados = self.detector_rostro.process(rgb_frame)
+            # Detectar, clasificar y dibujar todos los rostros del fotograma
+            self.procesar_fotograma(frame)
             
-            if resultados.detections:
-                for deteccion in resultados.detections:
-                    # Dibujar cuadro de detección
-                    caja_rel = deteccion.location_data.relative_bounding_box
-                    alto, ancho, _ = frame.shape
-                    
-                    # Convertir a coordenadas absolutas
-                    xmin = int(caja_rel.xmin * ancho)
-                    ymin = int(caja_rel.ymin * alto)
-                    ancho_caja = int(caja_rel.width * ancho)
-                    alto_caja = int(caja_rel.height * alto)
-                    
-                    # Preprocesar para el modelo
-                    if self.modelo:
-                        rostro_procesado = self.preprocesar_imagen(
-                            rgb_frame, 
-                            [xmin, ymin, ancho_caja, alto_caja]
-                        )
-
-                        
-                        if rostro_procesado is not None:
-                            # Detectar expresión
-                            expresion, confianza = self.detectar_expresion(rostro_procesado)
-                            # personaje = self.personajes.get(expresion, "Desconocido")
-                            
-                            # Dibujar rectángulo
-                            # cv2.rectangle(frame, (xmin, ymin), (xmin + ancho_caja, ymin + alto_caja), (0, 255, 0), 2)
-                            
-                            # Mostrar información
-                            #texto = f"{expresion}: {personaje} ({confianza:.2f})"
-                            texto = f"{expresion} ({confianza:.2f})"
-                            cv2.putText(frame, texto, (xmin, ymin - 10),
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
-                            
-                            # Mostrar imagen del personaje si está disponible
-                            if expresion in self.imagenes_personajes:
-                                img_personaje = self.imagenes_personajes[expresion]
-                                if img_personaje is not None:
-                                    img_redim = cv2.resize(img_personaje, (ancho_caja, alto_caja))
-
-                                    # Verificar si tiene canal alfa
-                                    if img_redim.shape[2] == 4:
-                                        overlay = img_redim[:, :, :3]
-                                        alpha = img_redim[:, :, 3]
-
-                                        # Crear máscaras
-                                        mask = cv2.merge([alpha, alpha, alpha])
-                                        mask = mask / 255.0
-                                        inverse_mask = 1.0 - mask
-
-                                        # Recortar la región del frame donde se va a superponer
-                                        destino = frame[ymin:ymin+alto_caja, xmin:xmin+ancho_caja]
-
-                                        if destino.shape[:2] == overlay.shape[:2]:
-                                            # Aplicar superposición
-                                            blended = (overlay * mask + destino * inverse_mask).astype(np.uint8)
-                                            frame[ymin:ymin+alto_caja, xmin:xmin+ancho_caja] = blended
-                                    else:
-                                        # Si no tiene canal alfa, lo pega directamente (sin transparencia)
-                                        destino = frame[ymin:ymin+alto_caja, xmin:xmin+ancho_caja]
-                                        if destino.shape == img_redim.shape:
-                                            # Cambia un cuadrado por la imagen del personaje
-                                            frame[ymin:ymin+alto_caja, xmin:xmin+ancho_caja] = img_redim
-
-            cv2.namedWindow('Video de la pantalla completa', cv2.WINDOW_NORMAL)
-
-            cv2.setWindowProperty('Video de la pantalla completa', cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
-
-            # Mostrar el fotograma resultante
-            cv2.imshow('Video de la pantalla completa', frame)
+            # Métricas en vivo (HUD, CSV y Prometheus) si están activadas
+            if self.instrumentacion is not None:
+                self.instrumentacion.fijar('fotogramas_descartados', cap.descartados)
+                self.instrumentacion.tick(frame)
+
+            # Entregar el fotograma resultante al render (se copia; el buffer se reutiliza)
+            with self.etapas.etapa('render'):
+                renderizador.mostrar(frame)
+            
+            # Ajustar la calidad si el coste por fotograma se sale del objetivo
+            if self.control_calidad is not None:
+                self.control_calidad.tick()
             
             # Salir con 'q'
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            tecla = renderizador.leer_tecla()
+            if primer_fotograma:
+                self.informar_arranque()
+                primer_fotograma = False
+            if tecla == ord('q'):
                 break
         
         cap.release()
-        cv2.destroyAllWindows()
+        renderizador.cerrar()
+        if self.instrumentacion is not None:
+            self.instrumentacion.cerrar()
+        print(f"Fotogramas procesados: {cap.entregados}, descartados: {cap.descartados}, "
+              f"mostrados: {renderizador.mostrados}")
+        print(f"Inferencias: {self.cache_predicciones.inferencias}, "
+              f"predicciones reutilizadas: {self.cache_predicciones.reutilizaciones}")
+        if self.control_calidad is not None:
+            print(f"Ajustes de calidad: {len(self.control_calidad.decisiones)}, "
+                  f"estado final: {self.control_calidad.estado()}")
 
 # Ejecutar el programa
 if __name__ == "__main__":
@@ -184,5 +381,27 @@ if __name__ == "__main__":
     # La ruta al modelo entrenado
     ruta_modelo = "./version_completa/modelos/3/modelo_expresiones.h5"
     
-    detector = DetectorExpresiones(ruta_modelo)
-    detector.iniciar_camara() 
\ No newline at end of file
+    # Backend de inferencia: 'keras', 'tflite', 'opencv' (ver exportar_modelo.py) u 'optimizado'
+    # (TFLite en caché generado a partir del .h5; el que antes arranca)
+    backend = "optimizado"
+    
+    # Fotogramas entre detecciones completas (1 = detectar siempre, sin seguimiento)
+    intervalo_deteccion = 5
+    
+    # Métricas en vivo: None para desactivarlas, o por ejemplo
+    # Instrumentacion(hud=True, ruta_csv='metricas.csv', ruta_prometheus='metricas.prom')
+    instrumentacion = None
+    
+    # Control adaptativo de calidad: None para desactivarlo, o por ejemplo
+    # ControlCalidad(fps_objetivo=25, presupuesto_ms=60, ruta_registro='calidad.csv')
+    control_calidad = None
+    
+    # Render en pantalla completa a `fps_pantalla`, independiente del ritmo de la detección;
+    # RenderizadorNulo() para ejecutar sin pantalla
+    fps_pantalla = 30
+    renderizador = Renderizador('Video de la pantalla completa', fps=fps_pantalla, pantalla_completa=True)
+    
+    # El detector de rostros y el modelo se cargan mientras se abre la cámara
+    detector = DetectorExpresiones(ruta_modelo, backend, intervalo_deteccion, instrumentacion,
+                                   carga_en_segundo_plano=True, control_calidad=control_calidad)
+    detector.iniciar_camara(renderizador) 
\ No newline at end of file
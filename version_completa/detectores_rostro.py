@@ -0,0 +1,277 @@
+import argparse
+import json
+import os
+import time
+import cv2
+import numpy as np
+from medicion import percentiles
+from reserva_buffers import ReservaBuffers
+
+# Modelo res10 SSD de OpenCV para el detector DNN (ver descargar_modelo_dnn())
+CARPETA_DNN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modelos', 'detector_rostros')
+URLS_DNN = {
+    'deploy.prototxt':
+        'https://raw.githubusercontent.com/opencv/opencv/master/samples/dnn/face_detector/deploy.prototxt',
+    'res10_300x300_ssd_iter_140000.caffemodel':
+        'https://raw.githubusercontent.com/opencv/opencv_3rdparty/dnn_samples_face_detector_20170830/'
+        'res10_300x300_ssd_iter_140000.caffemodel'
+}
+
+class DetectorRostros:
+    """Interfaz común de los detectores de rostros
+
+    Recibe una imagen en escala de grises o en color (en el orden indicado por
+    `formato`, 'bgr' o 'rgb') y devuelve cajas (x, y, ancho, alto) en la
+    resolución de esa imagen. Con `escala` < 1 la detección se hace sobre una
+    copia reducida y las cajas se vuelven a llevar a resolución completa; las
+    imágenes cuyo lado menor quedaría por debajo de `lado_minimo` (por ejemplo,
+    las regiones pequeñas que redetecta el seguidor) se procesan sin reducir.
+    """
+    nombre = "base"
+
+    def __init__(self, escala=1.0, formato='bgr', lado_minimo=96):
+        self.escala = escala
+        self.formato = formato
+        self.lado_minimo = lado_minimo
+        self.buffers = ReservaBuffers()
+
+    def detectar_escalada(self, imagen):
+        raise NotImplementedError
+
+    def convertir(self, imagen, destino):
+        """Convierte la imagen al formato que necesita el detector ('gris', 'bgr' o 'rgb')"""
+        if imagen.ndim == 2:
+            if destino == 'gris':
+                return imagen
+            codigo = cv2.COLOR_GRAY2BGR if destino == 'bgr' else cv2.COLOR_GRAY2RGB
+        elif destino == 'gris':
+            codigo = cv2.COLOR_BGR2GRAY if self.formato == 'bgr' else cv2.COLOR_RGB2GRAY
+        elif destino == self.formato:
+            return imagen
+        else:
+            codigo = cv2.COLOR_BGR2RGB
+        forma = imagen.shape[:2] if destino == 'gris' else imagen.shape[:2] + (3,)
+        return cv2.cvtColor(imagen, codigo, dst=self.buffers.obtener('color', forma))
+
+    def detectar(self, imagen):
+        alto, ancho = imagen.shape[:2]
+        escala = self.escala
+        if escala >= 1.0 or min(alto, ancho) * escala < self.lado_minimo:
+            return self.detectar_escalada(imagen)
+
+        forma = (max(1, round(alto * escala)), max(1, round(ancho * escala))) + imagen.shape[2:]
+        reducida = cv2.resize(imagen, (forma[1], forma[0]), dst=self.buffers.obtener('reducida', forma),
+                              interpolation=cv2.INTER_AREA)
+        factor_x, factor_y = ancho / forma[1], alto / forma[0]
+        return [(int(round(x * factor_x)), int(round(y * factor_y)), int(round(w * factor_x)), int(round(h * factor_y)))
+                for x, y, w, h in self.detectar_escalada(reducida)]
+
+    __call__ = detectar
+
+class DetectorHaar(DetectorRostros):
+    """Clasificador en cascada de Haar de OpenCV"""
+    nombre = "haar"
+
+    def __init__(self, escala=1.0, formato='bgr', factor_escala=1.3, vecinos_minimos=5, **opciones):
+        super().__init__(escala, formato, **opciones)
+        self.cascada = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self.factor_escala = factor_escala
+        self.vecinos_minimos = vecinos_minimos
+
+    def detectar_escalada(self, imagen):
+        # La ventana mínima de la cascada es de 24x24: con escala 0.5 se pierden los rostros de menos de 48 px
+        rostros = self.cascada.detectMultiScale(self.convertir(imagen, 'gris'), self.factor_escala, self.vecinos_minimos)
+        return [tuple(int(v) for v in caja) for caja in rostros]
+
+class DetectorMediaPipe(DetectorRostros):
+    """Detector de rostros de MediaPipe (BlazeFace)"""
+    nombre = "mediapipe"
+
+    def __init__(self, escala=1.0, formato='bgr', confianza_minima=0.5, modelo=0, **opciones):
+        super().__init__(escala, formato, **opciones)
+        import mediapipe as mp
+        self.detector = mp.solutions.face_detection.FaceDetection(
+            min_detection_confidence=confianza_minima, model_selection=modelo)
+
+    def detectar_escalada(self, imagen):
+        resultados = self.detector.process(self.convertir(imagen, 'rgb'))
+        cajas = []
+        if not resultados.detections:
+            return cajas
+
+        # Convertir las cajas relativas de MediaPipe a coordenadas absolutas
+        alto, ancho = imagen.shape[:2]
+        for deteccion in resultados.detections:
+            caja_rel = deteccion.location_data.relative_bounding_box
+            cajas.append((int(caja_rel.xmin * ancho), int(caja_rel.ymin * alto),
+                          int(caja_rel.width * ancho), int(caja_rel.height * alto)))
+        return cajas
+
+class DetectorDNN(DetectorRostros):
+    """Detector SSD res10 300x300 con el módulo DNN de OpenCV"""
+    nombre = "dnn"
+
+    def __init__(self, escala=1.0, formato='bgr', confianza_minima=0.5, carpeta_modelo=CARPETA_DNN, **opciones):
+        super().__init__(escala, formato, **opciones)
+        rutas = [os.path.join(carpeta_modelo, archivo) for archivo in URLS_DNN]
+        for ruta in rutas:
+            if not os.path.exists(ruta):
+                raise FileNotFoundError(f"No existe {ruta}. Descárgalo con: "
+                                        f"python version_completa/detectores_rostro.py --descargar-dnn")
+        self.red = cv2.dnn.readNetFromCaffe(*rutas)
+        self.confianza_minima = confianza_minima
+
+    def detectar_escalada(self, imagen):
+        bgr = self.convertir(imagen, 'bgr')
+        alto, ancho = bgr.shape[:2]
+        self.red.setInput(cv2.dnn.blobFromImage(bgr, 1.0, (300, 300), (104.0, 177.0, 123.0)))
+        detecciones = self.red.forward()[0, 0]
+
+        cajas = []
+        for deteccion in detecciones[detecciones[:, 2] >= self.confianza_minima]:
+            x1, y1, x2, y2 = np.clip(deteccion[3:7], 0.0, 1.0) * [ancho, alto, ancho, alto]
+            if x2 > x1 and y2 > y1:
+                cajas.append((int(x1), int(y1), int(x2 - x1), int(y2 - y1)))
+        return cajas
+
+DETECTORES = {
+    'haar': DetectorHaar,
+    'mediapipe': DetectorMediaPipe,
+    'dnn': DetectorDNN
+}
+
+def crear_detector_rostros(tipo='haar', **opciones):
+    """Crea el detector de rostros indicado ('haar', 'mediapipe' o 'dnn')"""
+    if tipo not in DETECTORES:
+        raise ValueError(f"Detector de rostros desconocido: {tipo}. Opciones: {', '.join(DETECTORES)}")
+    return DETECTORES[tipo](**opciones)
+
+def descargar_modelo_dnn(carpeta=CARPETA_DNN):
+    """Descarga el prototxt y los pesos del detector res10 SSD"""
+    from descargas import descargar_varios
+    trabajos = [(url, os.path.join(carpeta, archivo)) for archivo, url in URLS_DNN.items()
+                if not os.path.exists(os.path.join(carpeta, archivo))]
+    if trabajos:
+        print(f"Descargando {len(trabajos)} archivos del detector DNN...")
+        resultados = descargar_varios(trabajos)
+        fallidos = [destino for destino, error in resultados.items() if error is not None]
+        if fallidos:
+            raise RuntimeError(f"No se pudo descargar: {', '.join(fallidos)}")
+    print(f"Modelo del detector DNN en '{carpeta}'")
+
+# Combinaciones que prueba el ajuste automático
+CANDIDATOS = [
+    *({'tipo': 'haar', 'escala': e, 'factor_escala': f, 'vecinos_minimos': v}
+      for e in (1.0, 0.75, 0.5, 0.35) for f in (1.1, 1.2, 1.3) for v in (3, 5)),
+    *({'tipo': 'mediapipe', 'escala': e, 'confianza_minima': c} for e in (1.0, 0.5) for c in (0.5, 0.7)),
+    *({'tipo': 'dnn', 'escala': e, 'confianza_minima': c} for e in (1.0, 0.5) for c in (0.5, 0.7))
+]
+
+def leer_fotogramas(fuente, num_fotogramas=100):
+    """Lee fotogramas BGR de una cámara (índice), un vídeo o una carpeta de imágenes"""
+    if isinstance(fuente, str) and os.path.isdir(fuente):
+        archivos = sorted(os.listdir(fuente))[:num_fotogramas]
+        fotogramas = [cv2.imread(os.path.join(fuente, a)) for a in archivos]
+        return [f for f in fotogramas if f is not None]
+
+    captura = cv2.VideoCapture(int(fuente) if str(fuente).isdigit() else fuente)
+    fotogramas = []
+    while len(fotogramas) < num_fotogramas:
+        ret, frame = captura.read()
+        if not ret:
+            break
+        fotogramas.append(frame)
+    captura.release()
+    return fotogramas
+
+def coincidencias(cajas, referencia, umbral=0.5):
+    """Número de cajas de referencia que tienen una caja detectada con IoU >= umbral"""
+    from seguimiento import iou
+    libres = list(cajas)
+    aciertos = 0
+    for caja_ref in referencia:
+        mejor = max(libres, key=lambda c: iou(c, caja_ref), default=None)
+        if mejor is not None and iou(mejor, caja_ref) >= umbral:
+            libres.remove(mejor)
+            aciertos += 1
+    return aciertos
+
+def evaluar_configuracion(detector, fotogramas, referencias):
+    """Latencia por fotograma y exhaustividad/precisión frente a las detecciones de referencia"""
+    detector.detectar(fotogramas[0])
+    latencias, aciertos, detectadas = [], 0, 0
+    for frame, referencia in zip(fotogramas, referencias):
+        inicio = time.perf_counter()
+        cajas = detector.detectar(frame)
+        latencias.append((time.perf_counter() - inicio) * 1000.0)
+        aciertos += coincidencias(cajas, referencia)
+        detectadas += len(cajas)
+
+    total_referencia = sum(len(r) for r in referencias)
+    return {
+        **{f"{p}_ms": round(v, 2) for p, v in percentiles(latencias).items()},
+        'exhaustividad': round(aciertos / total_referencia, 3) if total_referencia else 1.0,
+        'precision': round(aciertos / detectadas, 3) if detectadas else 1.0
+    }
+
+def ajustar(fotogramas, latencia_objetivo, candidatos=CANDIDATOS):
+    """Mide todas las configuraciones y elige la más exhaustiva cuyo p95 cumpla la latencia objetivo
+
+    La referencia es el detector más preciso disponible a resolución completa
+    (DNN, si no MediaPipe, si no Haar con parámetros finos).
+    """
+    referencia_detector = None
+    for tipo, opciones in (('dnn', {}), ('mediapipe', {}), ('haar', {'factor_escala': 1.05, 'vecinos_minimos': 5})):
+        try:
+            referencia_detector = crear_detector_rostros(tipo, **opciones)
+            print(f"Referencia: {tipo} a resolución completa")
+            break
+        except Exception as e:
+            print(f"  ({tipo} no disponible como referencia: {e})")
+    referencias = [referencia_detector.detectar(frame) for frame in fotogramas]
+
+    resultados = []
+    for candidato in candidatos:
+        opciones = {k: v for k, v in candidato.items() if k != 'tipo'}
+        try:
+            detector = crear_detector_rostros(candidato['tipo'], **opciones)
+        except Exception:
+            continue
+        medida = evaluar_configuracion(detector, fotogramas, referencias)
+        resultados.append({'config': candidato, **medida})
+        print(f"  {json.dumps(candidato):80s} p95 {medida['p95_ms']:7.2f} ms  "
+              f"exhaustividad {medida['exhaustividad']:.3f}  precisión {medida['precision']:.3f}")
+
+    validos = [r for r in resultados if r['p95_ms'] <= latencia_objetivo]
+    if not validos:
+        print(f"Ninguna configuración cumple {latencia_objetivo} ms; se elige la más rápida.")
+        return min(resultados, key=lambda r: r['p95_ms']), resultados
+    # Más exhaustiva, después más precisa y, a igualdad, más rápida
+    mejor = max(validos, key=lambda r: (r['exhaustividad'], r['precision'], -r['p95_ms']))
+    return mejor, resultados
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Elige detector de rostros y parámetros para una latencia objetivo")
+    parser.add_argument('--fuente', default='0', help="Índice de cámara, vídeo o carpeta de imágenes con rostros")
+    parser.add_argument('--fotogramas', type=int, default=100)
+    parser.add_argument('--latencia-objetivo', type=float, default=15.0, help="p95 máximo de la detección en ms")
+    parser.add_argument('--salida', default='ajuste_detector.json')
+    parser.add_argument('--descargar-dnn', action='store_true', help="Descargar el modelo del detector DNN y salir")
+    args = parser.parse_args()
+
+    if args.descargar_dnn:
+        descargar_modelo_dnn()
+    else:
+        fotogramas = leer_fotogramas(args.fuente, args.fotogramas)
+        if not fotogramas:
+            print(f"Error: no se pudieron leer fotogramas de {args.fuente}")
+        else:
+            alto, ancho = fotogramas[0].shape[:2]
+            print(f"Ajustando con {len(fotogramas)} fotogramas de {ancho}x{alto}, objetivo p95 <= {args.latencia_objetivo} ms")
+            mejor, resultados = ajustar(fotogramas, args.latencia_objetivo)
+            print(f"\nConfiguración elegida: {json.dumps(mejor['config'])} "
+                  f"(p95 {mejor['p95_ms']} ms, exhaustividad {mejor['exhaustividad']})")
+            with open(args.salida, 'w', encoding='utf-8') as f:
+                json.dump({'resolucion': f"{ancho}x{alto}", 'latencia_objetivo_ms': args.latencia_objetivo,
+                           'elegida': mejor, 'resultados': resultados}, f, indent=2, ensure_ascii=False)
+            print(f"Resultados guardados en {args.salida}")
@@ -0,0 +1,200 @@
+import cv2
+import json
+import os
+import sys
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+EXTENSIONES_IMAGEN = ('.png', '.jpg', '.jpeg', '.bmp')
+SPLITS = ['train', 'validation']
+# Ubicación del dataset empaquetado (relativa a la raíz del repositorio, desde donde se lanzan los scripts)
+RUTA_PAQUETE = os.path.join('version_completa', 'dataset_empaquetado')
+
+def listar_imagenes(ruta_split):
+    """Devuelve las clases (orden alfabético, como flow_from_directory) y la lista (ruta, índice de clase)"""
+    clases = sorted(d for d in os.listdir(ruta_split) if os.path.isdir(os.path.join(ruta_split, d)))
+    archivos = []
+    for indice, clase in enumerate(clases):
+        ruta_clase = os.path.join(ruta_split, clase)
+        for archivo in sorted(os.listdir(ruta_clase)):
+            if archivo.lower().endswith(EXTENSIONES_IMAGEN):
+                archivos.append((os.path.join(ruta_clase, archivo), indice))
+    return clases, archivos
+
+def leer_rostro(ruta):
+    """Lee una imagen en escala de grises a 48x48 (None si no se puede leer)"""
+    imagen = cv2.imread(ruta, cv2.IMREAD_GRAYSCALE)
+    if imagen is None:
+        return None
+    if imagen.shape != (48, 48):
+        imagen = cv2.resize(imagen, (48, 48), interpolation=cv2.INTER_AREA)
+    return imagen
+
+def empaquetar_split(ruta_split, ruta_salida, split, hilos=8):
+    """Empaqueta un split en un array uint8 (N, 48, 48) mapeado en memoria y un array de etiquetas"""
+    clases, archivos = listar_imagenes(ruta_split)
+    ruta_imagenes = os.path.join(ruta_salida, f"{split}_imagenes.npy")
+    imagenes = np.lib.format.open_memmap(ruta_imagenes, mode='w+', dtype=np.uint8, shape=(len(archivos), 48, 48))
+    etiquetas = np.empty(len(archivos), dtype=np.uint8)
+
+    # cv2 libera el GIL al decodificar, así que los hilos aprovechan varios núcleos
+    validas = 0
+    with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+        for (ruta, clase), rostro in zip(archivos, ejecutor.map(leer_rostro, (r for r, _ in archivos))):
+            if rostro is None:
+                print(f"  ✗ No se pudo leer {ruta}")
+                continue
+            imagenes[validas] = rostro
+            etiquetas[validas] = clase
+            validas += 1
+
+    imagenes.flush()
+    del imagenes
+    if validas < len(archivos):
+        # Recortar el archivo a las imágenes válidas
+        completas = np.load(ruta_imagenes, mmap_mode='r')[:validas].copy()
+        np.save(ruta_imagenes, completas)
+    np.save(os.path.join(ruta_salida, f"{split}_etiquetas.npy"), etiquetas[:validas])
+
+    conteo = {clase: int(np.count_nonzero(etiquetas[:validas] == i)) for i, clase in enumerate(clases)}
+    return clases, validas, conteo
+
+def empaquetar_dataset(ruta_dataset='version_completa/dataset', ruta_salida=RUTA_PAQUETE):
+    """Convierte el árbol dataset/{train,validation}/<clase>/*.jpg en arrays empaquetados con un índice"""
+    os.makedirs(ruta_salida, exist_ok=True)
+    indice = {'forma': [48, 48], 'tipo': 'uint8', 'origen': os.path.abspath(ruta_dataset), 'splits': {}}
+
+    for split in SPLITS:
+        ruta_split = os.path.join(ruta_dataset, split)
+        if not os.path.isdir(ruta_split):
+            print(f"No existe {ruta_split}, se omite.")
+            continue
+        inicio = time.perf_counter()
+        clases, total, conteo = empaquetar_split(ruta_split, ruta_salida, split)
+        indice['clases'] = clases
+        indice['splits'][split] = {
+            'imagenes': f"{split}_imagenes.npy",
+            'etiquetas': f"{split}_etiquetas.npy",
+            'total': total,
+            'por_clase': conteo
+        }
+        print(f"  ✓ {split}: {total} imágenes en {time.perf_counter() - inicio:.1f} s")
+
+    guardar_indice(ruta_salida, indice)
+    print(f"Dataset empaquetado en '{ruta_salida}'")
+    return indice
+
+def leer_indice(ruta_paquete):
+    """Lee el índice del paquete (None si todavía no existe)"""
+    ruta = os.path.join(ruta_paquete, 'indice.json')
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+def guardar_indice(ruta_paquete, indice):
+    """Escribe el índice de forma atómica"""
+    ruta = os.path.join(ruta_paquete, 'indice.json')
+    with open(ruta + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(indice, f, indent=2, ensure_ascii=False)
+    os.replace(ruta + '.tmp', ruta)
+
+def agregar_al_paquete(ruta_paquete, split, imagenes, etiquetas, clases):
+    """Añade imágenes uint8 (N, 48, 48) y etiquetas al final de un split, creando el paquete si no existe"""
+    os.makedirs(ruta_paquete, exist_ok=True)
+    indice = leer_indice(ruta_paquete) or {'forma': [48, 48], 'tipo': 'uint8', 'origen': 'capturas', 'splits': {}}
+    indice.setdefault('clases', list(clases))
+    if indice['clases'] != list(clases):
+        raise ValueError(f"Las clases no coinciden con las del paquete: {indice['clases']}")
+
+    datos = indice['splits'].get(split, {'imagenes': f"{split}_imagenes.npy",
+                                         'etiquetas': f"{split}_etiquetas.npy", 'total': 0})
+    ruta_imagenes = os.path.join(ruta_paquete, datos['imagenes'])
+    ruta_etiquetas = os.path.join(ruta_paquete, datos['etiquetas'])
+    previas = datos['total']
+
+    # Copiar lo existente y lo nuevo a un array mapeado del tamaño final y sustituirlo al terminar
+    temporal = ruta_imagenes + '.tmp.npy'
+    total = previas + len(imagenes)
+    combinadas = np.lib.format.open_memmap(temporal, mode='w+', dtype=np.uint8, shape=(total, 48, 48))
+    if previas:
+        combinadas[:previas] = np.load(ruta_imagenes, mmap_mode='r')
+    combinadas[previas:] = imagenes
+    combinadas.flush()
+    del combinadas
+    os.replace(temporal, ruta_imagenes)
+
+    todas = np.concatenate([np.load(ruta_etiquetas) if previas else np.empty(0, np.uint8),
+                            np.asarray(etiquetas, dtype=np.uint8)])
+    np.save(ruta_etiquetas, todas)
+
+    datos['total'] = total
+    datos['por_clase'] = {clase: int(np.count_nonzero(todas == i)) for i, clase in enumerate(indice['clases'])}
+    indice['splits'][split] = datos
+    guardar_indice(ruta_paquete, indice)
+    return total
+
+def cargar_paquete(ruta_paquete, split):
+    """Devuelve (imágenes mapeadas en memoria, etiquetas, índice) de un split empaquetado"""
+    indice = leer_indice(ruta_paquete)
+    datos = indice['splits'][split]
+    imagenes = np.load(os.path.join(ruta_paquete, datos['imagenes']), mmap_mode='r')
+    etiquetas = np.load(os.path.join(ruta_paquete, datos['etiquetas']))
+    return imagenes, etiquetas, indice
+
+def crear_dataset_tf(ruta_paquete, split, batch_size=32, entrenamiento=False, aumentar=False, semilla=None,
+                     en_memoria=True):
+    """Crea un tf.data.Dataset con (imágenes float32 (48, 48, 1) en 0-1, etiquetas one-hot)
+
+    Pipeline: normalización en paralelo, cache en memoria, barajado (solo en
+    entrenamiento), lotes, aumento opcional por lotes (ver aumentacion.py) y
+    prefetch, para que el tiempo de cada época dependa del cómputo y no de la
+    lectura de archivos.
+
+    Con `en_memoria=False` no se copia el split: cada lote se lee del array
+    mapeado, así que varios procesos entrenando a la vez (ver barrido_modelos.py)
+    comparten una sola copia del dataset en la caché de páginas del sistema.
+    """
+    import tensorflow as tf
+
+    imagenes, etiquetas, indice = cargar_paquete(ruta_paquete, split)
+    num_clases = len(indice['clases'])
+    autotune = tf.data.AUTOTUNE
+
+    def normalizar(imagen, etiqueta):
+        imagen = tf.cast(imagen[..., tf.newaxis], tf.float32) / 255.0
+        return imagen, tf.one_hot(tf.cast(etiqueta, tf.int32), num_clases)
+
+    if en_memoria:
+        dataset = tf.data.Dataset.from_tensor_slices((np.asarray(imagenes), etiquetas))
+        dataset = dataset.map(normalizar, num_parallel_calls=autotune).cache()
+        if entrenamiento:
+            dataset = dataset.shuffle(len(etiquetas), seed=semilla, reshuffle_each_iteration=True)
+        dataset = dataset.batch(batch_size)
+    else:
+        def leer_lote(posiciones):
+            # Índices ordenados: lectura más secuencial del archivo mapeado
+            posiciones = np.sort(posiciones)
+            return imagenes[posiciones], etiquetas[posiciones]
+
+        def leer(posiciones):
+            lote, etiquetas_lote = tf.numpy_function(leer_lote, [posiciones], (tf.uint8, tf.uint8))
+            lote.set_shape([None, 48, 48])
+            etiquetas_lote.set_shape([None])
+            return normalizar(lote, etiquetas_lote)
+
+        dataset = tf.data.Dataset.range(len(etiquetas))
+        if entrenamiento:
+            dataset = dataset.shuffle(len(etiquetas), seed=semilla, reshuffle_each_iteration=True)
+        dataset = dataset.batch(batch_size).map(leer, num_parallel_calls=autotune)
+    if entrenamiento and aumentar:
+        from aumentacion import aplicar_aumento
+        dataset = aplicar_aumento(dataset, semilla)
+    return dataset.prefetch(autotune)
+
+if __name__ == "__main__":
+    print("=== Empaquetado del dataset para entrenamiento ===")
+    ruta_dataset = sys.argv[1] if len(sys.argv) > 1 else 'version_completa/dataset'
+    ruta_salida = sys.argv[2] if len(sys.argv) > 2 else RUTA_PAQUETE
+    empaquetar_dataset(ruta_dataset, ruta_salida)
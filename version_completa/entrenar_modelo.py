@@ -7,56 +7,70 @@ from tensorflow.keras.layers import BatchNormalization
 import numpy as np
 import os
 
-def crear_modelo():
-    """Crea un modelo CNN para reconocimiento de expresiones faciales"""
+# Arquitectura de modelos/3: cada bloque es una lista de capas (número = Conv2D con esos
+# filtros, 'pool' = MaxPooling2D 2x2) y termina con un Dropout
+BLOQUES_POR_DEFECTO = [
+    [32, 64, 'pool'],
+    [128, 'pool', 128, 'pool'],
+    [256, 'pool', 256, 'pool']
+]
+
+def crear_modelo(bloques=BLOQUES_POR_DEFECTO, dropout=0.3, batch_norm=True, padding='same',
+                 densa=1024, dropout_densa=0.5, tasa_aprendizaje=0.0001):
+    """Crea un modelo CNN para reconocimiento de expresiones faciales
+    
+    Con los valores por defecto es la arquitectura de modelos/3; los parámetros
+    permiten probar variantes (ver barrido_modelos.py): filtros y capas de cada
+    bloque, dropout, BatchNormalization después de cada Conv2D, padding, tamaño
+    de la capa densa y tasa de aprendizaje.
+    """
     modelo = Sequential()
     
-    # Primera capa convolucional
-    modelo.add(Conv2D(32, kernel_size=(3, 3), activation='relu', padding="same", input_shape=(48, 48, 1)))
-    modelo.add(BatchNormalization())    
-    modelo.add(Conv2D(64, kernel_size=(3, 3), activation='relu', padding="same"))
-    modelo.add(BatchNormalization())
-    modelo.add(MaxPooling2D(pool_size=(2, 2)))
-    modelo.add(Dropout(0.3))
-    
-    # Segunda capa convolucional
-    modelo.add(Conv2D(128, kernel_size=(3, 3), activation='relu', padding="same"))
-    modelo.add(BatchNormalization())
-    modelo.add(MaxPooling2D(pool_size=(2, 2)))
-    modelo.add(Conv2D(128, kernel_size=(3, 3), activation='relu', padding="same"))
-    modelo.add(BatchNormalization())
-    modelo.add(MaxPooling2D(pool_size=(2, 2)))
-    modelo.add(Dropout(0.3))
-
-    # Tercera capa convolucional
-    modelo.add(Conv2D(256, kernel_size=(3, 3), activation='relu', padding="same"))
-    modelo.add(BatchNormalization())
-    modelo.add(MaxPooling2D(pool_size=(2, 2)))
-    modelo.add(Conv2D(256, kernel_size=(3, 3), activation='relu', padding="same"))
-    modelo.add(BatchNormalization())
-    modelo.add(MaxPooling2D(pool_size=(2, 2)))
-    modelo.add(Dropout(0.3))
+    # Bloques convolucionales
+    primera = True
+    for bloque in bloques:
+        for capa in bloque:
+            if capa == 'pool':
+                modelo.add(MaxPooling2D(pool_size=(2, 2)))
+                continue
+            if primera:
+                modelo.add(Conv2D(capa, kernel_size=(3, 3), activation='relu', padding=padding, input_shape=(48, 48, 1)))
+                primera = False
+            else:
+                modelo.add(Conv2D(capa, kernel_size=(3, 3), activation='relu', padding=padding))
+            if batch_norm:
+                modelo.add(BatchNormalization())
+        modelo.add(Dropout(dropout))
     
     # Capa flatten
     modelo.add(Flatten())
     
     # Capas densas
-    modelo.add(Dense(1024, activation='relu'))
-    modelo.add(Dropout(0.5))
+    modelo.add(Dense(densa, activation='relu'))
+    modelo.add(Dropout(dropout_densa))
     modelo.add(Dense(7, activation='softmax'))  # 7 emociones
     
     # Compilar modelo
     modelo.compile(
         loss='categorical_crossentropy',
-        optimizer=Adam(learning_rate=0.0001),
+        optimizer=Adam(learning_rate=tasa_aprendizaje),
         metrics=['accuracy']
     )
     
     return modelo
 
-def entrenar_modelo(ruta_datos, batch_size=32, epocas=50):
-    """Entrenamiento del modelo usando datos desde un directorio"""
-    # Crear generadores de datos para entrenamiento y validación
+def crear_flujos(ruta_datos, batch_size, ruta_paquete=None, semilla=None):
+    """Devuelve los flujos de entrenamiento y validación (desde el directorio o el dataset empaquetado)"""
+    if ruta_paquete is not None:
+        # Dataset empaquetado (ver empaquetar_dataset.py): sin decodificar JPEG en cada época
+        # y con el aumento aplicado a lotes completos (ver aumentacion.py)
+        from empaquetar_dataset import crear_dataset_tf
+        flujo_entrenamiento = crear_dataset_tf(ruta_paquete, 'train', batch_size, entrenamiento=True,
+                                               aumentar=True, semilla=semilla)
+        flujo_validacion = crear_dataset_tf(ruta_paquete, 'validation', batch_size)
+        return flujo_entrenamiento, flujo_validacion
+
+    # Generadores de datos para entrenamiento (con aumento) y validación
     generador_entrenamiento = ImageDataGenerator(
         rescale=1./255,
         rotation_range=10,
@@ -69,7 +83,7 @@ def entrenar_modelo(ruta_datos, batch_size=32, epocas=50):
     )
     
     generador_validacion = ImageDataGenerator(rescale=1./255)
-    
+
     # Flujos de datos para entrenamiento y validación
     flujo_entrenamiento = generador_entrenamiento.flow_from_directory(
         os.path.join('version_completa', ruta_datos, 'train'),
@@ -86,6 +100,11 @@ def entrenar_modelo(ruta_datos, batch_size=32, epocas=50):
         color_mode='grayscale',
         class_mode='categorical'
     )
+    return flujo_entrenamiento, flujo_validacion
+
+def entrenar_modelo(ruta_datos, batch_size=32, epocas=50, ruta_paquete=None, semilla=None):
+    """Entrenamiento del modelo usando datos desde un directorio o desde un dataset empaquetado"""
+    flujo_entrenamiento, flujo_validacion = crear_flujos(ruta_datos, batch_size, ruta_paquete, semilla)
 
     # Muestro las clases y sus índices
     # class_indices = flujo_entrenamiento.class_indices
@@ -179,7 +198,16 @@ if __name__ == "__main__":
     if respuesta.lower() == 's':
         # Entrenar modelo
         ruta_datos = 'dataset'
-        modelo, historial = entrenar_modelo(ruta_datos)
+
+        # Usar el dataset empaquetado si existe (python version_completa/empaquetar_dataset.py)
+        from empaquetar_dataset import RUTA_PAQUETE
+        ruta_paquete = RUTA_PAQUETE
+        if not os.path.exists(os.path.join(ruta_paquete, 'indice.json')):
+            ruta_paquete = None
+        else:
+            print(f"Usando el dataset empaquetado de '{ruta_paquete}'")
+
+        modelo, historial = entrenar_modelo(ruta_datos, ruta_paquete=ruta_paquete)
         print("Entrenamiento completado. Modelo guardado como 'modelo_expresiones.h5'")
         print("Entrenamiento completado. Modelo guardado como 'modelo_expresiones.keras'")
     else:
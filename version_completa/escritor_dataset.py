@@ -0,0 +1,136 @@
+import cv2
+import os
+import queue
+import threading
+import numpy as np
+from empaquetar_dataset import agregar_al_paquete, leer_indice
+
+class EscritorDataset:
+    """Guarda los rostros capturados en segundo plano
+
+    El bucle de la cámara solo encola el recorte (cola acotada); los hilos de
+    trabajo codifican y escriben en disco, así que un disco lento no congela la
+    interfaz. Dos formatos:
+      - 'jpeg': un archivo por rostro en <ruta>/<conjunto>/<expresion>/<nombre>
+      - 'empaquetado': los rostros se añaden a fragmentos binarios (48x48 bytes
+        por rostro y un byte de etiqueta) que al cerrar se incorporan al dataset
+        empaquetado de empaquetar_dataset.py (arrays .npy + indice.json)
+    Si la cola está llena durante `tiempo_espera` segundos el rostro se descarta
+    y se cuenta en `descartados`.
+    """
+
+    def __init__(self, ruta, formato='jpeg', clases=None, hilos=2, capacidad=256, tiempo_espera=0.1):
+        if formato not in ('jpeg', 'empaquetado'):
+            raise ValueError(f"Formato desconocido: {formato}. Opciones: jpeg, empaquetado")
+        self.ruta = ruta
+        self.formato = formato
+        self.tiempo_espera = tiempo_espera
+        self.cola = queue.Queue(maxsize=capacidad)
+        self.hilos = [threading.Thread(target=self._trabajar, daemon=True) for _ in range(hilos)]
+        # Protege los fragmentos abiertos y las estadísticas que actualizan los hilos de escritura
+        self.cerrojo = threading.Lock()
+
+        if formato == 'empaquetado':
+            # Mismo orden de clases que flow_from_directory y empaquetar_dataset.py
+            indice = leer_indice(ruta)
+            self.clases = indice['clases'] if indice and 'clases' in indice else sorted(clases)
+            self.fragmentos = {}
+            os.makedirs(ruta, exist_ok=True)
+            # Incorporar fragmentos que hayan quedado de una sesión interrumpida
+            self.consolidar()
+
+        # Estadísticas
+        self.encolados = 0
+        self.escritos = 0
+        self.descartados = 0
+        self.errores = 0
+
+    def iniciar(self):
+        for hilo in self.hilos:
+            hilo.start()
+        return self
+
+    def guardar(self, rostro, conjunto, expresion, nombre=None):
+        """Encola un rostro 48x48 en escala de grises; devuelve False si se descartó"""
+        try:
+            self.cola.put((rostro, conjunto, expresion, nombre), timeout=self.tiempo_espera)
+        except queue.Full:
+            self.descartados += 1
+            return False
+        self.encolados += 1
+        return True
+
+    def pendientes(self):
+        return self.cola.qsize()
+
+    def _trabajar(self):
+        while True:
+            tarea = self.cola.get()
+            if tarea is None:
+                break
+            try:
+                if self.formato == 'jpeg':
+                    self._escribir_jpeg(*tarea)
+                else:
+                    self._escribir_fragmento(*tarea)
+                with self.cerrojo:
+                    self.escritos += 1
+            except Exception as e:
+                with self.cerrojo:
+                    self.errores += 1
+                print(f"Error al guardar el rostro: {e}")
+
+    def _escribir_jpeg(self, rostro, conjunto, expresion, nombre):
+        ruta = os.path.join(self.ruta, conjunto, expresion, nombre)
+        if not cv2.imwrite(ruta, rostro):
+            raise IOError(f"No se pudo escribir {ruta}")
+
+    def _rutas_fragmento(self, conjunto):
+        return (os.path.join(self.ruta, f"{conjunto}_imagenes.fragmento"),
+                os.path.join(self.ruta, f"{conjunto}_etiquetas.fragmento"))
+
+    def _escribir_fragmento(self, rostro, conjunto, expresion, nombre):
+        datos = np.ascontiguousarray(rostro, dtype=np.uint8).tobytes()
+        etiqueta = bytes([self.clases.index(expresion)])
+        with self.cerrojo:
+            if conjunto not in self.fragmentos:
+                rutas = self._rutas_fragmento(conjunto)
+                self.fragmentos[conjunto] = (open(rutas[0], 'ab'), open(rutas[1], 'ab'))
+            archivo_imagenes, archivo_etiquetas = self.fragmentos[conjunto]
+            # La imagen se escribe antes que su etiqueta: un corte deja como mucho una imagen sin etiqueta
+            archivo_imagenes.write(datos)
+            archivo_etiquetas.write(etiqueta)
+
+    def consolidar(self):
+        """Añade los fragmentos pendientes al dataset empaquetado y los elimina"""
+        for conjunto in ('train', 'validation'):
+            ruta_imagenes, ruta_etiquetas = self._rutas_fragmento(conjunto)
+            if not os.path.exists(ruta_etiquetas):
+                continue
+            etiquetas = np.fromfile(ruta_etiquetas, dtype=np.uint8)
+            imagenes = np.fromfile(ruta_imagenes, dtype=np.uint8)
+            # Descartar un posible rostro a medio escribir si la sesión se cortó
+            n = min(len(etiquetas), len(imagenes) // (48 * 48))
+            imagenes = imagenes[:n * 48 * 48].reshape(n, 48, 48)
+            etiquetas = etiquetas[:n]
+            if len(etiquetas):
+                total = agregar_al_paquete(self.ruta, conjunto, imagenes, etiquetas, self.clases)
+                print(f"  ✓ {conjunto}: {len(etiquetas)} rostros añadidos al paquete ({total} en total)")
+            os.remove(ruta_imagenes)
+            os.remove(ruta_etiquetas)
+
+    def cerrar(self):
+        """Espera a que se escriba todo lo encolado y, en formato empaquetado, actualiza el paquete"""
+        for _ in self.hilos:
+            self.cola.put(None)
+        for hilo in self.hilos:
+            hilo.join()
+
+        if self.formato == 'empaquetado':
+            for archivo_imagenes, archivo_etiquetas in self.fragmentos.values():
+                archivo_imagenes.close()
+                archivo_etiquetas.close()
+            self.fragmentos = {}
+            self.consolidar()
+
+        print(f"Escritor: {self.escritos} rostros guardados, {self.descartados} descartados, {self.errores} errores")
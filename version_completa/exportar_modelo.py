@@ -0,0 +1,84 @@
+import glob
+import os
+import sys
+
+def exportar_tflite(ruta_h5, ruta_salida=None):
+    """Convierte un modelo .h5 de Keras a TensorFlow Lite (float32)"""
+    import tensorflow as tf
+
+    if ruta_salida is None:
+        ruta_salida = os.path.splitext(ruta_h5)[0] + '.tflite'
+
+    modelo = tf.keras.models.load_model(ruta_h5)
+    convertidor = tf.lite.TFLiteConverter.from_keras_model(modelo)
+    modelo_tflite = convertidor.convert()
+
+    with open(ruta_salida, 'wb') as f:
+        f.write(modelo_tflite)
+
+    print(f"  ✓ TFLite: {ruta_salida} ({len(modelo_tflite) / 1024:.0f} KB)")
+    return ruta_salida
+
+def exportar_onnx(ruta_h5, ruta_salida=None):
+    """Convierte un modelo .h5 de Keras a ONNX para el backend DNN de OpenCV"""
+    import tensorflow as tf
+    try:
+        import tf2onnx
+    except ImportError:
+        print("  ✗ ONNX: falta la biblioteca tf2onnx (pip install tf2onnx)")
+        return None
+
+    if ruta_salida is None:
+        ruta_salida = os.path.splitext(ruta_h5)[0] + '.onnx'
+
+    modelo = tf.keras.models.load_model(ruta_h5)
+    firma = (tf.TensorSpec((None, 48, 48, 1), tf.float32, name='entrada'),)
+    funcion = tf.function(lambda entrada: modelo(entrada, training=False))
+    tf2onnx.convert.from_function(funcion, input_signature=firma, opset=13, output_path=ruta_salida)
+
+    print(f"  ✓ ONNX: {ruta_salida} ({os.path.getsize(ruta_salida) / 1024:.0f} KB)")
+    return ruta_salida
+
+def comprobar_equivalencia(ruta_h5, num_muestras=16):
+    """Compara las etiquetas y confianzas de todos los backends exportados frente a Keras"""
+    import numpy as np
+    from backends_inferencia import EXTENSIONES_BACKEND, crear_backend, ruta_para_backend
+
+    lote = np.random.default_rng(0).random((num_muestras, 48, 48, 1), dtype=np.float32)
+    referencia = crear_backend('keras', ruta_h5).predecir(lote)
+
+    for tipo in EXTENSIONES_BACKEND:
+        if tipo == 'keras' or not os.path.exists(ruta_para_backend(ruta_h5, tipo)):
+            continue
+        prediccion = crear_backend(tipo, ruta_h5).predecir(lote)
+        mismas_etiquetas = np.array_equal(np.argmax(prediccion, axis=1), np.argmax(referencia, axis=1))
+        diferencia = float(np.max(np.abs(prediccion - referencia)))
+        estado = "✓" if mismas_etiquetas and diferencia < 1e-4 else "✗"
+        print(f"  {estado} {tipo}: mismas etiquetas={mismas_etiquetas}, diferencia máxima={diferencia:.2e}")
+
+def exportar_modelos(patron='./version_completa/modelos/*/modelo_expresiones.h5'):
+    """Exporta a TFLite y ONNX todos los modelos que coincidan con el patrón"""
+    rutas = sorted(glob.glob(patron))
+    if not rutas:
+        print(f"No se encontraron modelos con el patrón: {patron}")
+        return []
+
+    for ruta_h5 in rutas:
+        print(f"Exportando {ruta_h5}...")
+        try:
+            exportar_tflite(ruta_h5)
+            exportar_onnx(ruta_h5)
+            comprobar_equivalencia(ruta_h5)
+        except Exception as e:
+            print(f"  ✗ Error al exportar {ruta_h5}: {e}")
+
+    return rutas
+
+if __name__ == "__main__":
+    print("=== Exportación de modelos a TFLite y ONNX ===")
+
+    # Se puede indicar un modelo concreto; por defecto se exportan todos los de 'modelos/'
+    if len(sys.argv) > 1:
+        exportar_modelos(sys.argv[1])
+    else:
+        exportar_modelos()
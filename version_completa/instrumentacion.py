@@ -0,0 +1,137 @@
+import cv2
+import csv
+import os
+import time
+from collections import defaultdict, deque
+from medicion import RegistroEtapas
+
+class Instrumentacion(RegistroEtapas):
+    """Métricas en vivo para los bucles de cámara
+
+    Mide la latencia de cada etapa sobre una ventana de las últimas muestras y
+    lleva contadores (rostros vistos, inferencias, llamadas al modelo...) y
+    valores instantáneos (fotogramas descartados). Se puede mostrar como HUD en
+    pantalla, volcar periódicamente a un CSV y a un archivo de texto en formato
+    Prometheus (para el textfile collector de node_exporter).
+
+    Los detectores usan por defecto un RegistroNulo, cuyo coste por etapa es una
+    llamada vacía, así que la instrumentación puede quedarse siempre en el bucle.
+    """
+
+    def __init__(self, hud=False, ruta_csv=None, ruta_prometheus=None,
+                 intervalo_volcado=5.0, ventana=300, prefijo='detector'):
+        super().__init__()
+        self.muestras = defaultdict(lambda: deque(maxlen=ventana))
+        # Número de muestras y suma de segundos acumulados desde el inicio (no solo la ventana)
+        self.totales = defaultdict(lambda: [0, 0.0])
+        self.valores = {}
+        self.hud = hud
+        self.ruta_csv = ruta_csv
+        self.ruta_prometheus = ruta_prometheus
+        self.intervalo_volcado = intervalo_volcado
+        self.prefijo = prefijo
+
+        self.inicio = time.monotonic()
+        self.ultimo_volcado = self.inicio
+        self.fotogramas_ultimo_volcado = 0
+        self.fps = 0.0
+
+    def anotar(self, nombre, segundos):
+        super().anotar(nombre, segundos)
+        total = self.totales[nombre]
+        total[0] += 1
+        total[1] += segundos
+
+    def reiniciar(self):
+        super().reiniciar()
+        self.totales.clear()
+
+    def fijar(self, nombre, valor):
+        """Guarda un valor instantáneo (por ejemplo, fotogramas descartados por la captura)"""
+        self.valores[nombre] = valor
+
+    def tick(self, frame=None):
+        """Marca el final de un fotograma: cuenta, dibuja el HUD y vuelca si toca"""
+        self.contar('fotogramas')
+        if self.hud and frame is not None:
+            self.dibujar_hud(frame)
+
+        ahora = time.monotonic()
+        if ahora - self.ultimo_volcado >= self.intervalo_volcado:
+            fotogramas = self.contadores['fotogramas']
+            self.fps = (fotogramas - self.fotogramas_ultimo_volcado) / (ahora - self.ultimo_volcado)
+            self.fotogramas_ultimo_volcado = fotogramas
+            self.ultimo_volcado = ahora
+            self.volcar()
+
+    def dibujar_hud(self, frame):
+        """Dibuja FPS, latencia media por etapa y contadores en la esquina superior izquierda"""
+        lineas = [f"FPS: {self.fps:.1f}"]
+        for nombre, muestras in self.muestras.items():
+            if muestras:
+                lineas.append(f"{nombre}: {1000.0 * sum(muestras) / len(muestras):.1f} ms")
+        for nombre, valor in list(self.contadores.items()) + list(self.valores.items()):
+            lineas.append(f"{nombre}: {valor}")
+
+        y = 60
+        for linea in lineas:
+            cv2.putText(frame, linea, (10, y), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 255, 255), 1)
+            y += 18
+
+    def volcar(self):
+        """Escribe las métricas actuales en el CSV y en el archivo de Prometheus"""
+        resumen = self.resumen()
+        if self.ruta_csv:
+            self.volcar_csv(resumen)
+        if self.ruta_prometheus:
+            self.volcar_prometheus(resumen)
+
+    def volcar_csv(self, resumen):
+        """Añade al CSV una fila por etapa y por contador (formato largo, columnas fijas)"""
+        nuevo = not os.path.exists(self.ruta_csv)
+        marca = round(time.time(), 3)
+        with open(self.ruta_csv, 'a', newline='', encoding='utf-8') as f:
+            escritor = csv.writer(f)
+            if nuevo:
+                escritor.writerow(['tiempo', 'tipo', 'nombre', 'p50_ms', 'p95_ms', 'p99_ms', 'valor'])
+            escritor.writerow([marca, 'fps', 'fps', '', '', '', round(self.fps, 2)])
+            for nombre, datos in resumen.items():
+                escritor.writerow([marca, 'etapa', nombre, datos['p50_ms'], datos['p95_ms'], datos['p99_ms'], datos['n']])
+            for nombre, valor in self.contadores.items():
+                escritor.writerow([marca, 'contador', nombre, '', '', '', valor])
+            for nombre, valor in self.valores.items():
+                escritor.writerow([marca, 'valor', nombre, '', '', '', valor])
+
+    def volcar_prometheus(self, resumen):
+        """Reescribe el archivo de métricas en formato de texto de Prometheus (de forma atómica)"""
+        p = self.prefijo
+        lineas = [f"# TYPE {p}_fps gauge", f"{p}_fps {self.fps:.3f}"]
+
+        lineas.append(f"# TYPE {p}_etapa_segundos summary")
+        for nombre, datos in resumen.items():
+            for percentil, cuantil in (('p50', '0.5'), ('p95', '0.95'), ('p99', '0.99')):
+                segundos = datos[f'{percentil}_ms'] / 1000.0
+                lineas.append(f'{p}_etapa_segundos{{etapa="{nombre}",quantile="{cuantil}"}} {segundos:.6f}')
+            # _count y _sum son acumulados: los cuantiles son de la ventana, pero estos no deben bajar nunca
+            cuenta, suma = self.totales[nombre]
+            lineas.append(f'{p}_etapa_segundos_sum{{etapa="{nombre}"}} {suma:.6f}')
+            lineas.append(f'{p}_etapa_segundos_count{{etapa="{nombre}"}} {cuenta}')
+
+        for nombre, valor in self.contadores.items():
+            lineas.append(f"# TYPE {p}_{nombre}_total counter")
+            lineas.append(f"{p}_{nombre}_total {valor}")
+        for nombre, valor in self.valores.items():
+            # Una muestra de Prometheus solo admite números: un valor de texto invalidaría el archivo
+            if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+                continue
+            lineas.append(f"# TYPE {p}_{nombre} gauge")
+            lineas.append(f"{p}_{nombre} {valor}")
+
+        temporal = self.ruta_prometheus + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lineas) + '\n')
+        os.replace(temporal, self.ruta_prometheus)
+
+    def cerrar(self):
+        """Vuelca las métricas finales"""
+        self.volcar()
@@ -0,0 +1,96 @@
+import time
+import numpy as np
+from collections import defaultdict
+
+class _Cronometro:
+    """Contexto que mide la duración de una etapa y la anota en su registro"""
+    __slots__ = ('registro', 'nombre', 'inicio')
+
+    def __init__(self, registro, nombre):
+        self.registro = registro
+        self.nombre = nombre
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *excepcion):
+        self.registro.anotar(self.nombre, time.perf_counter() - self.inicio)
+        return False
+
+class _CronometroNulo:
+    """Contexto que no hace nada (medición desactivada)"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        return False
+
+CRONOMETRO_NULO = _CronometroNulo()
+
+def percentiles(valores, ps=(50, 95, 99)):
+    """Devuelve un diccionario {pXX: valor} con los percentiles pedidos"""
+    if len(valores) == 0:
+        return {f"p{p}": 0.0 for p in ps}
+    calculados = np.percentile(np.asarray(valores, dtype=np.float64), ps)
+    return {f"p{p}": float(v) for p, v in zip(ps, calculados)}
+
+class RegistroEtapas:
+    """Guarda la duración de cada etapa del pipeline para calcular percentiles de latencia
+
+    Uso:
+        with registro.etapa('deteccion'):
+            ...
+    """
+
+    activo = True
+
+    def __init__(self):
+        self.muestras = defaultdict(list)
+        self.contadores = defaultdict(int)
+
+    def etapa(self, nombre):
+        return _Cronometro(self, nombre)
+
+    def anotar(self, nombre, segundos):
+        self.muestras[nombre].append(segundos)
+
+    def contar(self, nombre, cantidad=1):
+        self.contadores[nombre] += cantidad
+
+    def reiniciar(self):
+        self.muestras.clear()
+        self.contadores.clear()
+
+    def resumen(self):
+        """Devuelve, por etapa, p50/p95/p99 y media en milisegundos y el número de muestras"""
+        resumen = {}
+        for nombre, valores in self.muestras.items():
+            milisegundos = np.asarray(valores) * 1000.0
+            datos = {f"{p}_ms": round(v, 4) for p, v in percentiles(milisegundos).items()}
+            datos['media_ms'] = round(float(np.mean(milisegundos)), 4)
+            datos['n'] = len(valores)
+            resumen[nombre] = datos
+        return resumen
+
+class RegistroNulo:
+    """Registro que no mide nada: es el que usan los detectores por defecto"""
+
+    activo = False
+
+    def etapa(self, nombre):
+        return CRONOMETRO_NULO
+
+    def anotar(self, nombre, segundos):
+        pass
+
+    def contar(self, nombre, cantidad=1):
+        pass
+
+    def reiniciar(self):
+        pass
+
+    def resumen(self):
+        return {}
@@ -0,0 +1,356 @@
+import argparse
+import multiprocessing
+import queue
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from medicion import percentiles
+from renderizado import crear_renderizador
+
+# Descripción de un fotograma publicado: la ranura que ocupa, su forma y metadatos pequeños.
+# Por las colas solo viajan descriptores; los píxeles se quedan en la memoria compartida
+Descriptor = namedtuple('Descriptor', ['ranura', 'indice', 'marca_tiempo', 'forma', 'datos'])
+
+# Ranura ficticia que indica que la fuente ha terminado
+FIN = -1
+
+class TransporteFotogramas:
+    """Paso de fotogramas entre procesos sin copiarlos ni serializarlos
+
+    Reserva un bloque de memoria compartida dividido en `num_ranuras` ranuras
+    de `forma_maxima` (por ejemplo 1080x1920x3). Quien produce un fotograma
+    toma una ranura libre con reservar(), escribe en su vista numpy y la
+    publica en la cola de una etapa; la etapa siguiente recibe el descriptor,
+    trabaja sobre la misma memoria (vista sin copia) y, o bien la publica a
+    su vez en otra etapa, o la devuelve al conjunto libre con liberar().
+
+    Las colas son de multiprocessing y solo transportan descriptores de unos
+    pocos bytes. El objeto se pasa a los procesos hijos como argumento: al
+    deserializarse se vuelve a conectar al mismo bloque por su nombre. Solo
+    el proceso que lo creó lo elimina en cerrar().
+    """
+
+    def __init__(self, forma_maxima, num_ranuras=4, etapas=('deteccion', 'render'), contexto=None):
+        contexto = contexto or multiprocessing.get_context('spawn')
+        self.forma_maxima = tuple(forma_maxima)
+        self.tam_ranura = int(np.prod(self.forma_maxima))
+        self.num_ranuras = num_ranuras
+        self.memoria = shared_memory.SharedMemory(create=True, size=self.tam_ranura * num_ranuras)
+        self.propietario = True
+
+        self.libres = contexto.Queue()
+        for ranura in range(num_ranuras):
+            self.libres.put(ranura)
+        self.colas = {etapa: contexto.Queue() for etapa in etapas}
+
+    def __getstate__(self):
+        estado = dict(self.__dict__)
+        estado['propietario'] = False
+        return estado
+
+    def vista(self, ranura, forma):
+        """Array numpy (uint8, contiguo) sobre la memoria de la ranura, sin copia"""
+        forma = tuple(forma)
+        if int(np.prod(forma)) > self.tam_ranura:
+            raise ValueError(f"El fotograma {forma} no cabe en una ranura de {self.forma_maxima}")
+        return np.ndarray(forma, dtype=np.uint8, buffer=self.memoria.buf, offset=ranura * self.tam_ranura)
+
+    def reservar(self, tiempo_espera=None):
+        """Toma una ranura libre; devuelve None si no hay ninguna en `tiempo_espera` segundos (0 = sin esperar)"""
+        try:
+            if tiempo_espera == 0:
+                return self.libres.get_nowait()
+            return self.libres.get(timeout=tiempo_espera)
+        except queue.Empty:
+            return None
+
+    def publicar(self, etapa, ranura, forma=(), indice=0, marca_tiempo=0.0, datos=None):
+        """Pasa la ranura a la etapa indicada (la ranura deja de pertenecer a quien la publica)"""
+        self.colas[etapa].put(Descriptor(ranura, indice, marca_tiempo, tuple(forma), datos))
+
+    def terminar(self, etapa, datos=None):
+        """Avisa a la etapa de que no llegarán más fotogramas"""
+        self.publicar(etapa, FIN, datos=datos)
+
+    def recibir(self, etapa, tiempo_espera=None):
+        """Devuelve (descriptor, vista) del siguiente fotograma de la etapa, o (None, None) si no llega ninguno
+
+        Para el aviso de fin la vista es None y `descriptor.ranura` es FIN.
+        """
+        try:
+            descriptor = self.colas[etapa].get(timeout=tiempo_espera)
+        except queue.Empty:
+            return None, None
+        if descriptor.ranura == FIN:
+            return descriptor, None
+        return descriptor, self.vista(descriptor.ranura, descriptor.forma)
+
+    def liberar(self, ranura):
+        """Devuelve la ranura al conjunto libre (sus vistas ya no deben usarse)"""
+        self.libres.put(ranura)
+
+    def cerrar(self):
+        """Desconecta el bloque y, en el proceso que lo creó, lo elimina
+
+        Antes hay que soltar todas las vistas: mientras existan, el bloque no se
+        puede desconectar (y se deja para cuando se liberen).
+        """
+        try:
+            self.memoria.close()
+        except BufferError:
+            pass
+        if self.propietario:
+            self.memoria.unlink()
+            self.propietario = False
+
+def etapa_captura(transporte, fuente, parar, listo):
+    """Proceso de captura: lee la fuente y escribe cada fotograma (en espejo si es una cámara) en una ranura"""
+    from captura_hilo import CapturaEnHilo
+
+    # No empezar a leer hasta que el detector esté cargado
+    while not listo.wait(0.5):
+        if parar.is_set():
+            return
+
+    camara = str(fuente).isdigit()
+    cap = CapturaEnHilo(int(fuente) if camara else fuente, descartar=camara).iniciar()
+    if not cap.isOpened():
+        print(f"Error: no se pudo abrir la fuente {fuente}")
+        transporte.terminar('deteccion')
+        return
+
+    sin_ranura = 0
+    reducidos = 0
+    try:
+        while not parar.is_set():
+            fotograma = cap.leer(tiempo_espera=0.5)
+            if fotograma is None:
+                if cap.terminado:
+                    break
+                continue
+
+            # Con cámara, si las etapas siguientes van atrasadas y no hay ranura libre el fotograma se
+            # descarta; con vídeo se espera para no perder ninguno
+            ranura = transporte.reservar(0)
+            while ranura is None and not camara and not parar.is_set():
+                ranura = transporte.reservar(0.5)
+            if ranura is None:
+                sin_ranura += 1
+                continue
+
+            imagen = fotograma.imagen
+            if imagen.size > transporte.tam_ranura:
+                # Un fotograma mayor que la ranura se reduce hasta que quepa (avisando la primera vez)
+                if reducidos == 0:
+                    print(f"Aviso: los fotogramas {imagen.shape} no caben en una ranura de "
+                          f"{transporte.forma_maxima}; se reducen (usa --forma-maxima para evitarlo)")
+                reducidos += 1
+                escala = (transporte.tam_ranura / imagen.size) ** 0.5
+                alto, ancho = imagen.shape[:2]
+                imagen = cv2.resize(imagen, (max(1, int(ancho * escala)), max(1, int(alto * escala))),
+                                    interpolation=cv2.INTER_AREA)
+
+            destino = transporte.vista(ranura, imagen.shape)
+            if camara:
+                # El volteo de espejo hace a la vez la única copia a memoria compartida
+                cv2.flip(imagen, 1, dst=destino)
+            else:
+                np.copyto(destino, imagen)
+            transporte.publicar('deteccion', ranura, destino.shape, fotograma.indice, fotograma.marca_tiempo)
+            del destino
+    finally:
+        # Aunque la captura falle, las etapas siguientes tienen que enterarse de que no llegará nada más
+        cap.release()
+        transporte.terminar('deteccion', {'descartados': cap.descartados + sin_ranura, 'reducidos': reducidos})
+
+def etapa_deteccion(transporte, config, parar, listo):
+    """Proceso de detección y clasificación: anota cada fotograma directamente en su ranura"""
+    from procesamiento_offline import crear_detector
+
+    detector = crear_detector(config)
+    listo.set()
+    while not parar.is_set():
+        descriptor, frame = transporte.recibir('deteccion', tiempo_espera=0.5)
+        if descriptor is None:
+            continue
+        if descriptor.ranura == FIN:
+            transporte.terminar('render', descriptor.datos)
+            break
+
+        inicio = time.perf_counter()
+        detector.procesar_fotograma(frame)
+        datos = {'deteccion_ms': (time.perf_counter() - inicio) * 1000.0}
+        del frame
+        transporte.publicar('render', descriptor.ranura, descriptor.forma, descriptor.indice,
+                            descriptor.marca_tiempo, datos)
+
+def ejecutar_tuberia(fuente=0, detector='expresiones', modelo='./version_completa/modelos/3/modelo_expresiones.h5',
+                     backend='optimizado', intervalo_deteccion=5, forma_maxima=(1080, 1920, 3), num_ranuras=4,
+                     mostrar=True, fps_pantalla=30.0):
+    """Captura, detección y render en tres procesos que se pasan los fotogramas por memoria compartida
+
+    El render (este proceso) muestra siempre el fotograma más reciente y
+    devuelve enseguida a la captura las ranuras que se salta. Al terminar
+    imprime los FPS y la latencia desde la captura hasta el render.
+    """
+    contexto = multiprocessing.get_context('spawn')
+    transporte = TransporteFotogramas(forma_maxima, num_ranuras, contexto=contexto)
+    parar, listo = contexto.Event(), contexto.Event()
+    config = {'detector': detector, 'modelo': modelo, 'backend': backend, 'intervalo_deteccion': intervalo_deteccion}
+    procesos = [
+        contexto.Process(target=etapa_captura, args=(transporte, fuente, parar, listo), daemon=True),
+        contexto.Process(target=etapa_deteccion, args=(transporte, config, parar, listo), daemon=True)
+    ]
+    for proceso in procesos:
+        proceso.start()
+
+    # El render copia el fotograma, así que la ranura vuelve a la captura nada más entregarlo
+    renderizador = crear_renderizador('ventana' if mostrar else 'nulo', ventana='Tubería', fps=fps_pantalla).iniciar()
+    if mostrar:
+        print("Presiona 'q' para salir.")
+
+    mostrados = 0
+    latencias, detecciones = [], []
+    datos_fin = {}
+    inicio = None
+    try:
+        while True:
+            descriptor, frame = transporte.recibir('render', tiempo_espera=0.5)
+            if descriptor is None:
+                # Sin detección (por ejemplo, si no se pudo cargar) o si la captura murió sin avisar
+                # del fin (código de salida distinto de 0) no llegarán más fotogramas
+                captura, deteccion = procesos
+                if not deteccion.is_alive() or (not captura.is_alive() and captura.exitcode not in (0, None)):
+                    print("Error: una etapa de la tubería terminó inesperadamente")
+                    break
+                continue
+            if descriptor.ranura == FIN:
+                datos_fin = descriptor.datos or {}
+                break
+
+            # Si hay fotogramas más recientes esperando, devolver este sin mostrarlo
+            fin = None
+            while not transporte.colas['render'].empty():
+                siguiente, frame_siguiente = transporte.recibir('render', tiempo_espera=0)
+                if siguiente is None:
+                    break
+                if siguiente.ranura == FIN:
+                    fin = siguiente
+                    break
+                del frame
+                transporte.liberar(descriptor.ranura)
+                descriptor, frame = siguiente, frame_siguiente
+
+            if inicio is None:
+                inicio = time.perf_counter()
+            latencias.append((time.monotonic() - descriptor.marca_tiempo) * 1000.0)
+            detecciones.append(descriptor.datos['deteccion_ms'])
+            mostrados += 1
+            renderizador.mostrar(frame)
+            tecla = renderizador.leer_tecla()
+            del frame
+            transporte.liberar(descriptor.ranura)
+
+            if fin is not None:
+                datos_fin = fin.datos or {}
+                break
+            if tecla == ord('q'):
+                break
+    except KeyboardInterrupt:
+        pass
+
+    parar.set()
+    for proceso in procesos:
+        proceso.join(timeout=5.0)
+        if proceso.is_alive():
+            proceso.terminate()
+    renderizador.cerrar()
+    transporte.cerrar()
+
+    duracion = time.perf_counter() - inicio if inicio is not None else 0.0
+    latencia, deteccion = percentiles(latencias), percentiles(detecciones)
+    print(f"Mostrados {mostrados} fotogramas ({mostrados / max(duracion, 1e-9):.1f} FPS), "
+          f"descartados en captura: {datos_fin.get('descartados', 0)}")
+    print(f"Detección p50 {deteccion['p50']:.1f} ms, p95 {deteccion['p95']:.1f} ms; "
+          f"captura→render p50 {latencia['p50']:.1f} ms, p95 {latencia['p95']:.1f} ms")
+    return mostrados
+
+def _productor_cola(cola, forma, num_fotogramas):
+    frame = np.random.randint(0, 256, forma, dtype=np.uint8)
+    for i in range(num_fotogramas):
+        cola.put((i, frame))
+    cola.put(None)
+
+def _productor_transporte(transporte, forma, num_fotogramas):
+    frame = np.random.randint(0, 256, forma, dtype=np.uint8)
+    for i in range(num_fotogramas):
+        ranura = transporte.reservar()
+        np.copyto(transporte.vista(ranura, forma), frame)
+        transporte.publicar('render', ranura, forma, i)
+    transporte.terminar('render')
+
+def medir_transporte(forma=(1080, 1920, 3), num_fotogramas=300, num_ranuras=4):
+    """Compara fotogramas por segundo entre dos procesos: cola serializando el array frente a memoria compartida"""
+    contexto = multiprocessing.get_context('spawn')
+    resultados = {}
+
+    cola = contexto.Queue(maxsize=num_ranuras)
+    proceso = contexto.Process(target=_productor_cola, args=(cola, forma, num_fotogramas))
+    proceso.start()
+    inicio = None
+    while True:
+        mensaje = cola.get()
+        if inicio is None:
+            inicio = time.perf_counter()
+        if mensaje is None:
+            break
+        int(mensaje[1][0, 0, 0])
+    resultados['cola'] = (num_fotogramas - 1) / (time.perf_counter() - inicio)
+    proceso.join()
+
+    transporte = TransporteFotogramas(forma, num_ranuras, etapas=('render',), contexto=contexto)
+    proceso = contexto.Process(target=_productor_transporte, args=(transporte, forma, num_fotogramas))
+    proceso.start()
+    inicio = None
+    while True:
+        descriptor, frame = transporte.recibir('render')
+        if inicio is None:
+            inicio = time.perf_counter()
+        if descriptor.ranura == FIN:
+            break
+        int(frame[0, 0, 0])
+        del frame
+        transporte.liberar(descriptor.ranura)
+    resultados['memoria_compartida'] = (num_fotogramas - 1) / (time.perf_counter() - inicio)
+    proceso.join()
+    transporte.cerrar()
+
+    alto, ancho = forma[:2]
+    print(f"Fotogramas de {ancho}x{alto} entre dos procesos:")
+    print(f"  cola (serializando):   {resultados['cola']:8.1f} fotogramas/s")
+    print(f"  memoria compartida:    {resultados['memoria_compartida']:8.1f} fotogramas/s "
+          f"({resultados['memoria_compartida'] / resultados['cola']:.1f}x)")
+    return resultados
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Captura, detección y render en procesos separados con memoria compartida")
+    parser.add_argument('--fuente', default='0', help="Índice de cámara o archivo de vídeo")
+    parser.add_argument('--detector', choices=['expresiones', 'personajes'], default='expresiones')
+    parser.add_argument('--modelo', default='./version_completa/modelos/3/modelo_expresiones.h5')
+    parser.add_argument('--backend', choices=['keras', 'tflite', 'opencv', 'optimizado'], default='optimizado')
+    parser.add_argument('--intervalo-deteccion', type=int, default=5)
+    parser.add_argument('--ranuras', type=int, default=4, help="Fotogramas que pueden estar en vuelo a la vez")
+    parser.add_argument('--forma-maxima', default='1920x1080', help="Resolución máxima de la fuente (ANCHOxALTO)")
+    parser.add_argument('--sin-ventana', action='store_true')
+    parser.add_argument('--fps-pantalla', type=float, default=30.0, help="Refresco máximo de la ventana")
+    parser.add_argument('--medir', action='store_true', help="Solo comparar el transporte con una cola normal")
+    args = parser.parse_args()
+
+    ancho, alto = (int(v) for v in args.forma_maxima.lower().split('x'))
+    if args.medir:
+        medir_transporte((alto, ancho, 3), num_ranuras=args.ranuras)
+    else:
+        ejecutar_tuberia(args.fuente, args.detector, args.modelo, args.backend, args.intervalo_deteccion,
+                         (alto, ancho, 3), args.ranuras, not args.sin_ventana, args.fps_pantalla)
@@ -0,0 +1,313 @@
+import argparse
+import http.client
+import json
+import math
+import multiprocessing
+import os
+import time
+from collections import deque
+import cv2
+import numpy as np
+from memoria_compartida import FIN, TransporteFotogramas
+from renderizado import crear_renderizador
+
+def es_camara(fuente):
+    """Las fuentes numéricas son índices de cámara; el resto, archivos o URLs de vídeo"""
+    return isinstance(fuente, int) or str(fuente).isdigit()
+
+def ajustar_a_tesela(frame, ancho, alto, destino):
+    """Escala el fotograma para que quepa en la tesela (sin deformarlo) y lo centra sobre fondo negro"""
+    alto_frame, ancho_frame = frame.shape[:2]
+    factor = min(ancho / ancho_frame, alto / alto_frame)
+    nuevo_ancho, nuevo_alto = max(1, int(ancho_frame * factor)), max(1, int(alto_frame * factor))
+    x, y = (ancho - nuevo_ancho) // 2, (alto - nuevo_alto) // 2
+    destino[:] = 0
+    cv2.resize(frame, (nuevo_ancho, nuevo_alto), dst=destino[y:y + nuevo_alto, x:x + nuevo_ancho],
+               interpolation=cv2.INTER_AREA)
+    return destino
+
+def servir_inferencia(modelo, backend, puerto, max_lote, max_espera):
+    """Proceso del servicio de inferencia compartido por todos los flujos"""
+    import asyncio
+    from detector_expresiones import DetectorExpresiones
+    from servicio_inferencia import ServicioInferencia
+
+    detector = DetectorExpresiones(modelo, backend)
+    if detector.modelo is None:
+        print("Error: no se pudo cargar el modelo; el servicio no puede arrancar.")
+        return
+    try:
+        asyncio.run(ServicioInferencia(detector, max_lote, max_espera).servir('127.0.0.1', puerto))
+    except KeyboardInterrupt:
+        pass
+
+def esperar_servicio(url, tiempo_maximo=120.0):
+    """Espera a que el servicio de inferencia responda a GET /estado"""
+    from urllib.parse import urlparse
+    partes = urlparse(url)
+    limite = time.monotonic() + tiempo_maximo
+    while time.monotonic() < limite:
+        try:
+            conexion = http.client.HTTPConnection(partes.hostname, partes.port or 8765, timeout=1.0)
+            conexion.request('GET', '/estado')
+            if conexion.getresponse().status == 200:
+                conexion.close()
+                return True
+        except (ConnectionError, OSError, http.client.HTTPException):
+            pass
+        time.sleep(0.25)
+    return False
+
+class EstadisticasFlujo:
+    """FPS de un flujo: instantáneo (últimos fotogramas) y medio desde el inicio"""
+
+    def __init__(self, ventana=30):
+        self.instantes = deque(maxlen=ventana)
+        self.inicio = time.perf_counter()
+        self.fotogramas = 0
+        self.latencias = deque(maxlen=300)
+
+    def anotar(self, segundos_proceso):
+        self.instantes.append(time.perf_counter())
+        self.fotogramas += 1
+        self.latencias.append(segundos_proceso * 1000.0)
+
+    def resumen(self, descartados=0):
+        fps = 0.0
+        if len(self.instantes) > 1:
+            fps = (len(self.instantes) - 1) / max(self.instantes[-1] - self.instantes[0], 1e-9)
+        return {
+            'fps': round(fps, 1),
+            'fps_medio': round(self.fotogramas / max(time.perf_counter() - self.inicio, 1e-9), 1),
+            'fotogramas': self.fotogramas,
+            'descartados': descartados,
+            'p95_ms': round(float(np.percentile(self.latencias, 95)), 2) if self.latencias else 0.0
+        }
+
+def ejecutar_flujo(indice, fuente, config, transporte, parar):
+    """Proceso de un flujo: captura, detección y clasificación (con el backend compartido)
+
+    Escribe el fotograma anotado, reducido al tamaño de la tesela, en una
+    ranura de memoria compartida y la publica con sus estadísticas; si la vista
+    aún no ha devuelto ninguna ranura ese fotograma no se muestra, pero el
+    flujo no se frena. Al terminar envía el aviso de fin con las estadísticas.
+    """
+    from captura_hilo import CapturaEnHilo
+    from procesamiento_offline import crear_detector
+
+    detector = crear_detector(config)
+    camara = es_camara(fuente)
+    # Las cámaras entregan siempre el fotograma más reciente; los vídeos no pierden ninguno
+    cap = CapturaEnHilo(int(fuente) if camara else fuente, descartar=camara).iniciar()
+    if not cap.isOpened():
+        print(f"Error: no se pudo abrir la fuente {fuente}")
+        transporte.terminar('vista', {'error': f"No se pudo abrir {fuente}"})
+        return
+
+    escritor = None
+    estadisticas = EstadisticasFlujo()
+    ancho_tesela, alto_tesela = config['tesela']
+    ultimo_envio = 0.0
+
+    while not parar.is_set():
+        fotograma = cap.leer(tiempo_espera=0.5)
+        if fotograma is None:
+            if cap.terminado:
+                break
+            continue
+
+        inicio = time.perf_counter()
+        frame = fotograma.imagen
+        if camara:
+            frame = cv2.flip(frame, 1, dst=detector.buffers.obtener('espejo', frame.shape))
+        detector.procesar_fotograma(frame)
+        estadisticas.anotar(time.perf_counter() - inicio)
+
+        if config['salida']:
+            if escritor is None:
+                alto, ancho = frame.shape[:2]
+                fps_video = cap.get(cv2.CAP_PROP_FPS) or 30.0
+                escritor = cv2.VideoWriter(os.path.join(config['salida'], f"flujo{indice}.mp4"),
+                                           cv2.VideoWriter_fourcc(*'mp4v'), fps_video, (ancho, alto))
+            escritor.write(frame)
+
+        # La vista se refresca como mucho a `fps_vista`; el resto de fotogramas no se envían
+        if config['fps_vista'] and inicio - ultimo_envio >= 1.0 / config['fps_vista']:
+            ranura = transporte.reservar(0)
+            if ranura is not None:
+                ajustar_a_tesela(frame, ancho_tesela, alto_tesela,
+                                 transporte.vista(ranura, (alto_tesela, ancho_tesela, 3)))
+                transporte.publicar('vista', ranura, (alto_tesela, ancho_tesela, 3), indice,
+                                    datos=estadisticas.resumen(cap.descartados))
+                ultimo_envio = inicio
+
+    cap.release()
+    if escritor is not None:
+        escritor.release()
+    transporte.terminar('vista', estadisticas.resumen(cap.descartados))
+
+def colocar_tesela(lienzo, i, tesela, etiqueta, columnas, ancho, alto):
+    """Copia la tesela del flujo i en su celda del mosaico y escribe encima su fuente y sus FPS"""
+    fila, columna = divmod(i, columnas)
+    x, y = columna * ancho, fila * alto
+    lienzo[y:y + alto, x:x + ancho] = tesela
+    cv2.putText(lienzo, etiqueta, (x + 10, y + 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+
+def ejecutar_multicamara(fuentes, detector='expresiones', modelo='./version_completa/modelos/3/modelo_expresiones.h5',
+                         backend='optimizado', servicio=None, puerto=8765, intervalo_deteccion=5,
+                         vista='mosaico', tesela=(640, 360), fps_vista=30.0, salida=None, intervalo_informe=5.0):
+    """Ejecuta la detección sobre varias fuentes, cada una en su propio proceso
+
+    Con el detector de expresiones todos los flujos comparten un único modelo:
+    el servicio de inferencia (servicio_inferencia.py) se arranca en otro
+    proceso, salvo que se indique la URL de uno ya en marcha con `servicio`,
+    y los flujos le envían los rostros con el backend 'remoto'; así el modelo
+    se carga una sola vez y los rostros de todos los flujos se agrupan en
+    micro-lotes. `vista` puede ser 'mosaico' (una ventana con todos los
+    flujos), 'flujos' (una ventana por flujo) o 'ninguna'. Con `salida` cada
+    flujo guarda además su vídeo anotado a resolución completa.
+
+    Devuelve las estadísticas finales de cada flujo.
+    """
+    contexto = multiprocessing.get_context('spawn')
+    proceso_servicio = None
+    config = {
+        'detector': detector, 'modelo': modelo, 'backend': backend,
+        'intervalo_deteccion': intervalo_deteccion, 'tesela': tesela,
+        'fps_vista': fps_vista if vista != 'ninguna' else 0, 'salida': salida
+    }
+    if salida:
+        os.makedirs(salida, exist_ok=True)
+
+    if detector == 'expresiones':
+        if servicio is None:
+            servicio = f"http://127.0.0.1:{puerto}"
+            proceso_servicio = contexto.Process(target=servir_inferencia, daemon=True,
+                                                args=(modelo, backend, puerto, max(8, 4 * len(fuentes)), 0.005))
+            proceso_servicio.start()
+        print(f"Esperando al servicio de inferencia en {servicio}...")
+        if not esperar_servicio(servicio):
+            print("Error: el servicio de inferencia no responde.")
+            if proceso_servicio is not None:
+                proceso_servicio.terminate()
+            return {}
+        config['modelo'], config['backend'] = servicio, 'remoto'
+
+    parar = contexto.Event()
+    # Las teselas llegan por memoria compartida; la vista las copia al mosaico (o al render) y
+    # devuelve la ranura enseguida
+    transportes = [TransporteFotogramas((tesela[1], tesela[0], 3), 3, etapas=('vista',), contexto=contexto)
+                   for _ in fuentes]
+    procesos = [contexto.Process(target=ejecutar_flujo, args=(i, fuente, config, transporte, parar), daemon=True)
+                for i, (fuente, transporte) in enumerate(zip(fuentes, transportes))]
+    for proceso in procesos:
+        proceso.start()
+    print(f"{len(fuentes)} flujos en marcha. Presiona 'q' (o Ctrl+C sin ventana) para salir.")
+
+    ancho, alto = tesela
+    columnas = math.ceil(math.sqrt(len(fuentes)))
+    filas = math.ceil(len(fuentes) / columnas)
+    lienzo = np.zeros((filas * alto, columnas * ancho, 3), dtype=np.uint8)
+    estadisticas = [{} for _ in fuentes]
+    activos = set(range(len(fuentes)))
+    ultimo_informe = time.monotonic()
+
+    # Render en su propio hilo (ventanas creadas una sola vez) o sumidero nulo sin vista
+    renderizador = crear_renderizador('nulo' if vista == 'ninguna' else 'ventana',
+                                      ventana='Multicámara', fps=fps_vista).iniciar()
+
+    try:
+        while activos:
+            nuevos = False
+            for i in list(activos):
+                while True:
+                    descriptor, imagen = transportes[i].recibir('vista', tiempo_espera=0)
+                    if descriptor is None:
+                        break
+                    estadisticas[i] = descriptor.datos
+                    if descriptor.ranura == FIN:
+                        activos.discard(i)
+                        break
+                    etiqueta = f"{i}: {fuentes[i]}  {estadisticas[i].get('fps', 0.0):.1f} FPS"
+                    if vista == 'flujos':
+                        cv2.putText(imagen, etiqueta, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+                        renderizador.mostrar(imagen, f"Flujo {i}: {fuentes[i]}")
+                    else:
+                        colocar_tesela(lienzo, i, imagen, etiqueta, columnas, ancho, alto)
+                        nuevos = True
+                    # La tesela ya está copiada: devolver la ranura al flujo
+                    del imagen
+                    transportes[i].liberar(descriptor.ranura)
+
+            if nuevos:
+                renderizador.mostrar(lienzo)
+            if renderizador.leer_tecla() == ord('q'):
+                break
+            time.sleep(0.005)
+
+            if time.monotonic() - ultimo_informe >= intervalo_informe:
+                ultimo_informe = time.monotonic()
+                print("  " + " | ".join(f"{i}: {e.get('fps', 0.0):.1f} FPS ({e.get('fotogramas', 0)})"
+                                        for i, e in enumerate(estadisticas)))
+    except KeyboardInterrupt:
+        pass
+
+    # Pedir a los flujos que terminen y recoger sus estadísticas finales
+    parar.set()
+    limite = time.monotonic() + 10.0
+    while activos and time.monotonic() < limite:
+        for i in list(activos):
+            descriptor, _ = transportes[i].recibir('vista', tiempo_espera=0.1)
+            if descriptor is None:
+                if not procesos[i].is_alive():
+                    activos.discard(i)
+            elif descriptor.ranura == FIN:
+                estadisticas[i] = descriptor.datos
+                activos.discard(i)
+            else:
+                transportes[i].liberar(descriptor.ranura)
+    for proceso in procesos:
+        proceso.join(timeout=1.0)
+        if proceso.is_alive():
+            proceso.terminate()
+    if proceso_servicio is not None:
+        proceso_servicio.terminate()
+    renderizador.cerrar()
+    for transporte in transportes:
+        transporte.cerrar()
+
+    print(f"\n{'flujo':<6} {'fuente':<30} {'fotogramas':>10} {'FPS medio':>10} {'descartados':>12} {'p95 ms':>8}")
+    for i, (fuente, e) in enumerate(zip(fuentes, estadisticas)):
+        if 'error' in e:
+            print(f"{i:<6} {str(fuente):<30} {e['error']}")
+            continue
+        print(f"{i:<6} {str(fuente):<30} {e.get('fotogramas', 0):>10} {e.get('fps_medio', 0.0):>10.1f} "
+              f"{e.get('descartados', 0):>12} {e.get('p95_ms', 0.0):>8.2f}")
+
+    if salida:
+        ruta_informe = os.path.join(salida, 'multicamara.json')
+        with open(ruta_informe, 'w', encoding='utf-8') as f:
+            json.dump({str(fuente): e for fuente, e in zip(fuentes, estadisticas)}, f, indent=2, ensure_ascii=False)
+        print(f"Vídeos y estadísticas guardados en {salida}")
+    return estadisticas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detección sobre varias cámaras o vídeos, un proceso por flujo")
+    parser.add_argument('fuentes', nargs='+', help="Índices de cámara (0, 1...) o archivos de vídeo")
+    parser.add_argument('--detector', choices=['expresiones', 'personajes'], default='expresiones')
+    parser.add_argument('--modelo', default='./version_completa/modelos/3/modelo_expresiones.h5')
+    parser.add_argument('--backend', choices=['keras', 'tflite', 'opencv', 'optimizado'], default='optimizado',
+                        help="Backend del servicio de inferencia compartido")
+    parser.add_argument('--servicio', default=None, help="URL de un servicio de inferencia ya en marcha")
+    parser.add_argument('--puerto', type=int, default=8765, help="Puerto del servicio que se arranca")
+    parser.add_argument('--intervalo-deteccion', type=int, default=5)
+    parser.add_argument('--vista', choices=['mosaico', 'flujos', 'ninguna'], default='mosaico')
+    parser.add_argument('--tesela', default='640x360', help="Tamaño de cada flujo en la vista (ANCHOxALTO)")
+    parser.add_argument('--fps-vista', type=float, default=30.0, help="Fotogramas por segundo enviados a la vista")
+    parser.add_argument('--salida', default=None, help="Carpeta para los vídeos anotados y las estadísticas")
+    args = parser.parse_args()
+
+    ancho_tesela, alto_tesela = (int(v) for v in args.tesela.lower().split('x'))
+    ejecutar_multicamara(args.fuentes, args.detector, args.modelo, args.backend, args.servicio, args.puerto,
+                         args.intervalo_deteccion, args.vista, (ancho_tesela, alto_tesela), args.fps_vista,
+                         args.salida)
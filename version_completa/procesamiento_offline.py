@@ -0,0 +1,224 @@
+import argparse
+import cv2
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXTENSIONES_VIDEO = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+EXTENSIONES_IMAGEN = ('.png', '.jpg', '.jpeg', '.bmp')
+
+# Detector de cada proceso de trabajo (se crea una vez por proceso en iniciar_trabajador)
+_detector = None
+_config = None
+
+def crear_detector(config):
+    """Crea el detector indicado en la configuración ('expresiones' o 'personajes')"""
+    if config['detector'] == 'personajes':
+        sys.path.append(os.path.join(RAIZ, 'version_simple'))
+        from detector_simple import DetectorPersonajes
+        return DetectorPersonajes(intervalo_deteccion=config['intervalo_deteccion'])
+
+    from detector_expresiones import DetectorExpresiones
+    return DetectorExpresiones(config['modelo'], config['backend'], config['intervalo_deteccion'])
+
+def iniciar_trabajador(config):
+    """Inicializa el detector de un proceso del pool"""
+    global _detector, _config
+    _config = config
+    _detector = crear_detector(config)
+
+def procesar_imagen(frame, indice, marca_tiempo):
+    """Procesa un fotograma con el detector del proceso y devuelve su registro JSON"""
+    if _config['espejo']:
+        frame = cv2.flip(frame, 1)
+
+    registro = {'fotograma': indice, 'tiempo': round(marca_tiempo, 3)}
+    if _config['detector'] == 'personajes':
+        rostros = _detector.procesar_fotograma(frame, marca_tiempo)
+        registro['rostros'] = [{'caja': [int(v) for v in caja]} for caja in rostros]
+        registro['personaje'] = _detector.personaje_actual
+    else:
+        detecciones = _detector.procesar_fotograma(frame)
+        registro['rostros'] = [
+            {'caja': [int(v) for v in caja], 'expresion': expresion, 'confianza': round(float(confianza), 4)}
+            for caja, expresion, confianza in detecciones
+        ]
+    return frame, registro
+
+def procesar_fragmento(trabajo):
+    """Procesa un fragmento (rango de fotogramas de un vídeo o lote de imágenes)
+
+    Escribe su parte del vídeo anotado (o las imágenes anotadas) y su parte del
+    JSONL, y devuelve (trabajo, número de fotogramas, segundos empleados).
+    """
+    inicio_reloj = time.perf_counter()
+    _detector.reiniciar()
+    num_fotogramas = 0
+
+    with open(trabajo['jsonl'], 'w', encoding='utf-8') as salida_jsonl:
+        if trabajo['tipo'] == 'video':
+            cap = cv2.VideoCapture(trabajo['fuente'])
+            cap.set(cv2.CAP_PROP_POS_FRAMES, trabajo['inicio'])
+            escritor = None
+            for indice in range(trabajo['inicio'], trabajo['fin']):
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                frame, registro = procesar_imagen(frame, indice, indice / trabajo['fps'])
+                if escritor is None:
+                    alto, ancho = frame.shape[:2]
+                    escritor = cv2.VideoWriter(trabajo['video'], cv2.VideoWriter_fourcc(*'mp4v'),
+                                               trabajo['fps'], (ancho, alto))
+                escritor.write(frame)
+                salida_jsonl.write(json.dumps(registro, ensure_ascii=False) + '\n')
+                num_fotogramas += 1
+            cap.release()
+            if escritor is not None:
+                escritor.release()
+        else:
+            for indice, ruta in trabajo['imagenes']:
+                frame = cv2.imread(ruta)
+                if frame is None:
+                    continue
+                # Cada foto es independiente: sin seguimiento ni predicciones de la anterior
+                _detector.reiniciar()
+                frame, registro = procesar_imagen(frame, indice, 0.0)
+                registro['archivo'] = os.path.basename(ruta)
+                cv2.imwrite(os.path.join(trabajo['carpeta_salida'], os.path.basename(ruta)), frame)
+                salida_jsonl.write(json.dumps(registro, ensure_ascii=False) + '\n')
+                num_fotogramas += 1
+
+    return trabajo, num_fotogramas, time.perf_counter() - inicio_reloj
+
+def planificar_trabajos(entradas, dir_salida, tam_fragmento):
+    """Divide cada vídeo en rangos de fotogramas y cada carpeta en lotes de imágenes"""
+    trabajos = []
+    for entrada in entradas:
+        nombre = os.path.splitext(os.path.basename(os.path.normpath(entrada)))[0]
+        base_salida = os.path.join(dir_salida, nombre)
+
+        if os.path.isdir(entrada):
+            imagenes = sorted(os.path.join(entrada, a) for a in os.listdir(entrada)
+                              if a.lower().endswith(EXTENSIONES_IMAGEN))
+            os.makedirs(base_salida, exist_ok=True)
+            for parte, inicio in enumerate(range(0, len(imagenes), tam_fragmento)):
+                trabajos.append({
+                    'tipo': 'imagenes', 'entrada': entrada, 'base': base_salida, 'parte': parte,
+                    'imagenes': list(enumerate(imagenes))[inicio:inicio + tam_fragmento],
+                    'carpeta_salida': base_salida,
+                    'jsonl': f"{base_salida}.parte{parte:04d}.jsonl"
+                })
+        elif entrada.lower().endswith(EXTENSIONES_VIDEO):
+            cap = cv2.VideoCapture(entrada)
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+            cap.release()
+            for parte, inicio in enumerate(range(0, total, tam_fragmento)):
+                trabajos.append({
+                    'tipo': 'video', 'entrada': entrada, 'base': base_salida, 'parte': parte,
+                    'fuente': entrada, 'inicio': inicio, 'fin': min(inicio + tam_fragmento, total), 'fps': fps,
+                    'video': f"{base_salida}.parte{parte:04d}.mp4",
+                    'jsonl': f"{base_salida}.parte{parte:04d}.jsonl"
+                })
+        else:
+            print(f"Entrada ignorada (no es un vídeo ni una carpeta): {entrada}")
+    return trabajos
+
+def unir_fragmentos(trabajos):
+    """Une, en orden, las partes de cada entrada en un único vídeo anotado y un único JSONL"""
+    por_entrada = {}
+    for trabajo in trabajos:
+        por_entrada.setdefault(trabajo['base'], []).append(trabajo)
+
+    for base, partes in por_entrada.items():
+        partes.sort(key=lambda t: t['parte'])
+
+        with open(base + '.jsonl', 'w', encoding='utf-8') as salida:
+            for parte in partes:
+                if os.path.exists(parte['jsonl']):
+                    with open(parte['jsonl'], encoding='utf-8') as f:
+                        salida.write(f.read())
+                    os.remove(parte['jsonl'])
+
+        if partes[0]['tipo'] != 'video':
+            continue
+
+        escritor = None
+        for parte in partes:
+            if not os.path.exists(parte['video']):
+                continue
+            cap = cv2.VideoCapture(parte['video'])
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if escritor is None:
+                    alto, ancho = frame.shape[:2]
+                    escritor = cv2.VideoWriter(base + '_anotado.mp4', cv2.VideoWriter_fourcc(*'mp4v'),
+                                               parte['fps'], (ancho, alto))
+                escritor.write(frame)
+            cap.release()
+            os.remove(parte['video'])
+        if escritor is not None:
+            escritor.release()
+        print(f"  ✓ {base}_anotado.mp4 y {base}.jsonl")
+
+def procesar_offline(entradas, dir_salida='salida_offline', detector='expresiones', modelo=None,
+                     backend='keras', intervalo_deteccion=1, espejo=False, procesos=None, tam_fragmento=300):
+    """Procesa vídeos y carpetas de imágenes sin cámara ni ventana, repartiendo el trabajo entre procesos
+
+    Devuelve el rendimiento global en fotogramas por segundo.
+    """
+    os.makedirs(dir_salida, exist_ok=True)
+    config = {
+        'detector': detector, 'modelo': modelo, 'backend': backend,
+        'intervalo_deteccion': intervalo_deteccion, 'espejo': espejo
+    }
+
+    trabajos = planificar_trabajos(entradas, dir_salida, tam_fragmento)
+    if not trabajos:
+        print("No hay nada que procesar.")
+        return 0.0
+
+    procesos = procesos or max(1, (os.cpu_count() or 2) // 2)
+    print(f"Procesando {len(trabajos)} fragmentos con {procesos} procesos...")
+
+    # 'spawn' evita heredar el estado de TensorFlow/MediaPipe del proceso principal
+    contexto = multiprocessing.get_context('spawn')
+    inicio = time.perf_counter()
+    total_fotogramas = 0
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto,
+                             initializer=iniciar_trabajador, initargs=(config,)) as pool:
+        futuros = [pool.submit(procesar_fragmento, trabajo) for trabajo in trabajos]
+        for futuro in as_completed(futuros):
+            trabajo, num_fotogramas, segundos = futuro.result()
+            total_fotogramas += num_fotogramas
+            print(f"  {os.path.basename(trabajo['base'])} parte {trabajo['parte']}: "
+                  f"{num_fotogramas} fotogramas, {num_fotogramas / max(segundos, 1e-9):.1f} FPS")
+
+    unir_fragmentos(trabajos)
+
+    duracion = time.perf_counter() - inicio
+    fps = total_fotogramas / max(duracion, 1e-9)
+    print(f"Procesados {total_fotogramas} fotogramas en {duracion:.1f} s ({fps:.1f} FPS)")
+    return fps
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Procesamiento sin ventana de vídeos y carpetas de imágenes")
+    parser.add_argument('entradas', nargs='+', help="Archivos de vídeo o carpetas de imágenes")
+    parser.add_argument('--salida', default='salida_offline', help="Carpeta de salida")
+    parser.add_argument('--detector', choices=['expresiones', 'personajes'], default='expresiones')
+    parser.add_argument('--modelo', default='./version_completa/modelos/3/modelo_expresiones.h5')
+    parser.add_argument('--backend', choices=['keras', 'tflite', 'opencv', 'optimizado'], default='keras')
+    parser.add_argument('--intervalo-deteccion', type=int, default=1)
+    parser.add_argument('--espejo', action='store_true', help="Voltear horizontalmente como en la cámara")
+    parser.add_argument('--procesos', type=int, default=None)
+    parser.add_argument('--tam-fragmento', type=int, default=300, help="Fotogramas o imágenes por fragmento")
+    args = parser.parse_args()
+
+    procesar_offline(args.entradas, args.salida, args.detector, args.modelo, args.backend,
+                     args.intervalo_deteccion, args.espejo, args.procesos, args.tam_fragmento)
@@ -0,0 +1,182 @@
+import sys
+import threading
+import time
+from collections import deque
+import cv2
+import numpy as np
+
+class Renderizador:
+    """Muestra en su propio hilo el fotograma anotado más reciente, a un ritmo fijo
+
+    El bucle de procesamiento solo llama a mostrar(), que copia el fotograma a
+    un buffer de entrada y vuelve enseguida: los detectores reutilizan sus
+    buffers en el fotograma siguiente, así que el render trabaja siempre sobre
+    su propia copia (doble buffer por ventana). El hilo crea las ventanas una
+    sola vez y las refresca como mucho a `fps` fotogramas por segundo,
+    independientemente de lo rápido que vaya la inferencia; si entre dos
+    refrescos llegan varios fotogramas solo se muestra el último y el resto se
+    cuentan en `omitidos`.
+
+    Todas las llamadas a HighGUI (ventanas, imshow y waitKey) se hacen desde un
+    único hilo. En macOS (Cocoa) las ventanas solo se pueden crear y refrescar
+    desde el hilo principal, así que allí (o con `en_hilo=False`) no se crea
+    hilo: mostrar() refresca la ventana en el propio hilo del bucle, con el
+    mismo límite de `fps`. Las teclas pulsadas se recogen con leer_tecla();
+    cerrar la ventana equivale a pulsar 'q'.
+    """
+
+    def __init__(self, ventana='Video', fps=30.0, pantalla_completa=False, en_hilo=None):
+        self.ventana_principal = ventana
+        self.intervalo = 1.0 / fps if fps else 0.0
+        self.pantalla_completa = pantalla_completa
+        self.en_hilo = sys.platform != 'darwin' if en_hilo is None else en_hilo
+        self.cerrojo = threading.Lock()
+        self.entradas = {}
+        self.salidas = {}
+        self.nuevos = set()
+        self.creadas = set()
+        self.teclas = deque(maxlen=16)
+        self.hilo = None
+        self.activo = False
+        self.siguientes = {}
+
+        # Estadísticas
+        self.recibidos = 0
+        self.mostrados = 0
+        self.omitidos = 0
+
+    def iniciar(self):
+        if not self.en_hilo:
+            self.activo = True
+        elif self.hilo is None:
+            self.activo = True
+            self.hilo = threading.Thread(target=self._bucle, daemon=True)
+            self.hilo.start()
+        return self
+
+    def mostrar(self, frame, ventana=None):
+        """Entrega un fotograma para mostrarlo (se copia; el llamador puede reutilizar el suyo)"""
+        ventana = ventana or self.ventana_principal
+        if not self.en_hilo:
+            self._mostrar_directo(frame, ventana)
+            return
+        with self.cerrojo:
+            entrada = self.entradas.get(ventana)
+            if entrada is None or entrada.shape != frame.shape or entrada.dtype != frame.dtype:
+                entrada = self.entradas[ventana] = np.empty_like(frame)
+            np.copyto(entrada, frame)
+            if ventana in self.nuevos:
+                self.omitidos += 1
+            self.nuevos.add(ventana)
+            self.recibidos += 1
+
+    def leer_tecla(self):
+        """Devuelve la siguiente tecla pulsada (código & 0xFF) o -1 si no hay ninguna"""
+        try:
+            return self.teclas.popleft()
+        except IndexError:
+            return -1
+
+    def _crear_ventana(self, ventana):
+        cv2.namedWindow(ventana, cv2.WINDOW_NORMAL)
+        if self.pantalla_completa and ventana == self.ventana_principal:
+            cv2.setWindowProperty(ventana, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+        self.creadas.add(ventana)
+
+    def _imshow(self, ventana, frame):
+        if ventana not in self.creadas:
+            self._crear_ventana(ventana)
+        cv2.imshow(ventana, frame)
+        self.mostrados += 1
+
+    def _atender_eventos(self, espera_ms):
+        """waitKey procesa los eventos de las ventanas; guarda la tecla o una 'q' si se cerró la ventana"""
+        tecla = cv2.waitKey(espera_ms)
+        if tecla != -1:
+            self.teclas.append(tecla & 0xFF)
+        elif self.ventana_principal in self.creadas and \
+                cv2.getWindowProperty(self.ventana_principal, cv2.WND_PROP_VISIBLE) < 1:
+            self.teclas.append(ord('q'))
+
+    def _mostrar_directo(self, frame, ventana):
+        """Render sin hilo: muestra el fotograma si ya toca refrescar y si no lo descarta"""
+        self.recibidos += 1
+        ahora = time.perf_counter()
+        siguiente = self.siguientes.get(ventana, ahora)
+        if ahora < siguiente:
+            self.omitidos += 1
+            return
+        # Si el bucle va más lento que `fps` no se intenta recuperar los refrescos perdidos
+        self.siguientes[ventana] = max(siguiente + self.intervalo, ahora)
+        self._imshow(ventana, frame)
+        self._atender_eventos(1)
+
+    def _bucle(self):
+        siguiente = time.perf_counter()
+        while self.activo:
+            # Intercambiar entrada y salida de las ventanas con fotograma nuevo (sin copiar)
+            with self.cerrojo:
+                pendientes = list(self.nuevos)
+                for ventana in pendientes:
+                    self.entradas[ventana], self.salidas[ventana] = self.salidas.get(ventana), self.entradas[ventana]
+                self.nuevos.clear()
+
+            for ventana in pendientes:
+                self._imshow(ventana, self.salidas[ventana])
+
+            # waitKey procesa los eventos de las ventanas y a la vez marca el ritmo de refresco
+            siguiente += self.intervalo
+            restante = siguiente - time.perf_counter()
+            if restante < 0:
+                # Si el render se ha retrasado no se intenta recuperar los refrescos perdidos
+                siguiente = time.perf_counter()
+            if self.creadas:
+                self._atender_eventos(max(1, int(restante * 1000)))
+            else:
+                time.sleep(max(restante, 0.001))
+
+        self._destruir_ventanas()
+
+    def _destruir_ventanas(self):
+        for ventana in self.creadas:
+            cv2.destroyWindow(ventana)
+        cv2.waitKey(1)
+        self.creadas.clear()
+
+    def cerrar(self):
+        """Detiene el hilo de render (si lo hay) y cierra sus ventanas"""
+        self.activo = False
+        if self.hilo is not None:
+            self.hilo.join(timeout=2.0)
+            self.hilo = None
+        elif not self.en_hilo and self.creadas:
+            self._destruir_ventanas()
+
+class RenderizadorNulo:
+    """Sumidero sin ventana con la misma interfaz, para ejecuciones sin pantalla"""
+
+    def __init__(self, *args, **kwargs):
+        self.recibidos = 0
+        self.mostrados = 0
+        self.omitidos = 0
+
+    def iniciar(self):
+        return self
+
+    def mostrar(self, frame, ventana=None):
+        self.recibidos += 1
+        self.mostrados += 1
+
+    def leer_tecla(self):
+        return -1
+
+    def cerrar(self):
+        pass
+
+def crear_renderizador(tipo='ventana', **opciones):
+    """Crea el render indicado: 'ventana' (Renderizador) o 'nulo' (sin pantalla)"""
+    if tipo == 'ventana':
+        return Renderizador(**opciones)
+    if tipo == 'nulo':
+        return RenderizadorNulo(**opciones)
+    raise ValueError(f"Render desconocido: {tipo}. Opciones: ventana, nulo")
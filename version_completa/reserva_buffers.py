@@ -0,0 +1,54 @@
+import numpy as np
+
+class ReservaBuffers:
+    """Arrays de trabajo reutilizables entre fotogramas
+
+    Cada buffer se identifica por un nombre y solo se vuelve a reservar si
+    cambia su forma o su tipo, así que en régimen estacionario los bucles de
+    cámara no piden memoria nueva para los fotogramas intermedios (espejo,
+    conversión de color, lote de entrada del modelo...). `asignaciones` cuenta
+    las reservas hechas y permite comprobarlo.
+
+    Quien recibe un buffer no debe guardarlo más allá del fotograma actual:
+    en el siguiente se sobrescribe.
+    """
+
+    def __init__(self):
+        self.buffers = {}
+        self.turnos = {}
+        self.asignaciones = 0
+
+    def reservar(self, nombre, forma, tipo):
+        self.asignaciones += 1
+        buffer = np.empty(forma, dtype=tipo)
+        self.buffers[nombre] = buffer
+        return buffer
+
+    def obtener(self, nombre, forma, tipo=np.uint8):
+        """Devuelve el buffer `nombre` con exactamente esa forma y tipo"""
+        forma = tuple(forma)
+        buffer = self.buffers.get(nombre)
+        if buffer is None or buffer.shape != forma or buffer.dtype != tipo:
+            buffer = self.reservar(nombre, forma, tipo)
+        return buffer
+
+    def obtener_minimo(self, nombre, forma, tipo=np.uint8):
+        """Devuelve una vista de la forma pedida sobre un buffer que solo crece
+
+        Sirve para tamaños que cambian en cada fotograma (número de rostros,
+        tamaño del sprite recortado): el buffer crece hasta el máximo visto y
+        después ya no se reserva más.
+        """
+        buffer = self.buffers.get(nombre)
+        if (buffer is None or buffer.dtype != tipo or buffer.ndim != len(forma)
+                or any(actual < pedido for actual, pedido in zip(buffer.shape, forma))):
+            nueva = forma if buffer is None or buffer.ndim != len(forma) else \
+                tuple(max(actual, pedido) for actual, pedido in zip(buffer.shape, forma))
+            buffer = self.reservar(nombre, nueva, tipo)
+        return buffer[tuple(slice(0, n) for n in forma)]
+
+    def alternar(self, nombre, forma, tipo=np.uint8):
+        """Alterna entre dos buffers, para quien necesita conservar el del fotograma anterior"""
+        turno = self.turnos.get(nombre, 0)
+        self.turnos[nombre] = 1 - turno
+        return self.obtener(f"{nombre}_{turno}", forma, tipo)
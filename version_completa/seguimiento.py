@@ -0,0 +1,204 @@
+import cv2
+import numpy as np
+from reserva_buffers import ReservaBuffers
+
+def iou(caja_a, caja_b):
+    """Intersección sobre unión de dos cajas (x, y, ancho, alto)"""
+    ax, ay, aw, ah = caja_a
+    bx, by, bw, bh = caja_b
+    ancho = min(ax + aw, bx + bw) - max(ax, bx)
+    alto = min(ay + ah, by + bh) - max(ay, by)
+    if ancho <= 0 or alto <= 0:
+        return 0.0
+    interseccion = ancho * alto
+    return interseccion / float(aw * ah + bw * bh - interseccion)
+
+class Pista:
+    """Rostro seguido entre fotogramas"""
+
+    def __init__(self, identificador, caja):
+        self.id = identificador
+        self.fijar_caja(caja)
+        self.puntos = None
+        self.confianza = 1.0
+        self.edad = 0
+
+    def fijar_caja(self, caja):
+        """Guarda la caja en coma flotante (para no acumular redondeos) y su versión entera"""
+        self.caja_real = tuple(float(v) for v in caja)
+        self.caja = tuple(int(round(v)) for v in self.caja_real)
+
+class SeguidorRostros:
+    """Ejecuta el detector completo cada N fotogramas y sigue los rostros entre medias
+
+    Entre detecciones cada rostro se sigue con flujo óptico (Lucas-Kanade) sobre
+    puntos característicos de su caja. Si la confianza del seguimiento (fracción
+    de puntos que se siguen bien) baja del umbral, se vuelve a detectar solo en
+    una región alrededor de la última posición conocida. Con intervalo_deteccion=1
+    se detecta en todos los fotogramas, como sin seguimiento.
+
+    `detectar` recibe una imagen (la completa o un recorte) y devuelve cajas
+    (x, y, ancho, alto) relativas a ella. `codigo_gris` es la conversión de
+    cv2 que pasa esa imagen a escala de grises (None si ya lo está).
+    """
+
+    def __init__(self, detectar, intervalo_deteccion=5, codigo_gris=None,
+                 confianza_minima=0.5, margen_roi=0.5, max_puntos=40):
+        self.detectar = detectar
+        self.intervalo_deteccion = max(1, int(intervalo_deteccion))
+        self.codigo_gris = codigo_gris
+        self.confianza_minima = confianza_minima
+        self.margen_roi = margen_roi
+        self.max_puntos = max_puntos
+
+        self.pistas = []
+        self.siguiente_id = 0
+        self.gris_anterior = None
+        self.fotogramas_desde_deteccion = 0
+        self.buffers = ReservaBuffers()
+
+        # Estadísticas
+        self.detecciones_completas = 0
+        self.detecciones_roi = 0
+
+        self.parametros_flujo = dict(
+            winSize=(15, 15),
+            maxLevel=2,
+            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03)
+        )
+
+    def reiniciar(self):
+        """Olvida todas las pistas (por ejemplo, al empezar un vídeo nuevo)"""
+        self.pistas = []
+        self.gris_anterior = None
+        self.fotogramas_desde_deteccion = 0
+
+    def actualizar(self, imagen):
+        """Procesa un fotograma y devuelve la lista de pistas activas"""
+        if self.intervalo_deteccion == 1:
+            self.asociar(self.detectar(imagen))
+            self.detecciones_completas += 1
+            return self.pistas
+
+        # El gris de este fotograma se guarda como gris_anterior: se alternan dos buffers.
+        # Si la imagen ya está en gris, quien llama no debe sobrescribirla en el fotograma siguiente
+        if self.codigo_gris is None:
+            gris = imagen
+        else:
+            gris = cv2.cvtColor(imagen, self.codigo_gris, dst=self.buffers.alternar('gris', imagen.shape[:2]))
+
+        if (not self.pistas or self.gris_anterior is None
+                or self.fotogramas_desde_deteccion >= self.intervalo_deteccion - 1):
+            self.asociar(self.detectar(imagen))
+            self.detecciones_completas += 1
+            self.fotogramas_desde_deteccion = 0
+            for pista in self.pistas:
+                self.iniciar_puntos(pista, gris)
+        else:
+            self.fotogramas_desde_deteccion += 1
+            self.seguir(imagen, gris)
+
+        self.gris_anterior = gris
+        return self.pistas
+
+    def asociar(self, cajas):
+        """Asigna las cajas detectadas a las pistas existentes por solapamiento"""
+        nuevas = []
+        libres = list(self.pistas)
+        for caja in cajas:
+            mejor, mejor_iou = None, 0.3
+            for pista in libres:
+                solape = iou(caja, pista.caja)
+                if solape > mejor_iou:
+                    mejor, mejor_iou = pista, solape
+            if mejor is not None:
+                libres.remove(mejor)
+                mejor.fijar_caja(caja)
+                mejor.confianza = 1.0
+                mejor.edad += 1
+                nuevas.append(mejor)
+            else:
+                nuevas.append(Pista(self.siguiente_id, caja))
+                self.siguiente_id += 1
+        self.pistas = nuevas
+
+    def iniciar_puntos(self, pista, gris):
+        """Busca puntos característicos dentro de la caja de la pista"""
+        x, y, w, h = self.recortar(pista.caja, gris.shape)
+        pista.puntos = None
+        if w < 8 or h < 8:
+            return
+        puntos = cv2.goodFeaturesToTrack(gris[y:y+h, x:x+w], self.max_puntos, 0.01, 5)
+        if puntos is not None:
+            pista.puntos = puntos.astype(np.float32) + np.float32([x, y])
+
+    def seguir(self, imagen, gris):
+        """Desplaza cada pista con flujo óptico y redetecta en su región si se pierde"""
+        supervivientes = []
+        for pista in self.pistas:
+            if pista.puntos is not None and len(pista.puntos) >= 3:
+                nuevos, estado, _ = cv2.calcOpticalFlowPyrLK(
+                    self.gris_anterior, gris, pista.puntos, None, **self.parametros_flujo)
+                validos = estado.reshape(-1) == 1
+                pista.confianza = float(np.count_nonzero(validos)) / len(pista.puntos)
+                if np.count_nonzero(validos) >= 3:
+                    self.desplazar(pista, pista.puntos[validos], nuevos[validos])
+            else:
+                pista.confianza = 0.0
+
+            if pista.confianza < self.confianza_minima:
+                if not self.redetectar(pista, imagen, gris):
+                    continue
+            elif pista.puntos is None or len(pista.puntos) < self.max_puntos // 3:
+                self.iniciar_puntos(pista, gris)
+
+            pista.edad += 1
+            supervivientes.append(pista)
+        self.pistas = supervivientes
+
+    def desplazar(self, pista, anteriores, nuevos):
+        """Mueve y escala la caja según la mediana del movimiento de sus puntos"""
+        desplazamiento = np.median((nuevos - anteriores).reshape(-1, 2), axis=0)
+
+        # Escala: cociente de distancias de los puntos a su centro antes y después
+        centro_anterior = np.median(anteriores.reshape(-1, 2), axis=0)
+        centro_nuevo = np.median(nuevos.reshape(-1, 2), axis=0)
+        dist_anterior = np.linalg.norm(anteriores.reshape(-1, 2) - centro_anterior, axis=1)
+        dist_nueva = np.linalg.norm(nuevos.reshape(-1, 2) - centro_nuevo, axis=1)
+        utiles = dist_anterior > 1e-3
+        escala = float(np.median(dist_nueva[utiles] / dist_anterior[utiles])) if np.any(utiles) else 1.0
+
+        x, y, w, h = pista.caja_real
+        cx = x + w / 2.0 + desplazamiento[0]
+        cy = y + h / 2.0 + desplazamiento[1]
+        w, h = w * escala, h * escala
+        pista.fijar_caja((cx - w / 2.0, cy - h / 2.0, w, h))
+        pista.puntos = nuevos.reshape(-1, 1, 2)
+
+    def redetectar(self, pista, imagen, gris):
+        """Ejecuta el detector solo en una región alrededor de la última posición conocida"""
+        x, y, w, h = pista.caja
+        margen_x, margen_y = int(w * self.margen_roi), int(h * self.margen_roi)
+        rx, ry, rw, rh = self.recortar((x - margen_x, y - margen_y, w + 2 * margen_x, h + 2 * margen_y), imagen.shape)
+        if rw < 8 or rh < 8:
+            return False
+
+        self.detecciones_roi += 1
+        cajas = self.detectar(np.ascontiguousarray(imagen[ry:ry+rh, rx:rx+rw]))
+        if len(cajas) == 0:
+            return False
+
+        # Quedarse con la caja más parecida a la anterior
+        cajas = [(cx + rx, cy + ry, cw, ch) for (cx, cy, cw, ch) in cajas]
+        pista.fijar_caja(max(cajas, key=lambda c: iou(c, pista.caja)))
+        pista.confianza = 1.0
+        self.iniciar_puntos(pista, gris)
+        return True
+
+    def recortar(self, caja, forma):
+        """Limita una caja a los bordes de la imagen"""
+        alto, ancho = forma[:2]
+        x, y, w, h = (int(v) for v in caja)
+        x1, y1 = max(0, x), max(0, y)
+        x2, y2 = min(ancho, x + w), min(alto, y + h)
+        return x1, y1, max(0, x2 - x1), max(0, y2 - y1)
@@ -0,0 +1,250 @@
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+TAM_ROSTRO = 48 * 48
+
+class MicroLotes:
+    """Agrupa peticiones concurrentes en lotes para hacer una sola pasada del modelo
+
+    Cada petición aporta uno o varios rostros (N, 48, 48, 1). El lote se cierra
+    al llegar a `max_lote` rostros o cuando han pasado `max_espera` segundos
+    desde la primera petición del lote; una petición que ya no cabe pasa al
+    lote siguiente, y una sola petición con más de `max_lote` rostros se
+    ejecuta en trozos de `max_lote`. El modelo se ejecuta en un hilo aparte
+    y a cada petición se le devuelven sus filas.
+    """
+
+    def __init__(self, predecir, max_lote=32, max_espera=0.005):
+        self.predecir = predecir
+        self.max_lote = max_lote
+        self.max_espera = max_espera
+        self.cola = asyncio.Queue()
+        # Un único hilo: el modelo se ejecuta siempre de un lote en uno
+        self.ejecutor = ThreadPoolExecutor(max_workers=1)
+
+        # Estadísticas
+        self.lotes = 0
+        self.rostros = 0
+        self.peticiones = 0
+
+    async def clasificar(self, rostros):
+        """Encola los rostros de una petición y espera sus probabilidades"""
+        futuro = asyncio.get_running_loop().create_future()
+        await self.cola.put((rostros, futuro))
+        return await futuro
+
+    def predecir_por_partes(self, lote):
+        """Ejecuta el modelo en trozos de como mucho `max_lote` rostros (una petición puede traer más)"""
+        if len(lote) <= self.max_lote:
+            return self.predecir(lote)
+        return np.concatenate([self.predecir(lote[inicio:inicio + self.max_lote])
+                               for inicio in range(0, len(lote), self.max_lote)], axis=0)
+
+    async def bucle(self):
+        """Forma lotes con lo que haya en la cola y los ejecuta"""
+        bucle_eventos = asyncio.get_running_loop()
+        # Petición que no cupo en el lote anterior: abre el siguiente
+        aplazada = None
+        while True:
+            if aplazada is not None:
+                pendientes, aplazada = [aplazada], None
+            else:
+                pendientes = [await self.cola.get()]
+            total = len(pendientes[0][0])
+            limite = bucle_eventos.time() + self.max_espera
+
+            while total < self.max_lote:
+                restante = limite - bucle_eventos.time()
+                if restante <= 0:
+                    break
+                try:
+                    peticion = await asyncio.wait_for(self.cola.get(), restante)
+                except asyncio.TimeoutError:
+                    break
+                if total + len(peticion[0]) > self.max_lote:
+                    aplazada = peticion
+                    break
+                pendientes.append(peticion)
+                total += len(peticion[0])
+
+            lote = np.concatenate([rostros for rostros, _ in pendientes], axis=0)
+            try:
+                predicciones = await bucle_eventos.run_in_executor(self.ejecutor, self.predecir_por_partes, lote)
+            except Exception as e:
+                for _, futuro in pendientes:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                continue
+
+            self.lotes += -(-len(lote) // self.max_lote)
+            self.rostros += len(lote)
+            self.peticiones += len(pendientes)
+
+            inicio = 0
+            for rostros, futuro in pendientes:
+                if not futuro.done():
+                    futuro.set_result(predicciones[inicio:inicio + len(rostros)])
+                inicio += len(rostros)
+
+class ServicioInferencia:
+    """Servicio HTTP local de clasificación de expresiones con micro-lotes
+
+    Rutas:
+      POST /rostros    cuerpo: N rostros 48x48 en escala de grises, uint8 concatenados
+      POST /fotograma  cuerpo: imagen JPEG; se detectan los rostros y se clasifican
+      GET  /estado     estadísticas de lotes
+    """
+
+    def __init__(self, detector, max_lote=32, max_espera=0.005):
+        self.detector = detector
+        self.lotes = MicroLotes(detector.predecir_lote, max_lote, max_espera)
+        # La detección de MediaPipe tampoco se comparte entre hilos
+        self.ejecutor_deteccion = ThreadPoolExecutor(max_workers=1)
+        self.inicio = time.monotonic()
+
+    def resultados(self, predicciones):
+        resultados = []
+        for probabilidades in predicciones:
+            expresion, confianza = self.detector.etiquetar_prediccion(probabilidades)
+            resultados.append({
+                'expresion': expresion,
+                'confianza': round(float(confianza), 4),
+                'probabilidades': [round(float(p), 5) for p in probabilidades]
+            })
+        return resultados
+
+    async def atender_rostros(self, cuerpo):
+        if len(cuerpo) == 0 or len(cuerpo) % TAM_ROSTRO != 0:
+            return 400, {'error': f"El cuerpo debe contener N rostros de {TAM_ROSTRO} bytes"}
+        rostros = np.frombuffer(cuerpo, dtype=np.uint8).reshape(-1, 48, 48, 1).astype(np.float32) / 255.0
+        predicciones = await self.lotes.clasificar(rostros)
+        return 200, {'resultados': self.resultados(predicciones)}
+
+    def detectar_en_jpeg(self, cuerpo):
+        """Decodifica el JPEG, detecta los rostros y los preprocesa (en el hilo de detección)"""
+        frame = cv2.imdecode(np.frombuffer(cuerpo, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return None, None
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        cajas, rostros = [], []
+        for caja in self.detector.detectar_rostros(rgb):
+            rostro = self.detector.preprocesar_imagen(rgb, caja)
+            if rostro is not None:
+                cajas.append([int(v) for v in caja])
+                rostros.append(rostro.astype(np.float32))
+        return cajas, rostros
+
+    async def atender_fotograma(self, cuerpo):
+        bucle_eventos = asyncio.get_running_loop()
+        cajas, rostros = await bucle_eventos.run_in_executor(self.ejecutor_deteccion, self.detectar_en_jpeg, cuerpo)
+        if cajas is None:
+            return 400, {'error': "No se pudo decodificar la imagen"}
+        if not rostros:
+            return 200, {'resultados': []}
+        predicciones = await self.lotes.clasificar(np.concatenate(rostros, axis=0))
+        resultados = self.resultados(predicciones)
+        for caja, resultado in zip(cajas, resultados):
+            resultado['caja'] = caja
+        return 200, {'resultados': resultados}
+
+    def estado(self):
+        lotes = self.lotes
+        return 200, {
+            'segundos_activo': round(time.monotonic() - self.inicio, 1),
+            'lotes': lotes.lotes,
+            'peticiones': lotes.peticiones,
+            'rostros': lotes.rostros,
+            'rostros_por_lote': round(lotes.rostros / lotes.lotes, 2) if lotes.lotes else 0.0,
+            'max_lote': lotes.max_lote,
+            'max_espera_ms': lotes.max_espera * 1000.0
+        }
+
+    async def responder(self, escritor, codigo, respuesta):
+        datos = json.dumps(respuesta, ensure_ascii=False).encode('utf-8')
+        textos = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}
+        escritor.write(
+            f"HTTP/1.1 {codigo} {textos[codigo]}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(datos)}\r\n\r\n".encode('latin-1') + datos)
+        await escritor.drain()
+
+    async def atender_conexion(self, lector, escritor):
+        """Atiende peticiones HTTP/1.1 (con keep-alive) de una conexión"""
+        try:
+            while True:
+                try:
+                    cabecera = await lector.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, ConnectionResetError):
+                    break
+
+                lineas = cabecera.decode('latin-1').split('\r\n')
+                peticion = lineas[0].split(' ')
+                cabeceras = {}
+                for linea in lineas[1:]:
+                    if ':' in linea:
+                        nombre, valor = linea.split(':', 1)
+                        cabeceras[nombre.strip().lower()] = valor.strip()
+                longitud = cabeceras.get('content-length', '0')
+                if len(peticion) != 3 or not longitud.isdigit():
+                    # Sin una línea de petición o una longitud válidas no se sabe dónde acaba el cuerpo:
+                    # se responde 400 y se cierra la conexión
+                    await self.responder(escritor, 400, {'error': "Petición HTTP mal formada"})
+                    break
+                metodo, ruta, _ = peticion
+                cuerpo = await lector.readexactly(int(longitud))
+
+                try:
+                    if metodo == 'POST' and ruta == '/rostros':
+                        codigo, respuesta = await self.atender_rostros(cuerpo)
+                    elif metodo == 'POST' and ruta == '/fotograma':
+                        codigo, respuesta = await self.atender_fotograma(cuerpo)
+                    elif metodo == 'GET' and ruta == '/estado':
+                        codigo, respuesta = self.estado()
+                    else:
+                        codigo, respuesta = 404, {'error': f"Ruta desconocida: {metodo} {ruta}"}
+                except Exception as e:
+                    codigo, respuesta = 500, {'error': str(e)}
+
+                await self.responder(escritor, codigo, respuesta)
+
+                if cabeceras.get('connection', '').lower() == 'close':
+                    break
+        finally:
+            escritor.close()
+
+    async def servir(self, host='127.0.0.1', puerto=8765):
+        tarea_lotes = asyncio.create_task(self.lotes.bucle())
+        servidor = await asyncio.start_server(self.atender_conexion, host, puerto)
+        print(f"Servicio de inferencia escuchando en http://{host}:{puerto} "
+              f"(lote máximo {self.lotes.max_lote}, espera máxima {self.lotes.max_espera * 1000:.1f} ms)")
+        try:
+            async with servidor:
+                await servidor.serve_forever()
+        finally:
+            tarea_lotes.cancel()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servicio local de inferencia de expresiones con micro-lotes")
+    parser.add_argument('--modelo', default='./version_completa/modelos/3/modelo_expresiones.h5')
+    parser.add_argument('--backend', choices=['keras', 'tflite', 'opencv', 'optimizado'], default='keras')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8765)
+    parser.add_argument('--max-lote', type=int, default=32, help="Rostros máximos por lote")
+    parser.add_argument('--max-espera-ms', type=float, default=5.0, help="Espera máxima para completar un lote")
+    args = parser.parse_args()
+
+    from detector_expresiones import DetectorExpresiones
+    detector = DetectorExpresiones(args.modelo, args.backend)
+    if detector.modelo is None:
+        print("Error: no se pudo cargar el modelo; el servicio no puede arrancar.")
+    else:
+        servicio = ServicioInferencia(detector, args.max_lote, args.max_espera_ms / 1000.0)
+        try:
+            asyncio.run(servicio.servir(args.host, args.puerto))
+        except KeyboardInterrupt:
+            print("Servicio detenido.")
@@ -1,111 +1,121 @@
 import cv2
 import os
 import random
+import sys
 import time
 from datetime import datetime
 
+# Los componentes compartidos (captura en hilo, composición, seguimiento, etc.) están en la carpeta
+# version_completa: la versión simple necesita tenerla al lado (ver "Dependencia de version_completa" en el README)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'version_completa'))
+from almacen_personajes import AlmacenPersonajes
+from captura_hilo import CapturaEnHilo
+from composicion import CacheSprites, superponer
+from control_calidad import ControlCalidad, escalonar
+from descargas import descargar_varios
+from detectores_rostro import crear_detector_rostros
+from renderizado import Renderizador, RenderizadorNulo
+from reserva_buffers import ReservaBuffers
+from seguimiento import SeguidorRostros
+from medicion import RegistroNulo
+from instrumentacion import Instrumentacion
+
 class DetectorPersonajes:
-    def __init__(self):
-        # Cargar detector de rostros de OpenCV
-        self.detector_rostro = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    def __init__(self, intervalo_deteccion=1, instrumentacion=None, detector_rostros='haar', opciones_detector=None,
+                 control_calidad=None):
+        # Detector de rostros ('haar', 'mediapipe' o 'dnn', ver detectores_rostro.py); recibe la imagen en gris
+        self.detector_rostro = crear_detector_rostros(detector_rostros, **(opciones_detector or {}))
+        
+        # Detección completa cada `intervalo_deteccion` fotogramas y seguimiento entre medias
+        self.seguidor = SeguidorRostros(self.detectar_rostros, intervalo_deteccion)
+        
+        # Caché de personajes ya redimensionados y premultiplicados (tamaño exacto, sin redondeo)
+        self.sprites = CacheSprites(paso=1)
         
-        # Cargar imágenes de personajes disponibles
-        self.imagenes_personajes = {}
-        self.personajes_disponibles = []
+        # Índice de las imágenes de personajes disponibles (se decodifican bajo demanda)
+        self.almacen = None
+        self.siguiente_personaje = None
         self.cargar_imagenes()
         
+        # Arrays de trabajo reutilizados en cada fotograma (espejo, escala de grises, mezcla)
+        self.buffers = ReservaBuffers()
+        
+        # Registro de latencia por etapa y contadores (desactivado por defecto, ver
+        # instrumentacion.py y benchmark.py); el registro nulo no cuesta casi nada
+        self.instrumentacion = instrumentacion
+        self.etapas = instrumentacion if instrumentacion is not None else RegistroNulo()
+        
+        # Control adaptativo de calidad (ver control_calidad.py); reenvía las medidas a la instrumentación
+        self.control_calidad = control_calidad
+        if control_calidad is not None:
+            self.etapas = control_calidad.encadenar(self.etapas)
+            self.registrar_perillas(control_calidad)
+        
         # Personaje actual y temporizador
         self.personaje_actual = None
         self.tiempo_cambio = 0
         self.intervalo_cambio = 3  # segundos para cambiar de personaje
     
     def cargar_imagenes(self):
-        """Carga las imágenes de los personajes desde la carpeta 'personajes'"""
+        """Indexa las imágenes de la carpeta 'personajes'
+        
+        Solo se listan los archivos; cada imagen se decodifica la primera vez que
+        se muestra y se guarda en una caché acotada (ver almacen_personajes.py).
+        Los archivos que se añaden, cambian o borran se detectan sin reiniciar.
+        """
         if not os.path.exists("personajes"):
             os.makedirs("personajes")
             print("Se ha creado la carpeta 'personajes'. Añade imágenes de personajes ahí.")
-            return
         
-        # Intentar cargar todas las imágenes disponibles
-        archivos = os.listdir("personajes") if os.path.exists("personajes") else []
-        print(f"Archivos en carpeta 'personajes': {len(archivos)}")
-        
-        for archivo in archivos:
-            if archivo.lower().endswith(('.png', '.jpg', '.jpeg')):
-                nombre = os.path.splitext(archivo)[0]
-                ruta_completa = os.path.join("personajes", archivo)
-                try:
-                    img = cv2.imread(ruta_completa, cv2.IMREAD_UNCHANGED)
-                    if img is not None:
-                        self.imagenes_personajes[nombre] = img
-                        self.personajes_disponibles.append(nombre)
-                        print(f"Cargada imagen de: {nombre}")
-                except Exception as e:
-                    print(f"Error al cargar {nombre}: {e}")
+        self.almacen = AlmacenPersonajes("personajes", al_cambiar=self.sprites.invalidar)
+        print(f"Personajes en carpeta 'personajes': {len(self.almacen)}")
         
         if not self.personajes_disponibles:
             print("¡ATENCIÓN! No se encontraron imágenes de personajes.")
             print("Añade imágenes en formato PNG o JPG en la carpeta 'personajes'.")
     
+    def detectar_rostros(self, gris):
+        """Detecta rostros en una imagen en escala de grises (completa o recortada)"""
+        return self.detector_rostro.detectar(gris)
+    
+    @property
+    def personajes_disponibles(self):
+        return self.almacen.nombres()
+    
     def elegir_personaje_aleatorio(self):
-        """Elige un personaje aleatorio de los disponibles"""
-        if self.personajes_disponibles:
-            return random.choice(self.personajes_disponibles)
-        return None
+        """Elige un personaje aleatorio de los disponibles
+        
+        El siguiente se sortea ya ahora y se decodifica en segundo plano, para
+        que el cambio de personaje no tenga que esperar a leer la imagen.
+        """
+        disponibles = self.personajes_disponibles
+        if not disponibles:
+            return None
+        elegido = self.siguiente_personaje if self.siguiente_personaje in self.almacen else random.choice(disponibles)
+        self.siguiente_personaje = random.choice(disponibles)
+        self.almacen.precargar(self.siguiente_personaje)
+        return elegido
     
     def mostrar_personaje(self, frame, personaje):
         """Muestra el personaje en el frame"""
         alto, ancho = frame.shape[:2]
         
         # Intentar mostrar la imagen del personaje si está disponible
-        if personaje in self.imagenes_personajes:
-            img_personaje = self.imagenes_personajes[personaje]
+        img_personaje = self.almacen.obtener(personaje)
+        if img_personaje is not None:
             
-            # Redimensionar manteniendo relación de aspecto
+            # Redimensionar manteniendo relación de aspecto (el sprite se calcula una vez por tamaño)
             alto_img, ancho_img = img_personaje.shape[:2]
             factor = min(ancho/3 / ancho_img, alto/3 / alto_img)
             nuevo_ancho = int(ancho_img * factor)
             nuevo_alto = int(alto_img * factor)
             
-            img_redim = cv2.resize(img_personaje, (nuevo_ancho, nuevo_alto))
+            sprite = self.sprites.obtener(personaje, img_personaje, nuevo_ancho, nuevo_alto)
             
-            # Si la imagen tiene canal alfa (transparencia)
-            if len(img_redim.shape) > 2 and img_redim.shape[2] == 4:
-                # Separar la imagen y su máscara alfa
-                bgr = img_redim[:, :, :3]
-                alfa = img_redim[:, :, 3] / 255.0
-                
-                # Calcular posición (esquina superior derecha)
-                y_offset = 10
-                x_offset = ancho - nuevo_ancho - 10
-                
-                # Región del frame donde se colocará la imagen
-                y1, y2 = y_offset, y_offset + nuevo_alto
-                x1, x2 = x_offset, x_offset + nuevo_ancho
-                
-                # Asegurarse de que está dentro de los límites
-                if y2 <= alto and x2 <= ancho:
-                    # Región del frame
-                    roi = frame[y1:y2, x1:x2]
-                    
-                    # Mezclar la imagen con el frame usando el canal alfa
-                    for c in range(0, 3):
-                        roi[:, :, c] = roi[:, :, c] * (1 - alfa) + bgr[:, :, c] * alfa
-                    
-                    # Colocar la región mezclada de vuelta en el frame
-                    frame[y1:y2, x1:x2] = roi
-            else:
-                # Para imágenes sin transparencia, simplemente colocarlas
-                y_offset = 10
-                x_offset = ancho - nuevo_ancho - 10
-                
-                # Región del frame donde se colocará la imagen
-                y1, y2 = y_offset, y_offset + nuevo_alto
-                x1, x2 = x_offset, x_offset + nuevo_ancho
-                
-                # Asegurarse de que está dentro de los límites
-                if y2 <= alto and x2 <= ancho:
-                    frame[y1:y2, x1:x2] = img_redim
+            # Calcular posición (esquina superior derecha) y mezclar usando el canal alfa si lo tiene
+            y_offset = 10
+            x_offset = ancho - nuevo_ancho - 10
+            superponer(frame, sprite, x_offset, y_offset, self.buffers)
         else:
             # Si no hay imagen disponible, mostrar mensaje
             cv2.putText(frame, f"Imagen no disponible: {personaje}", 
@@ -115,14 +125,77 @@ class DetectorPersonajes:
         texto_personaje = f"Personaje: {personaje}"
         cv2.putText(frame, texto_personaje, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
     
-    def iniciar_camara(self):
-        """Inicia la cámara y el proceso de detección"""
+    def procesar_fotograma(self, frame, tiempo_actual=None):
+        """Detecta los rostros de un fotograma y dibuja el personaje actual
+        
+        `tiempo_actual` permite usar la marca de tiempo del vídeo en lugar del reloj
+        cuando se procesan grabaciones. Devuelve la lista de cajas de los rostros.
+        """
+        if tiempo_actual is None:
+            tiempo_actual = time.time()
+        
+        # Elegir el primer personaje si aún no hay ninguno
+        if self.personaje_actual is None:
+            self.personaje_actual = self.elegir_personaje_aleatorio()
+            self.tiempo_cambio = tiempo_actual
+        
+        # Convertir a escala de grises para detección
+        # (dos buffers alternos: el seguidor conserva el gris del fotograma anterior)
+        with self.etapas.etapa('color'):
+            gris = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.buffers.alternar('gris', frame.shape[:2]))
+        
+        # Detectar rostros (o seguirlos entre detecciones)
+        with self.etapas.etapa('deteccion'):
+            rostros = [pista.caja for pista in self.seguidor.actualizar(gris)]
+        self.etapas.contar('rostros', len(rostros))
+        
+        # Dibujar rectángulos alrededor de los rostros
+        for (x, y, w, h) in rostros:
+            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+        
+        # Verificar si hay que cambiar de personaje (si se detectan rostros)
+        if len(rostros) > 0 and (tiempo_actual - self.tiempo_cambio) > self.intervalo_cambio:
+            self.personaje_actual = self.elegir_personaje_aleatorio()
+            self.tiempo_cambio = tiempo_actual
+            self.etapas.contar('cambios_personaje')
+            print(f"¡Nuevo personaje! {self.personaje_actual}")
+        
+        # Mostrar el personaje actual
+        if self.personaje_actual:
+            with self.etapas.etapa('composicion'):
+                self.mostrar_personaje(frame, self.personaje_actual)
+        
+        return rostros
+    
+    def registrar_perillas(self, control):
+        """Registra en el control de calidad lo que puede abaratar, de más a menos prioritario por etapa"""
+        control.registrar('escala_deteccion', escalonar(self.detector_rostro.escala, (0.75, 0.5, 0.35), False),
+                          lambda valor: setattr(self.detector_rostro, 'escala', valor), ('deteccion', 'color'))
+        control.registrar('intervalo_deteccion',
+                          escalonar(self.seguidor.intervalo_deteccion, (2, 3, 5, 8, 12), True),
+                          lambda valor: setattr(self.seguidor, 'intervalo_deteccion', valor), ('deteccion',))
+        control.registrar('calidad_superposicion', ['alta', 'media', 'baja'], self.sprites.fijar_calidad,
+                          ('composicion',))
+    
+    def reiniciar(self):
+        """Olvida el seguimiento y el personaje actual (al empezar un vídeo nuevo)"""
+        self.seguidor.reiniciar()
+        self.personaje_actual = None
+        self.tiempo_cambio = 0
+    
+    def iniciar_camara(self, renderizador=None):
+        """Inicia la cámara y el proceso de detección
+        
+        `renderizador` muestra los fotogramas en su propio hilo (ver renderizado.py);
+        con RenderizadorNulo no se abre ninguna ventana.
+        """
         # Verificar si hay personajes disponibles
         if not self.personajes_disponibles:
             print("No hay personajes disponibles. Añade imágenes en la carpeta 'personajes'.")
             return
             
-        cap = cv2.VideoCapture(0)
+        # La lectura de la cámara va en su propio hilo y siempre entrega el fotograma más reciente
+        cap = CapturaEnHilo(0).iniciar()
         
         if not cap.isOpened():
             print("Error: No se pudo abrir la cámara")
@@ -135,6 +208,11 @@ class DetectorPersonajes:
         self.personaje_actual = self.elegir_personaje_aleatorio()
         self.tiempo_cambio = time.time()
         
+        # El render crea la ventana una sola vez y la refresca a su ritmo, sin frenar la detección
+        if renderizador is None:
+            renderizador = Renderizador('Detector de Personajes', fps=30)
+        renderizador.iniciar()
+        
         while cap.isOpened():
             ret, frame = cap.read()
             if not ret:
@@ -142,38 +220,31 @@ class DetectorPersonajes:
                 break
             
             # Voltear horizontalmente para efecto espejo
-            frame = cv2.flip(frame, 1)
-            
-            # Convertir a escala de grises para detección
-            gris = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            with self.etapas.etapa('volteo'):
+                frame = cv2.flip(frame, 1, dst=self.buffers.obtener('espejo', frame.shape))
             
-            # Detectar rostros
-            rostros = self.detector_rostro.detectMultiScale(gris, 1.3, 5)
-            
-            # Dibujar rectángulos alrededor de los rostros
-            for (x, y, w, h) in rostros:
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-            
-            # Verificar si hay que cambiar de personaje (si se detectan rostros)
-            tiempo_actual = time.time()
-            if len(rostros) > 0 and (tiempo_actual - self.tiempo_cambio) > self.intervalo_cambio:
-                self.personaje_actual = self.elegir_personaje_aleatorio()
-                self.tiempo_cambio = tiempo_actual
-                print(f"¡Nuevo personaje! {self.personaje_actual}")
-            
-            # Mostrar el personaje actual
-            if self.personaje_actual:
-                self.mostrar_personaje(frame, self.personaje_actual)
+            # Detectar rostros, cambiar de personaje si toca y dibujarlo
+            self.procesar_fotograma(frame)
             
             # Mostrar información de uso
             cv2.putText(frame, "Presiona 'q' para salir, 'c' para cambiar personaje", 
                        (10, frame.shape[0] - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
             
-            # Mostrar el fotograma
-            cv2.imshow('Detector de Personajes', frame)
+            # Métricas en vivo (HUD, CSV y Prometheus) si están activadas
+            if self.instrumentacion is not None:
+                self.instrumentacion.fijar('fotogramas_descartados', cap.descartados)
+                self.instrumentacion.tick(frame)
+            
+            # Entregar el fotograma al render (se copia; el buffer se reutiliza)
+            with self.etapas.etapa('render'):
+                renderizador.mostrar(frame)
+            
+            # Ajustar la calidad si el coste por fotograma se sale del objetivo
+            if self.control_calidad is not None:
+                self.control_calidad.tick()
             
             # Controles
-            key = cv2.waitKey(1) & 0xFF
+            key = renderizador.leer_tecla()
             if key == ord('q'):
                 break
             elif key == ord('c'):
@@ -182,7 +253,14 @@ class DetectorPersonajes:
                 print(f"¡Nuevo personaje manual! {self.personaje_actual}")
         
         cap.release()
-        cv2.destroyAllWindows()
+        renderizador.cerrar()
+        if self.instrumentacion is not None:
+            self.instrumentacion.cerrar()
+        print(f"Fotogramas procesados: {cap.entregados}, descartados: {cap.descartados}, "
+              f"mostrados: {renderizador.mostrados}")
+        if self.control_calidad is not None:
+            print(f"Ajustes de calidad: {len(self.control_calidad.decisiones)}, "
+                  f"estado final: {self.control_calidad.estado()}")
 
 def descargar_personajes_ejemplo():
     """Descarga algunos personajes de ejemplo si no existen"""
@@ -199,22 +277,13 @@ def descargar_personajes_ejemplo():
     }
     
     try:
-        import requests
-        for nombre, url in personajes.items():
-            ruta_destino = os.path.join("personajes", f"{nombre}.png")
+        # Descarga en paralelo; las imágenes que ya están en la caché local no se vuelven a bajar
+        pendientes = [(url, os.path.join("personajes", f"{nombre}.png")) for nombre, url in personajes.items()
+                      if not os.path.exists(os.path.join("personajes", f"{nombre}.png"))]
+        if pendientes:
+            print(f"Descargando {len(pendientes)} imágenes de personajes...")
+            descargar_varios(pendientes)
             
-            # Verificar si ya existe
-            if not os.path.exists(ruta_destino):
-                print(f"Descargando imagen de {nombre}...")
-                response = requests.get(url, stream=True)
-                if response.status_code == 200:
-                    with open(ruta_destino, 'wb') as f:
-                        for chunk in response.iter_content(1024):
-                            f.write(chunk)
-                    print(f"  ✓ {nombre} descargado correctamente")
-                else:
-                    print(f"  ✗ Error al descargar {nombre}: {response.status_code}")
-                    
         # Verificar las imágenes descargadas
         archivos = os.listdir("personajes")
         print(f"Imágenes disponibles después de la descarga: {len(archivos)}")
@@ -233,6 +302,24 @@ if __name__ == "__main__":
     # Intentar descargar personajes de ejemplo
     descargar_personajes_ejemplo()
     
-    # Iniciar el detector
-    detector = DetectorPersonajes()
-    detector.iniciar_camara() 
\ No newline at end of file
+    # Métricas en vivo: None para desactivarlas, o por ejemplo
+    # Instrumentacion(hud=True, ruta_csv='metricas.csv', ruta_prometheus='metricas.prom')
+    instrumentacion = None
+    
+    # Detector de rostros y sus opciones; por ejemplo, la configuración que elige
+    # python version_completa/detectores_rostro.py --latencia-objetivo 10
+    detector_rostros = 'haar'
+    opciones_detector = {'escala': 1.0, 'factor_escala': 1.3, 'vecinos_minimos': 5}
+    
+    # Control adaptativo de calidad: None para desactivarlo, o por ejemplo
+    # ControlCalidad(fps_objetivo=30, presupuesto_ms=40, ruta_registro='calidad.csv')
+    control_calidad = None
+    
+    # Render a 30 FPS en su propio hilo; RenderizadorNulo() para ejecutar sin pantalla
+    renderizador = Renderizador('Detector de Personajes', fps=30)
+    
+    # Iniciar el detector (detección completa cada 5 fotogramas, seguimiento entre medias)
+    detector = DetectorPersonajes(intervalo_deteccion=5, instrumentacion=instrumentacion,
+                                  detector_rostros=detector_rostros, opciones_detector=opciones_detector,
+                                  control_calidad=control_calidad)
+    detector.iniciar_camara(renderizador) 
\ No newline at end of file